@@ -3,11 +3,19 @@ Step 3: Streaming vs Non-Streaming Comparison
 
 This script compares streaming and non-streaming side-by-side.
 See the difference in user experience!
+
+Benchmark mode (no pauses) runs many requests at once instead, to see how
+streaming behaves under contention:
+
+    python comparison.py --benchmark --requests 50 --concurrency 10 --json results.json
 """
 
 import sys
 import os
 import time
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -161,6 +169,203 @@ def main():
     print()
 
 
+# ============================================================================
+# BENCHMARK MODE
+# ============================================================================
+
+BENCHMARK_PROMPTS = [
+    "Explain photosynthesis in about 150 words.",
+    "Explain recursion to a beginner in about 150 words.",
+    "Summarize the causes of World War I in about 150 words.",
+    "Explain how a binary search works in about 150 words.",
+    "Describe the water cycle in about 150 words.",
+    "Explain Newton's second law with an example in about 150 words.",
+]
+
+# Histogram bucket upper bounds
+SECONDS_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30]
+GAP_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1]
+RATE_BUCKETS = [5, 10, 20, 40, 80, 160, 320]
+
+
+def timed_request(client, messages, stream):
+    """
+    One request with timings (nothing is printed)
+
+    Returns:
+        Dict with ttft, total_time, tokens, tokens_per_sec and the gaps
+        between streamed chunks. Without streaming the first token arrives
+        with the whole answer, so ttft equals total_time.
+    """
+    start_time = time.perf_counter()
+    gaps = []
+
+    if not stream:
+        response = client.chat.completions.create(
+            model=GPT4_DEPLOYMENT_NAME,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500
+        )
+        total_time = time.perf_counter() - start_time
+        tokens = response.usage.completion_tokens if response.usage else 0
+        return {"ttft": total_time, "total_time": total_time, "tokens": tokens,
+                "tokens_per_sec": tokens / total_time if total_time else 0.0, "gaps": gaps}
+
+    stream_response = client.chat.completions.create(
+        model=GPT4_DEPLOYMENT_NAME,
+        messages=messages,
+        temperature=0.7,
+        max_tokens=500,
+        stream=True,
+        stream_options={"include_usage": True}  # final chunk reports the token count
+    )
+
+    first_chunk_time = None
+    last_chunk_time = None
+    chunks = 0
+    tokens = None
+    for chunk in stream_response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            now = time.perf_counter()
+            if first_chunk_time is None:
+                first_chunk_time = now
+            else:
+                gaps.append(now - last_chunk_time)
+            last_chunk_time = now
+            chunks += 1
+        if getattr(chunk, "usage", None):
+            tokens = chunk.usage.completion_tokens
+
+    end_time = time.perf_counter()
+    tokens = tokens if tokens is not None else chunks
+    ttft = (first_chunk_time or end_time) - start_time
+    generation_time = (last_chunk_time or end_time) - (first_chunk_time or start_time)
+    return {"ttft": ttft, "total_time": end_time - start_time, "tokens": tokens,
+            "tokens_per_sec": tokens / generation_time if generation_time > 0 else 0.0, "gaps": gaps}
+
+
+def percentile(values, share):
+    """Nearest-rank percentile (0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(share * len(ordered)) - 1))]
+
+
+def histogram(values, buckets):
+    """Count values per bucket ("<=0.1": 3, ..., ">30": 0)"""
+    counts = {f"<={bound}": 0 for bound in buckets}
+    counts[f">{buckets[-1]}"] = 0
+    for value in values:
+        for bound in buckets:
+            if value <= bound:
+                counts[f"<={bound}"] += 1
+                break
+        else:
+            counts[f">{buckets[-1]}"] += 1
+    return counts
+
+
+def describe(values, buckets):
+    """Summary statistics plus a histogram for one metric"""
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else 0.0,
+        "histogram": histogram(values, buckets),
+    }
+
+
+def run_benchmark(client, stream, requests, concurrency):
+    """Send `requests` requests, `concurrency` at a time; returns per-metric summaries"""
+    prompts = [BENCHMARK_PROMPTS[i % len(BENCHMARK_PROMPTS)] for i in range(requests)]
+    conversations = [
+        [{"role": "system", "content": "You are a helpful teaching assistant."},
+         {"role": "user", "content": prompt}]
+        for prompt in prompts
+    ]
+
+    errors = 0
+    results = []
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(timed_request, client, messages, stream) for messages in conversations]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors += 1
+                print(f"  ❌ {e}")
+    wall_time = time.perf_counter() - start_time
+
+    return {
+        "mode": "streaming" if stream else "non-streaming",
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "wall_time": wall_time,
+        "requests_per_sec": len(results) / wall_time if wall_time else 0.0,
+        "ttft": describe([r["ttft"] for r in results], SECONDS_BUCKETS),
+        "inter_token_gap": describe([gap for r in results for gap in r["gaps"]], GAP_BUCKETS),
+        "tokens_per_sec": describe([r["tokens_per_sec"] for r in results], RATE_BUCKETS),
+        "total_time": describe([r["total_time"] for r in results], SECONDS_BUCKETS),
+    }
+
+
+def print_summary(runs):
+    """One table: a row per mode and metric"""
+    units = {"ttft": "s", "inter_token_gap": "ms", "tokens_per_sec": "tok/s", "total_time": "s"}
+    print(f"{'mode':<14} {'metric':<24} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    print("-" * 78)
+    for run in runs:
+        for metric, unit in units.items():
+            stats = run[metric]
+            if not stats["count"]:
+                continue
+            scale = 1000 if unit == "ms" else 1
+            values = " ".join(f"{stats[key] * scale:>9.3f}" for key in ("p50", "p90", "p99", "max"))
+            print(f"{run['mode']:<14} {metric + ' (' + unit + ')':<24} {values}")
+        print(f"{run['mode']:<14} {'throughput':<24} {run['requests_per_sec']:>9.2f} req/s, "
+              f"{run['errors']} errors")
+        print()
+
+
+def benchmark(args):
+    """Non-interactive mode: many concurrent streamed and non-streamed requests"""
+    print("=" * 70)
+    print(f"STREAMING BENCHMARK: {args.requests} requests per mode, {args.concurrency} at a time")
+    print("=" * 70)
+    print()
+
+    client = AzureOpenAI(
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        api_key=AZURE_OPENAI_API_KEY,
+        api_version=AZURE_OPENAI_API_VERSION,
+    )
+
+    runs = [run_benchmark(client, stream, args.requests, args.concurrency) for stream in (False, True)]
+    print_summary(runs)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"requests": args.requests, "concurrency": args.concurrency, "runs": runs}, f, indent=2)
+        print(f"📄 Results written to {args.json}")
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Streaming vs non-streaming comparison")
+    parser.add_argument("--benchmark", action="store_true", help="Run many requests without pauses")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per mode (benchmark)")
+    parser.add_argument("--concurrency", type=int, default=5, help="Requests in flight at once (benchmark)")
+    parser.add_argument("--json", default=None, help="Write benchmark results to this JSON file")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args)
+    else:
+        main()
 
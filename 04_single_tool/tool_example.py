@@ -3,11 +3,14 @@ Step 4: Single Tool - Function Calling
 
 This demonstrates how to give the AI a tool (function) it can use.
 The AI will decide when to call the function based on the user's request.
+Both requests are streamed, so the tool runs as soon as its call is complete
+and the final answer appears word by word.
 """
 
 import sys
 import os
 import json
+import time
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -82,6 +85,11 @@ tools = [
     }
 ]
 
+# Which Python function runs for each tool name the AI may call
+available_functions = {
+    "generate_quiz": generate_quiz,
+}
+
 
 def main():
     print("="*70)
@@ -120,88 +128,128 @@ def main():
     print()
     
     # ========================================================================
-    # STEP 1: Send request with tools
+    # STEP 1: Send request with tools (streamed)
     # ========================================================================
     print("🚀 Sending request to AI (with tools available)...")
     print()
     
-    response = client.chat.completions.create(
+    start = time.perf_counter()
+    stream = client.chat.completions.create(
         model=GPT4_DEPLOYMENT_NAME,
         messages=messages,
         tools=tools,  # ⭐ Provide the tools
-        tool_choice="auto"  # Let AI decide when to use them
+        tool_choice="auto",  # Let AI decide when to use them
+        stream=True  # Get the reply piece by piece
     )
     
-    response_message = response.choices[0].message
+    def execute(tool_call):
+        """Run one complete tool call; returns the message with its result"""
+        function_name = tool_call["function"]["name"]
+        function_args = json.loads(tool_call["function"]["arguments"])
+        
+        print(f"📞 Function Call: {function_name}  (+{time.perf_counter() - start:.2f}s)")
+        print(f"📋 Arguments: {json.dumps(function_args, indent=2)}")
+        print()
+        
+        # ================================================================
+        # STEP 3: Execute the function
+        # ================================================================
+        print(f"⚙️  Executing {function_name}...")
+        
+        # Look the function up by name (Step 5 turns this into a tool registry)
+        function = available_functions.get(function_name)
+        if function is None:
+            function_response = json.dumps({"error": f"Unknown tool: {function_name}"})
+        else:
+            function_response = function(**function_args)
+        
+        print(f"✅ Function executed!")
+        print(f"📤 Result: {function_response[:100]}...")
+        print()
+        
+        return {
+            "tool_call_id": tool_call["id"],
+            "role": "tool",
+            "name": function_name,
+            "content": function_response
+        }
     
     # ========================================================================
-    # STEP 2: Check if AI wants to call a function
+    # STEP 2: Collect the reply as it streams
     # ========================================================================
-    if response_message.tool_calls:
-        print("🤖 AI decided to use a tool!")
-        print()
+    # Text arrives in delta.content. A tool call arrives in pieces, tagged
+    # with its index: first its id and name, then the JSON arguments a few
+    # characters at a time. When the next call begins (or the stream ends)
+    # a call is complete, so we can run it right away instead of waiting
+    # for the whole reply.
+    content = ""
+    tool_calls = []
+    tool_results = []
+    
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
         
-        # Add AI's response to messages
-        messages.append(response_message)
+        if delta.content:
+            content += delta.content
+            print(delta.content, end="", flush=True)
         
-        # Process each tool call
-        for tool_call in response_message.tool_calls:
-            function_name = tool_call.function.name
-            function_args = json.loads(tool_call.function.arguments)
-            
-            print(f"📞 Function Call: {function_name}")
-            print(f"📋 Arguments: {json.dumps(function_args, indent=2)}")
-            print()
-            
-            # ================================================================
-            # STEP 3: Execute the function
-            # ================================================================
-            print(f"⚙️  Executing {function_name}...")
-            
-            if function_name == "generate_quiz":
-                function_response = generate_quiz(
-                    topic=function_args.get("topic"),
-                    num_questions=function_args.get("num_questions", 5)
-                )
-            
-            print(f"✅ Function executed!")
-            print(f"📤 Result: {function_response[:100]}...")
-            print()
-            
-            # ================================================================
-            # STEP 4: Send function result back to AI
-            # ================================================================
-            messages.append({
-                "tool_call_id": tool_call.id,
-                "role": "tool",
-                "name": function_name,
-                "content": function_response
-            })
+        for piece in delta.tool_calls or []:
+            if piece.index == len(tool_calls):
+                if not tool_calls:
+                    print("🤖 AI decided to use a tool!")
+                    print()
+                else:
+                    tool_results.append(execute(tool_calls[-1]))
+                tool_calls.append({"id": piece.id, "type": "function",
+                                   "function": {"name": piece.function.name, "arguments": ""}})
+            tool_calls[piece.index]["function"]["arguments"] += piece.function.arguments or ""
+    
+    if tool_calls:
+        tool_results.append(execute(tool_calls[-1]))
+        
+        # ================================================================
+        # STEP 4: Send function results back to AI
+        # ================================================================
+        messages.append({"role": "assistant", "content": content or None, "tool_calls": tool_calls})
+        messages.extend(tool_results)
         
         # ================================================================
-        # STEP 5: Get final response from AI
+        # STEP 5: Stream the final response from AI
         # ================================================================
         print("🚀 Sending function results back to AI...")
         print()
         
-        final_response = client.chat.completions.create(
+        final_stream = client.chat.completions.create(
             model=GPT4_DEPLOYMENT_NAME,
-            messages=messages
+            messages=messages,
+            stream=True
         )
         
-        final_message = final_response.choices[0].message.content
-        
         print("="*70)
         print("FINAL RESPONSE:")
         print("="*70)
         print()
-        print(f"🤖 AI: {final_message}")
+        print("🤖 AI: ", end="", flush=True)
+        first_token = None
+        for chunk in final_stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                print(chunk.choices[0].delta.content, end="", flush=True)
+        print()
         print()
+        if first_token is not None:
+            print(f"⏱️  First word of the answer after {first_token:.2f}s, "
+                  f"done after {time.perf_counter() - start:.2f}s")
+            print()
         
     else:
-        # AI didn't use a tool
-        print("🤖 AI responded without using tools:")
-        print(response_message.content)
+        # AI didn't use a tool (its answer was printed as it streamed)
+        print()
+        print()
+        print("🤖 AI responded without using tools")
         print()
     
     # ========================================================================
@@ -215,6 +263,7 @@ def main():
     print("✅ AI decided to use the tool")
     print("✅ We executed the function")
     print("✅ AI formatted the results nicely")
+    print("✅ Streaming showed the call and the answer as they arrived")
     print()
     print("This is how AI can use external functions!")
     print()
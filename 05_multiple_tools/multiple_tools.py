@@ -2,11 +2,19 @@
 Step 5: Multiple Tools - AI Chooses the Right Tool
 
 Demonstrates giving the AI multiple tools and watching it choose the right one.
+
+The tools are registered with a ToolRegistry (see tool_runtime.py): their
+JSON schemas come from the function signatures, every tool call the AI
+makes in a turn runs at the same time, and the conversation continues until
+the AI answers without calling a tool. Replies are streamed: each tool
+starts as soon as its arguments have arrived, and the answer prints token
+by token. The tools are pure (same arguments, same result), so repeated
+calls are answered from their caches.
 """
 
 import sys
 import os
-import json
+import time
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -17,14 +25,25 @@ from config import (
     AZURE_OPENAI_API_VERSION,
     GPT4_DEPLOYMENT_NAME
 )
+from tool_runtime import ToolRegistry, ToolRunner, stream_tool_loop
 
 
 # ============================================================================
 # DEFINE MULTIPLE TOOLS
 # ============================================================================
 
-def generate_quiz(topic, num_questions=5):
-    """Generate a quiz on a topic"""
+registry = ToolRegistry(default_timeout=10)
+
+
+@registry.tool(pure=True)
+def generate_quiz(topic: str, num_questions: int = 5):
+    """
+    Generate a quiz on a specific topic with multiple choice questions
+
+    Args:
+        topic: The topic for the quiz
+        num_questions: Number of questions
+    """
     questions = []
     for i in range(num_questions):
         questions.append({
@@ -32,80 +51,41 @@ def generate_quiz(topic, num_questions=5):
             "options": ["A) Option 1", "B) Option 2", "C) Option 3", "D) Option 4"],
             "correct": "A"
         })
-    return json.dumps({"topic": topic, "questions": questions})
+    return {"topic": topic, "questions": questions}
+
 
+@registry.tool(pure=True, cache_ttl=3600)
+def explain_concept(topic: str):
+    """
+    Explain a concept clearly with examples and key points
 
-def explain_concept(topic):
-    """Explain a concept clearly"""
-    return json.dumps({
+    Args:
+        topic: The concept to explain
+    """
+    return {
         "topic": topic,
         "explanation": f"This is a detailed explanation of {topic}",
         "example": f"Example related to {topic}",
         "key_points": [f"Point 1 about {topic}", f"Point 2 about {topic}"]
-    })
+    }
 
 
-def assess_answer(answer, question):
-    """Assess a student's answer"""
-    return json.dumps({
+@registry.tool(timeout=5, pure=True)
+def assess_answer(answer: str, question: str):
+    """
+    Assess and grade a student's answer to a question
+
+    Args:
+        answer: The student's answer
+        question: The question that was asked
+    """
+    return {
         "answer": answer,
         "question": question,
         "assessment": "Good attempt!",
         "grade": "B+",
         "feedback": "Consider adding more details"
-    })
-
-
-# ============================================================================
-# DEFINE TOOL SPECIFICATIONS
-# ============================================================================
-
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "generate_quiz",
-            "description": "Generate a quiz on a specific topic with multiple choice questions",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "topic": {"type": "string", "description": "The topic for the quiz"},
-                    "num_questions": {"type": "integer", "description": "Number of questions", "default": 5}
-                },
-                "required": ["topic"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "explain_concept",
-            "description": "Explain a concept clearly with examples and key points",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "topic": {"type": "string", "description": "The concept to explain"}
-                },
-                "required": ["topic"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "assess_answer",
-            "description": "Assess and grade a student's answer to a question",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "answer": {"type": "string", "description": "The student's answer"},
-                    "question": {"type": "string", "description": "The question that was asked"}
-                },
-                "required": ["answer", "question"]
-            }
-        }
     }
-]
 
 
 def main():
@@ -120,23 +100,33 @@ def main():
         api_key=AZURE_OPENAI_API_KEY,
         api_version=AZURE_OPENAI_API_VERSION,
     )
+    runner = ToolRunner(registry)
     
-    print("🔧 Available Tools:")
-    for tool in tools:
-        print(f"  - {tool['function']['name']}: {tool['function']['description']}")
+    print("🔧 Available Tools (schemas built from the function signatures):")
+    for spec in registry.specs():
+        function = spec["function"]
+        params = ", ".join(
+            name + ("" if name in function["parameters"]["required"] else "?")
+            for name in function["parameters"]["properties"]
+        )
+        print(f"  - {function['name']}({params}): {function['description']}")
     print()
     
-    # Test different requests that should trigger different tools
+    # Test different requests that should trigger different tools.
+    # "Explain recursion..." needs two tools - both run at the same time.
     test_cases = [
-        ("Create a quiz on Python basics with 3 questions", "generate_quiz"),
-        ("Explain what machine learning is", "explain_concept"),
-        ("Grade this answer: 'Python is a programming language'", "assess_answer"),
+        ("Create a quiz on Python basics with 3 questions", ["generate_quiz"]),
+        ("Explain what machine learning is", ["explain_concept"]),
+        ("Grade this answer: 'Python is a programming language'", ["assess_answer"]),
+        ("Explain recursion, then give me a quiz on it", ["explain_concept", "generate_quiz"]),
+        # Another student asks the same thing: answered from the tool cache
+        ("Explain what machine learning is", ["explain_concept"]),
     ]
     
-    for user_request, expected_tool in test_cases:
+    for user_request, expected_tools in test_cases:
         print("="*70)
         print(f"👤 Student: {user_request}")
-        print(f"   Expected tool: {expected_tool}")
+        print(f"   Expected tools: {', '.join(expected_tools)}")
         print("="*70)
         
         messages = [
@@ -144,51 +134,57 @@ def main():
             {"role": "user", "content": user_request}
         ]
         
-        # Send request with tools
-        response = client.chat.completions.create(
-            model=GPT4_DEPLOYMENT_NAME,
-            messages=messages,
-            tools=tools,
-            tool_choice="auto"
-        )
-        
-        response_message = response.choices[0].message
+        # Call tools until the AI answers, printing everything as it streams
+        start = time.perf_counter()
+        results = []
+        first_token = None
+        for event, data in stream_tool_loop(client, messages, registry, model=GPT4_DEPLOYMENT_NAME, runner=runner):
+            if event == "tool_start":
+                print(f"\n🤖 AI called: {data['function']['name']} (started at +{time.perf_counter() - start:.2f}s)")
+                print(f"📋 Arguments: {data['function']['arguments']}")
+            elif event == "tool_result":
+                results.append(data)
+                status = "❌" if data.error else "💾" if data.cached else "✅"
+                timing = "cached, tool not run" if data.cached else f"{data.elapsed:.2f}s"
+                print(f"{status} {data.name} result ({timing}): {data.content[:100]}...")
+            elif event == "token":
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                    print(f"\n🤖 AI (first token at +{first_token:.2f}s): ", end="")
+                print(data, end="", flush=True)
+        elapsed = time.perf_counter() - start
+        print()
         
-        if response_message.tool_calls:
-            tool_call = response_message.tool_calls[0]
-            function_name = tool_call.function.name
-            function_args = json.loads(tool_call.function.arguments)
-            
-            print(f"\\n🤖 AI chose: {function_name}")
-            print(f"📋 Arguments: {json.dumps(function_args, indent=2)}")
-            
-            # Check if correct tool was chosen
-            if function_name == expected_tool:
-                print("✅ Correct tool selected!")
+        if results:
+            # Check if the right tools were chosen
+            chosen = sorted({result.name for result in results})
+            if chosen == sorted(expected_tools):
+                print("\n✅ Correct tools selected!")
             else:
-                print(f"⚠️  Expected {expected_tool}, got {function_name}")
+                print(f"\n⚠️  Expected {', '.join(expected_tools)}, got {', '.join(chosen)}")
             
-            # Execute the function
-            if function_name == "generate_quiz":
-                result = generate_quiz(function_args.get("topic"), function_args.get("num_questions", 5))
-            elif function_name == "explain_concept":
-                result = explain_concept(function_args.get("topic"))
-            elif function_name == "assess_answer":
-                result = assess_answer(function_args.get("answer"), function_args.get("question", ""))
-            
-            print(f"\\n📤 Function result: {result[:100]}...")
+            tool_time = sum(result.elapsed for result in results)
+            print(f"⏱️  {len(results)} tool call(s) with {tool_time:.2f}s of tool time; whole turn took {elapsed:.2f}s")
         else:
-            print("\\n🤖 AI responded without using tools")
-            print(response_message.content)
-        
+            print("\n🤖 AI responded without using tools")
         print()
     
+    runner.close()
+    
+    print("💾 Tool caches:")
+    for name, stats in registry.cache_stats().items():
+        print(f"  - {name}: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+    print()
+    
     print("="*70)
     print("SUMMARY:")
     print("="*70)
     print("✅ AI successfully chose the right tool for each request")
     print("✅ Multiple tools enable more capabilities")
     print("✅ AI automatically routes to appropriate tool")
+    print("✅ Tool calls in the same turn run concurrently")
+    print("✅ Pure tools answer repeated calls from their cache")
+    print("✅ Streaming shows tool calls and the answer as they arrive")
     print()
     print("This is the foundation for intelligent assistants!")
     print()
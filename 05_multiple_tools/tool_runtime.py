@@ -0,0 +1,738 @@
+"""
+Step 5: Multiple Tools - Tool Runtime
+
+A small, reusable engine for function calling.
+
+Steps 4 and 5 wrote every tool twice (the function and a hand-written JSON
+schema), picked the function with an `if function_name == ...` chain and
+ran the tool calls one after another - or only the first one. Here:
+
+1. @registry.tool registers a function and builds its JSON schema from the
+   signature: type hints give the types, defaults make a parameter
+   optional, and the docstring's Args: section gives the descriptions
+2. Arguments from the model are validated against that schema before the
+   function runs (missing, unknown or wrongly typed arguments)
+3. All tool calls of one assistant turn run at the same time on a thread
+   pool (or with asyncio), each with its own timeout
+4. run_tool_loop() sends the results back and repeats until the model
+   answers without calling a tool
+   (stream_tool_loop() does the same with streamed completions: each tool
+   starts as soon as its arguments have arrived, and the answer is yielded
+   token by token)
+5. Tools declared pure=True are memoized: a call with the same arguments
+   (as canonical JSON, defaults filled in) is answered from a per-tool LRU
+   cache without running the tool, and its ToolResult says cached=True
+
+A failing tool never crashes the conversation: its error is sent back to
+the model as the tool result ({"error": "..."}), so it can try again or
+explain the problem.
+
+Usage:
+    registry = ToolRegistry()
+
+    @registry.tool(timeout=5, pure=True)
+    def explain_concept(topic: str, level: str = "beginner"):
+        \"\"\"
+        Explain a concept clearly
+
+        Args:
+            topic: The concept to explain
+            level: How much the student already knows
+        \"\"\"
+        ...
+
+    answer, results = run_tool_loop(client, messages, registry, model=GPT4_DEPLOYMENT_NAME)
+"""
+
+import asyncio
+import inspect
+import json
+import re
+import threading
+import time
+import typing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+# ============================================================================
+# SCHEMAS FROM SIGNATURES
+# ============================================================================
+
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+
+def json_schema(annotation):
+    """
+    JSON schema for a type hint
+
+    Supports str, int, float, bool, list/List[X], dict, Optional[X] and
+    Literal[...]; anything else (or no hint) accepts any value.
+    """
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Literal:
+        return {"type": JSON_TYPES.get(type(args[0]), "string"), "enum": list(args)}
+    if origin is typing.Union:
+        # Optional[X] is Union[X, None]: describe X
+        others = [arg for arg in args if arg is not type(None)]
+        return json_schema(others[0]) if len(others) == 1 else {}
+    if origin in (list, tuple):
+        schema = {"type": "array"}
+        if args and args[0] is not Ellipsis:
+            schema["items"] = json_schema(args[0])
+        return schema
+    if origin is dict:
+        return {"type": "object"}
+    if annotation in JSON_TYPES:
+        return {"type": JSON_TYPES[annotation]}
+    return {}
+
+
+def parse_docstring(docstring):
+    """
+    Split a docstring into its description and Args: descriptions
+
+    Returns:
+        Tuple of (description, {parameter name: description})
+    """
+    text = inspect.cleandoc(docstring or "")
+    parts = re.split(r"^\s*(?:Args|Arguments|Parameters):\s*$", text, maxsplit=1, flags=re.MULTILINE)
+    description = " ".join(parts[0].split("\n\n")[0].split())
+
+    params = {}
+    if len(parts) > 1:
+        name = None
+        for line in parts[1].splitlines():
+            if line and not line[0].isspace() and line.rstrip().endswith(":"):
+                break  # the next section (Returns:, Raises:, ...)
+            match = re.match(r"\s*(\w+)(?:\s*\([^)]*\))?:\s*(.*)", line)
+            if match and (name is None or len(line) - len(line.lstrip()) <= indent):
+                name, indent = match.group(1), len(line) - len(line.lstrip())
+                params[name] = match.group(2).strip()
+            elif name is not None and line.strip():
+                params[name] += " " + line.strip()
+    return description, params
+
+
+# ============================================================================
+# MEMOIZING PURE TOOLS
+# ============================================================================
+
+def canonical_json(arguments):
+    """The same arguments always give the same text: sorted keys, no spaces"""
+    return json.dumps(arguments, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class ToolCache:
+    """
+    Results of one pure tool by its arguments: an LRU with a TTL
+
+    Stores the text sent back to the model. Results longer than
+    max_result_chars are not kept, so one huge answer can't crowd out the
+    rest. Locked, because the runner's worker threads write to it.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=600, max_result_chars=20000):
+        """
+        Args:
+            max_entries: Results kept before the least recently used is evicted
+            ttl_seconds: How long a result stays valid
+            max_result_chars: Longest result worth keeping
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_result_chars = max_result_chars
+        self._entries = OrderedDict()  # key -> (expires_at, content)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.too_large = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """The cached result for these arguments, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, content):
+        """Store a result, evicting the least recently used if full; returns False if too large"""
+        if len(content) > self.max_result_chars:
+            self.too_large += 1
+            return False
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, content)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def stats(self):
+        """Counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "too_large": self.too_large,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# ============================================================================
+# TOOLS AND THE REGISTRY
+# ============================================================================
+
+class ToolArgumentError(ValueError):
+    """The model's arguments don't match the tool's schema"""
+
+
+class Tool:
+    """A registered function with its schema"""
+
+    def __init__(self, function, name=None, description=None, timeout=None,
+                 pure=False, cache_size=256, cache_ttl=600, cache_max_chars=20000):
+        """
+        Args:
+            function: The Python function (sync or async)
+            name: Tool name (default: the function's name)
+            description: Tool description (default: the docstring's first paragraph)
+            timeout: Seconds the tool may run (default: the registry's)
+            pure: Same arguments always give the same result, with no side
+                effects - results are then memoized in a ToolCache
+            cache_size, cache_ttl, cache_max_chars: The ToolCache limits
+        """
+        self.function = function
+        self.name = name or function.__name__
+        self.timeout = timeout
+        self.is_async = inspect.iscoroutinefunction(function)
+        self.signature = inspect.signature(function)
+        self.cache = ToolCache(cache_size, cache_ttl, cache_max_chars) if pure else None
+
+        doc_description, doc_params = parse_docstring(function.__doc__)
+        self.description = description or doc_description or self.name
+
+        hints = typing.get_type_hints(function)
+        self.properties = {}
+        self.required = []
+        self.nullable = set()  # optional parameters that default to None
+        for param in self.signature.parameters.values():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            schema = json_schema(hints.get(param.name))
+            if param.name in doc_params:
+                schema["description"] = doc_params[param.name]
+            if param.default is param.empty:
+                self.required.append(param.name)
+            elif param.default is None:
+                self.nullable.add(param.name)
+            else:
+                schema["default"] = param.default
+            self.properties[param.name] = schema
+
+    def spec(self):
+        """The entry for the `tools` argument of chat.completions.create"""
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": self.properties,
+                    "required": self.required,
+                },
+            },
+        }
+
+    def validate(self, arguments):
+        """
+        Parse and check the model's arguments
+
+        Args:
+            arguments: The tool call's JSON arguments (string) or a dict
+
+        Returns:
+            Dict of keyword arguments for the function
+
+        Raises:
+            ToolArgumentError: Invalid JSON, missing or unknown arguments,
+                wrong types or values outside an enum
+        """
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments or "{}")
+            except json.JSONDecodeError as e:
+                raise ToolArgumentError(f"Arguments are not valid JSON: {e}") from e
+        if not isinstance(arguments, dict):
+            raise ToolArgumentError("Arguments must be a JSON object")
+
+        missing = [name for name in self.required if name not in arguments]
+        if missing:
+            raise ToolArgumentError(f"Missing required argument(s): {', '.join(missing)}")
+        unknown = [name for name in arguments if name not in self.properties]
+        if unknown:
+            raise ToolArgumentError(f"Unknown argument(s): {', '.join(unknown)}")
+
+        checked = {}
+        for name, value in arguments.items():
+            if value is None and name in self.nullable:
+                checked[name] = None
+            else:
+                checked[name] = check_value(name, value, self.properties[name])
+        return checked
+
+    def cache_key(self, arguments):
+        """
+        Canonical JSON of validated arguments, with defaults filled in
+
+        {"topic": "x"} and {"num_questions": 5, "topic": "x"} are the same
+        call when num_questions defaults to 5, so they share a cache entry.
+        """
+        bound = self.signature.bind(**arguments)
+        bound.apply_defaults()
+        return canonical_json(bound.arguments)
+
+
+def check_value(name, value, schema):
+    """Check one argument against its schema; integers written as 5.0 become 5"""
+    kind = schema.get("type")
+    if "enum" in schema and value not in schema["enum"]:
+        raise ToolArgumentError(f"{name} must be one of {schema['enum']}, got {value!r}")
+    if kind == "integer":
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ToolArgumentError(f"{name} must be an integer, got {value!r}")
+    elif kind == "number":
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ToolArgumentError(f"{name} must be a number, got {value!r}")
+    elif kind == "boolean" and not isinstance(value, bool):
+        raise ToolArgumentError(f"{name} must be true or false, got {value!r}")
+    elif kind == "string" and not isinstance(value, str):
+        raise ToolArgumentError(f"{name} must be a string, got {value!r}")
+    elif kind == "array":
+        if not isinstance(value, list):
+            raise ToolArgumentError(f"{name} must be a list, got {value!r}")
+        if "items" in schema:
+            value = [check_value(f"{name}[{i}]", item, schema["items"]) for i, item in enumerate(value)]
+    elif kind == "object" and not isinstance(value, dict):
+        raise ToolArgumentError(f"{name} must be an object, got {value!r}")
+    return value
+
+
+class ToolRegistry:
+    """The tools the model may call, by name"""
+
+    def __init__(self, default_timeout=30.0):
+        """
+        Args:
+            default_timeout: Seconds a tool may run unless it sets its own
+        """
+        self.default_timeout = default_timeout
+        self._tools = {}
+
+    def tool(self, function=None, *, name=None, description=None, timeout=None, pure=False, **cache_options):
+        """
+        Decorator that registers a function as a tool
+
+        Works bare (@registry.tool) or with options
+        (@registry.tool(timeout=5, pure=True, cache_ttl=300)); see Tool.
+        """
+        def register(function):
+            self.register(Tool(function, name, description, timeout, pure, **cache_options))
+            return function
+
+        if function is not None:
+            return register(function)
+        return register
+
+    def register(self, tool):
+        if tool.name in self._tools:
+            raise ValueError(f"A tool named {tool.name!r} is already registered")
+        self._tools[tool.name] = tool
+        return tool
+
+    def __contains__(self, name):
+        return name in self._tools
+
+    def __getitem__(self, name):
+        return self._tools[name]
+
+    def __len__(self):
+        return len(self._tools)
+
+    def specs(self):
+        """All tools, for the `tools` argument of chat.completions.create"""
+        return [tool.spec() for tool in self._tools.values()]
+
+    def cache_stats(self):
+        """Cache counters of every pure tool, by name"""
+        return {name: tool.cache.stats() for name, tool in self._tools.items() if tool.cache is not None}
+
+
+# ============================================================================
+# RUNNING TOOL CALLS
+# ============================================================================
+
+class ToolResult:
+    """What one tool call returned (or why it failed)"""
+
+    __slots__ = ("call_id", "name", "arguments", "content", "error", "elapsed", "cached")
+
+    def __init__(self, call_id, name, arguments, content, error=None, elapsed=0.0, cached=False):
+        self.call_id = call_id
+        self.name = name
+        self.arguments = arguments
+        self.content = content  # text sent back to the model
+        self.error = error
+        self.elapsed = elapsed
+        self.cached = cached  # answered from the tool's cache, the tool didn't run
+
+    def message(self):
+        """The "tool" message that answers the call"""
+        return {"role": "tool", "tool_call_id": self.call_id, "name": self.name, "content": self.content}
+
+
+def _call_fields(call):
+    """(id, name, arguments) of an SDK tool call or its dict form"""
+    if isinstance(call, dict):
+        return call["id"], call["function"]["name"], call["function"].get("arguments") or "{}"
+    return call.id, call.function.name, call.function.arguments or "{}"
+
+
+def _encode(value):
+    """Tool results go back to the model as text"""
+    return value if isinstance(value, str) else json.dumps(value, default=str)
+
+
+def _error(message):
+    return json.dumps({"error": message})
+
+
+class ToolRunner:
+    """
+    Runs the tool calls of one assistant turn concurrently
+
+    Sync tools run on a thread pool; async tools on an event loop (their
+    own, in run(); the caller's, in arun()). A tool that runs past its
+    timeout is reported to the model as timed out. Its thread can't be
+    stopped, so keep tools well-behaved - the timeout protects the
+    conversation, not the pool.
+
+    Reuse one runner across turns and close() it when done (or use it as
+    a context manager); every runner owns a thread pool.
+    """
+
+    def __init__(self, registry, max_workers=8):
+        self.registry = registry
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut the thread pool down (tools still running are left to finish)"""
+        self.executor.shutdown(wait=False)
+
+    def _prepare(self, call):
+        """Look up and validate a call; returns (call id, name, tool, arguments, error)"""
+        call_id, name, raw = _call_fields(call)
+        if name not in self.registry:
+            return call_id, name, None, raw, f"Unknown tool: {name}"
+        tool = self.registry[name]
+        try:
+            return call_id, name, tool, tool.validate(raw), None
+        except ToolArgumentError as e:
+            return call_id, name, tool, raw, str(e)
+
+    def _lookup(self, tool, arguments):
+        """(cache key, cached content) for a pure tool; (None, None) otherwise"""
+        if tool.cache is None:
+            return None, None
+        key = tool.cache_key(arguments)
+        return key, tool.cache.get(key)
+
+    def _finish(self, call_id, name, tool, arguments, key, value, elapsed):
+        """A successful result, memoized if the tool is pure"""
+        content = _encode(value)
+        if key is not None:
+            tool.cache.set(key, content)
+        return ToolResult(call_id, name, arguments, content, elapsed=elapsed)
+
+    def _timeout(self, tool):
+        return tool.timeout if tool.timeout is not None else self.registry.default_timeout
+
+    def _invoke(self, tool, arguments):
+        """Run a tool in a worker thread (async tools get their own event loop); returns (value, seconds)"""
+        started = time.perf_counter()
+        if tool.is_async:
+            value = asyncio.run(tool.function(**arguments))
+        else:
+            value = tool.function(**arguments)
+        return value, time.perf_counter() - started
+
+    def start(self, call):
+        """
+        Start one tool call without waiting for it
+
+        Args:
+            call: A tool call (SDK object or dict)
+
+        Returns:
+            A handle to pass to wait()
+        """
+        started = time.perf_counter()
+        call_id, name, tool, arguments, error = self._prepare(call)
+        key, hit = (None, None) if error else self._lookup(tool, arguments)
+        future = None if error or hit is not None else self.executor.submit(self._invoke, tool, arguments)
+        return started, call_id, name, tool, arguments, error, key, hit, future
+
+    def wait(self, handle):
+        """The ToolResult of a started call, waiting at most for what is left of its timeout"""
+        started, call_id, name, tool, arguments, error, key, hit, future = handle
+        if error:
+            return ToolResult(call_id, name, arguments, _error(error), error)
+        if hit is not None:
+            return ToolResult(call_id, name, arguments, hit, cached=True)
+        remaining = self._timeout(tool) - (time.perf_counter() - started)
+        try:
+            value, elapsed = future.result(timeout=max(0.0, remaining))
+            return self._finish(call_id, name, tool, arguments, key, value, elapsed)
+        except FutureTimeout:
+            message = f"{name} timed out after {self._timeout(tool):g}s"
+        except Exception as e:
+            message = f"{name} failed: {e}"
+        return ToolResult(call_id, name, arguments, _error(message), message, time.perf_counter() - started)
+
+    def run(self, tool_calls):
+        """
+        Run tool calls at the same time and wait for all of them
+
+        Args:
+            tool_calls: The assistant message's tool_calls (SDK objects or dicts)
+
+        Returns:
+            List of ToolResult, in the order of the calls
+        """
+        handles = [self.start(call) for call in tool_calls]
+        return [self.wait(handle) for handle in handles]
+
+    async def arun(self, tool_calls):
+        """Async version of run (sync tools still run on the thread pool)"""
+        loop = asyncio.get_running_loop()
+
+        async def one(call):
+            started = time.perf_counter()
+            call_id, name, tool, arguments, error = self._prepare(call)
+            if error:
+                return ToolResult(call_id, name, arguments, _error(error), error)
+            key, hit = self._lookup(tool, arguments)
+            if hit is not None:
+                return ToolResult(call_id, name, arguments, hit, cached=True)
+            if tool.is_async:
+                work = tool.function(**arguments)
+            else:
+                work = loop.run_in_executor(self.executor, lambda: tool.function(**arguments))
+            try:
+                value = await asyncio.wait_for(work, self._timeout(tool))
+                return self._finish(call_id, name, tool, arguments, key, value,
+                                    time.perf_counter() - started)
+            except asyncio.TimeoutError:
+                message = f"{name} timed out after {self._timeout(tool):g}s"
+            except Exception as e:
+                message = f"{name} failed: {e}"
+            return ToolResult(call_id, name, arguments, _error(message), message,
+                              time.perf_counter() - started)
+
+        return list(await asyncio.gather(*(one(call) for call in tool_calls)))
+
+
+# ============================================================================
+# THE CONVERSATION LOOP
+# ============================================================================
+
+def assistant_message(message):
+    """An SDK assistant message as a plain dict (to append to `messages`)"""
+    entry = {"role": "assistant", "content": message.content}
+    if message.tool_calls:
+        entry["tool_calls"] = [
+            {"id": call.id, "type": "function",
+             "function": {"name": call.function.name, "arguments": call.function.arguments}}
+            for call in message.tool_calls
+        ]
+    return entry
+
+
+class ToolCallAssembler:
+    """
+    Rebuilds tool calls from a streamed reply
+
+    A stream sends each call's id and name first, then its arguments a few
+    characters at a time, keyed by the call's index. feed() returns the
+    calls whose arguments just became a complete JSON object, so they can
+    start while the model is still writing the next one.
+    """
+
+    def __init__(self):
+        self.calls = []  # in the assistant message's dict form, by index
+        self._complete = set()
+
+    def feed(self, deltas):
+        """
+        Add a chunk's tool-call deltas
+
+        Returns:
+            List of calls completed by this chunk
+        """
+        completed = []
+        for delta in deltas:
+            while len(self.calls) <= delta.index:
+                self.calls.append({"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+            call = self.calls[delta.index]
+            if delta.id:
+                call["id"] = delta.id
+            if delta.function is None:
+                continue
+            call["function"]["name"] += delta.function.name or ""
+            fragment = delta.function.arguments or ""
+            call["function"]["arguments"] += fragment
+            # Only a "}" can complete the object, so don't re-parse otherwise
+            if "}" in fragment and delta.index not in self._complete:
+                try:
+                    complete = isinstance(json.loads(call["function"]["arguments"]), dict)
+                except json.JSONDecodeError:
+                    complete = False
+                if complete:
+                    self._complete.add(delta.index)
+                    completed.append(call)
+        return completed
+
+    def finish(self):
+        """The calls never completed (their arguments are invalid; running them reports that)"""
+        remaining = [call for index, call in enumerate(self.calls) if index not in self._complete]
+        self._complete.update(range(len(self.calls)))
+        return remaining
+
+
+def stream_tool_loop(client, messages, registry, model, runner=None, max_rounds=5, **kwargs):
+    """
+    run_tool_loop, streamed
+
+    Every completion is streamed. Tool calls are assembled from the deltas
+    and each one starts as soon as its arguments are complete, while the
+    rest of the reply is still arriving; the answer is yielded token by
+    token. After max_rounds the model is asked to answer without tools.
+
+    Args:
+        Same as run_tool_loop
+
+    Yields:
+        (event, data) tuples:
+        ("token", text)         - the next piece of the answer
+        ("tool_start", call)    - a call (dict form) has started running
+        ("tool_result", result) - its ToolResult
+        ("done", answer)        - the whole answer text, last
+    """
+    if runner is None:
+        with ToolRunner(registry) as runner:
+            yield from stream_tool_loop(client, messages, registry, model, runner, max_rounds, **kwargs)
+        return
+    for round_number in range(max_rounds + 1):
+        stream = client.chat.completions.create(
+            model=model, messages=messages, tools=registry.specs(),
+            tool_choice="auto" if round_number < max_rounds else "none", stream=True, **kwargs
+        )
+        assembler = ToolCallAssembler()
+        handles = []
+        text = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue  # usage or content-filter chunks
+            delta = chunk.choices[0].delta
+            if delta.content:
+                text.append(delta.content)
+                yield "token", delta.content
+            if delta.tool_calls:
+                for call in assembler.feed(delta.tool_calls):
+                    handles.append(runner.start(call))
+                    yield "tool_start", call
+        for call in assembler.finish():
+            handles.append(runner.start(call))
+            yield "tool_start", call
+
+        answer = "".join(text)
+        entry = {"role": "assistant", "content": answer or None}
+        if assembler.calls:
+            entry["tool_calls"] = assembler.calls
+        messages.append(entry)
+        if not assembler.calls:
+            yield "done", answer
+            return
+
+        for handle in handles:
+            result = runner.wait(handle)
+            messages.append(result.message())
+            yield "tool_result", result
+
+
+def run_tool_loop(client, messages, registry, model, runner=None, max_rounds=5, **kwargs):
+    """
+    Let the model call tools until it answers
+
+    Each round sends the conversation with the registry's tools; every tool
+    call of the reply is run (concurrently) and its result appended. When a
+    reply has no tool calls, its text is the answer. After max_rounds the
+    model is asked to answer without tools.
+
+    Args:
+        client: AzureOpenAI client
+        messages: The conversation so far (extended in place)
+        registry: ToolRegistry with the available tools
+        model: Deployment name
+        runner: ToolRunner to use (default: a new one for this registry,
+            closed when the loop ends)
+        max_rounds: Most rounds of tool calls
+        **kwargs: Extra completion options (temperature, ...)
+
+    Returns:
+        Tuple of (answer text, list of every ToolResult in order)
+    """
+    if runner is None:
+        with ToolRunner(registry) as runner:
+            return run_tool_loop(client, messages, registry, model, runner, max_rounds, **kwargs)
+    results = []
+    for _ in range(max_rounds):
+        response = client.chat.completions.create(
+            model=model, messages=messages, tools=registry.specs(), tool_choice="auto", **kwargs
+        )
+        message = response.choices[0].message
+        messages.append(assistant_message(message))
+        if not message.tool_calls:
+            return message.content, results
+
+        round_results = runner.run(message.tool_calls)
+        results.extend(round_results)
+        messages.extend(result.message() for result in round_results)
+
+    # Out of rounds: answer with what the tools have returned so far
+    response = client.chat.completions.create(
+        model=model, messages=messages, tools=registry.specs(), tool_choice="none", **kwargs
+    )
+    message = response.choices[0].message
+    messages.append(assistant_message(message))
+    return message.content, results
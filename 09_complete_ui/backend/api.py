@@ -9,18 +9,44 @@ Run with: uvicorn api:app --reload
 
 import sys
 import os
+import math
+import time
+import uuid
 from typing import List, Optional
 from datetime import datetime
 
 # Add path for config import (go up 3 levels to reach project root)
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+import openai
 
 # Import orchestrator from same directory
 from orchestrator import Orchestrator
+from resilience import CircuitOpenError, DeadlineExceeded, retry_after_seconds
+from rate_limiter import RateLimitExceeded
+from quiz_model import QuizFormatError
+from metrics import REGISTRY, CONTENT_TYPE, HTTP_REQUESTS, HTTP_DURATION, server_timing
+from session_store import SessionStore
+from conversation_store import ConversationStore
+from streaming import sse_event, ndjson_line
+from config import (
+    SESSION_MAX_COUNT,
+    SESSION_TTL_SECONDS,
+    SESSION_MAX_BYTES,
+    SESSION_MAX_MESSAGES,
+    CONVERSATION_DB_PATH,
+    CONVERSATION_FLUSH_MS,
+    CONVERSATION_RETENTION_DAYS,
+    CONVERSATION_MAX_MESSAGES,
+    BATCH_CONCURRENCY,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_ITEM_TIMEOUT_SECONDS,
+    BATCH_MAX_ITEMS
+)
 
 
 # ============================================================================
@@ -39,6 +65,8 @@ class ChatRequest(BaseModel):
     """Request model for chat endpoint"""
     message: str
     conversation_history: List[Message] = []
+    session_id: Optional[str] = None  # Can also be sent as an X-Session-ID header
+    fresh: bool = False  # Skip the response cache (always generate a new answer)
 
 
 class ChatResponse(BaseModel):
@@ -46,6 +74,23 @@ class ChatResponse(BaseModel):
     response: str
     agent: str
     timestamp: str
+    session_id: str
+    tokens_saved: int = 0  # Prompt tokens saved by the history window (chat only)
+
+
+class BatchItem(BaseModel):
+    """One prompt in a batch"""
+    message: str
+    id: Optional[str] = None  # Echoed back so results can be matched up
+    session_id: Optional[str] = None  # Default: a throwaway session per item
+    fresh: bool = False
+
+
+class BatchChatRequest(BaseModel):
+    """Request model for the batch chat endpoint"""
+    items: List[BatchItem]
+    concurrency: Optional[int] = None  # Default BATCH_CONCURRENCY, capped at BATCH_MAX_CONCURRENCY
+    timeout: Optional[float] = None  # Seconds per item, default BATCH_ITEM_TIMEOUT_SECONDS
 
 
 class HealthResponse(BaseModel):
@@ -71,10 +116,106 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-ID", "Server-Timing"],
+)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Count every request and time it, by endpoint and status
+    
+    The time is also added to the Server-Timing header as "app", next to
+    any stages the endpoint reported. Streaming endpoints are timed until
+    their headers are sent, not until the stream ends.
+    """
+    started = time.perf_counter()
+    response = None
+    status = 500  # if the endpoint raised
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        # The route template (/api/chat), never the raw URL, so unknown paths don't add series
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        HTTP_REQUESTS.inc(method=request.method, path=path, status=status)
+        HTTP_DURATION.observe(elapsed, method=request.method, path=path)
+        if response is not None:
+            timing = response.headers.get("Server-Timing")
+            total = f"app;dur={elapsed * 1000:.1f}"
+            response.headers["Server-Timing"] = f"{timing}, {total}" if timing else total
+
+# Durable copy of every conversation (optional), so sessions survive restarts
+conversation_store = None
+if CONVERSATION_DB_PATH:
+    conversation_store = ConversationStore(
+        CONVERSATION_DB_PATH,
+        flush_interval=CONVERSATION_FLUSH_MS / 1000,
+        retention_days=CONVERSATION_RETENTION_DAYS,
+        max_messages=CONVERSATION_MAX_MESSAGES,
+    )
+
+# Per-student conversation histories (bounded: LRU + idle TTL + memory ceiling)
+session_store = SessionStore(
+    max_sessions=SESSION_MAX_COUNT,
+    ttl_seconds=SESSION_TTL_SECONDS,
+    max_bytes=SESSION_MAX_BYTES,
+    max_messages=SESSION_MAX_MESSAGES,
+    persistent=conversation_store,
 )
 
 # Initialize orchestrator (singleton pattern)
-orchestrator = Orchestrator()
+orchestrator = Orchestrator(session_store=session_store)
+
+
+def resolve_session_id(request, header_session_id):
+    """
+    Work out which session a request belongs to
+    
+    The request body field wins over the X-Session-ID header. Requests with
+    neither start a new session; its id is returned so the client can reuse it.
+    """
+    return request.session_id or header_session_id or uuid.uuid4().hex
+
+
+def upstream_error(error):
+    """
+    Turn an upstream failure that survived the retries into a proper HTTP error
+    
+    Returns:
+        HTTPException (503 circuit open, 429 rate limited by us or by the
+        upstream, 504 timed out, 502 upstream error or an invalid quiz), or
+        None for anything else
+    """
+    if isinstance(error, CircuitOpenError):
+        return HTTPException(
+            status_code=503,
+            detail="The AI service is temporarily unavailable, please try again shortly",
+            headers={"Retry-After": str(math.ceil(error.retry_after))},
+        )
+    if isinstance(error, RateLimitExceeded):
+        return HTTPException(
+            status_code=429,
+            detail="Too many requests right now, please try again shortly",
+            headers={"Retry-After": str(math.ceil(error.retry_after))},
+        )
+    if isinstance(error, openai.RateLimitError):
+        retry_after = retry_after_seconds(error)
+        return HTTPException(
+            status_code=429,
+            detail="The AI service is busy, please try again shortly",
+            headers={"Retry-After": str(math.ceil(retry_after))} if retry_after else None,
+        )
+    if isinstance(error, (DeadlineExceeded, openai.APITimeoutError)):
+        return HTTPException(status_code=504, detail="The AI service took too long to answer")
+    if isinstance(error, (openai.APIConnectionError, QuizFormatError)) or (
+        isinstance(error, openai.APIStatusError) and error.status_code >= 500
+    ):
+        return HTTPException(status_code=502, detail="The AI service failed, please try again shortly")
+    return None
 
 
 # ============================================================================
@@ -100,7 +241,11 @@ async def health_check():
 
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest,
+    response: Response,
+    x_session_id: Optional[str] = Header(None),
+):
     """
     Main chat endpoint
     
@@ -113,26 +258,109 @@ async def chat(request: ChatRequest):
         if not user_message or not user_message.strip():
             raise HTTPException(status_code=400, detail="Message cannot be empty")
         
-        # Route the request to appropriate agent
-        agent_name = orchestrator.route_request(user_message)
-        
-        # Get response from the appropriate agent
-        if agent_name == "quiz":
-            response = orchestrator.quiz_agent.generate_quiz(user_message, 3)
-        elif agent_name == "explanation":
-            response = orchestrator.explanation_agent.explain(user_message)
-        else:  # Default to chat
-            response = orchestrator.chat_agent.chat(user_message)
+        # Route the request and get the response from the appropriate agent.
+        # The async path keeps the event loop free while GPT-4 is working.
+        session_id = resolve_session_id(request, x_session_id)
+        stats = {}
+        answer, agent_name = await orchestrator.aprocess_request(
+            user_message, session_id, stats, fresh=request.fresh
+        )
+        response.headers["X-Session-ID"] = session_id
+        response.headers["Server-Timing"] = server_timing(stats.get("timing", {}))
         
         # Return response with metadata
         return {
-            "response": response,
+            "response": answer,
             "agent": agent_name,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.now().isoformat(),
+            "session_id": session_id,
+            "tokens_saved": stats.get("history", {}).get("tokens_saved", 0)
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+        raise upstream_error(e) or HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest, x_session_id: Optional[str] = Header(None)):
+    """
+    Streaming chat endpoint (Server-Sent Events)
+    
+    Same routing as /api/chat, but the answer arrives token by token:
+    - event: agent  → {"agent": "quiz"} (as soon as routing is done)
+    - event: token  → {"content": "..."} (one per text delta)
+    - event: done   → {"agent", "usage", "history", "timing", "timestamp", "session_id"}
+    - event: error  → {"detail": "...", "status": 503} (if something fails mid-stream)
+    """
+    user_message = request.message
+    
+    if not user_message or not user_message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    session_id = resolve_session_id(request, x_session_id)
+    
+    async def event_stream():
+        try:
+            async for event, data in orchestrator.astream_request(
+                user_message, session_id, fresh=request.fresh
+            ):
+                if event == "done":
+                    data["timestamp"] = datetime.now().isoformat()
+                    data["session_id"] = session_id
+                yield sse_event(event, data)
+        except Exception as e:
+            # Headers are already sent, so report the error as an event
+            error = upstream_error(e)
+            if error is not None:
+                yield sse_event("error", {"detail": error.detail, "status": error.status_code})
+            else:
+                yield sse_event("error", {"detail": f"Error processing request: {str(e)}", "status": 500})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Session-ID": session_id,
+            "X-Accel-Buffering": "no",  # Stop proxies (nginx) from buffering the stream
+        },
+    )
+
+
+@app.post("/api/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """
+    Batch chat endpoint (newline-delimited JSON)
+    
+    Runs every item through the same routing and agents as /api/chat, a
+    limited number at a time, and streams one JSON line per item as soon
+    as it finishes (so lines arrive in completion order, not request order):
+        
+        {"index": 0, "id": "...", "status": "ok", "agent": "quiz", "response": "...", "elapsed_ms": 812.4}
+        {"index": 3, "id": "...", "status": "error", "error": "Timed out after 60.0s", "elapsed_ms": 60001.2}
+    
+    A failing item never fails the batch.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch cannot be empty")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch cannot have more than {BATCH_MAX_ITEMS} items")
+    
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    timeout = request.timeout or BATCH_ITEM_TIMEOUT_SECONDS
+    items = [item.model_dump() for item in request.items]
+    
+    async def result_lines():
+        async for result in orchestrator.aprocess_batch(items, concurrency, timeout):
+            yield ndjson_line(result)
+    
+    return StreamingResponse(
+        result_lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/api/route", response_model=dict)
@@ -149,15 +377,33 @@ async def route_message(request: ChatRequest):
             raise HTTPException(status_code=400, detail="Message cannot be empty")
         
         # Determine which agent to use
-        agent_name = orchestrator.route_request(user_message)
+        agent_name = await orchestrator.aroute_request(user_message)
         
         return {
             "agent": agent_name,
             "timestamp": datetime.now().isoformat()
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error routing request: {str(e)}")
+        raise upstream_error(e) or HTTPException(status_code=500, detail=f"Error routing request: {str(e)}")
+
+
+@app.get("/api/stats", response_model=dict)
+async def get_stats():
+    """
+    Routing, response cache, upstream, rate limit and session counters
+    """
+    return orchestrator.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Latency histograms and counters in the Prometheus text format
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
 
 
 @app.get("/api/agents", response_model=dict)
@@ -208,6 +454,13 @@ async def startup_event():
     print("=" * 70)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write buffered conversation messages before the process exits"""
+    if conversation_store is not None:
+        conversation_store.close()
+
+
 # ============================================================================
 # Main Entry Point
 # ============================================================================
@@ -0,0 +1,96 @@
+"""
+Benchmarks - Sync vs Async Orchestrator Throughput
+
+Shows why /api/chat must use the async agent path.
+
+Both modes run N concurrent requests inside one asyncio event loop, exactly
+like uvicorn does:
+- BEFORE: the handler calls the sync orchestrator.process_request(), which
+  blocks the event loop for the whole upstream round-trip
+- AFTER:  the handler awaits orchestrator.aprocess_request(), so the loop
+  keeps serving other students while GPT-4 (here: a mock) is working
+
+Each mode gets a new Orchestrator, so neither starts with the other's
+cached answers. The upstream calls per request are counted at the mock:
+routing is local for these prompts (intent_router.py), and repeated quiz
+and explanation requests come from the cache or share one in-flight call,
+so it is at most one call per request, not a route plus an agent call.
+
+Run with: python async_benchmark.py --requests 50 --delay 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Benchmarks live one level below the backend folder; config.py is at the project root
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.dirname(os.path.dirname(BACKEND_DIR)))
+
+from mock_upstream import start_mock_upstream, use_mock_upstream
+
+
+async def run_before(orchestrator, messages):
+    """Old handler: sync calls inside async def (blocks the loop)"""
+    async def handler(message):
+        return orchestrator.process_request(message)
+
+    return await asyncio.gather(*(handler(m) for m in messages))
+
+
+async def run_after(orchestrator, messages):
+    """New handler: awaits the async path"""
+    async def handler(message):
+        return await orchestrator.aprocess_request(message)
+
+    return await asyncio.gather(*(handler(m) for m in messages))
+
+
+def measure(label, runner, messages, server):
+    """Run one mode with a new orchestrator and return requests/sec"""
+    from orchestrator import Orchestrator
+
+    orchestrator = Orchestrator()
+    calls_before = server.requests
+    start = time.perf_counter()
+    asyncio.run(runner(orchestrator, messages))
+    elapsed = time.perf_counter() - start
+    rps = len(messages) / elapsed
+    calls = (server.requests - calls_before) / len(messages)
+    print(f"{label:<8} {len(messages):>5} requests in {elapsed:7.2f}s  →  {rps:8.2f} req/s"
+          f"  ({calls:.2f} upstream calls/request)")
+    return rps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async orchestrator benchmark")
+    parser.add_argument("--requests", type=int, default=50, help="Concurrent requests per mode")
+    parser.add_argument("--delay", type=float, default=0.2, help="Mock upstream delay per call (s)")
+    args = parser.parse_args()
+
+    server = start_mock_upstream(delay=args.delay)
+    use_mock_upstream(server)
+
+    prompts = ["Explain recursion", "Quiz me on Python basics", "How are you today?"]
+    messages = [prompts[i % len(prompts)] for i in range(args.requests)]
+
+    print("=" * 70)
+    print("SYNC VS ASYNC ORCHESTRATOR THROUGHPUT")
+    print("=" * 70)
+    print(f"Mock upstream delay: {args.delay}s per call")
+    print()
+
+    # The orchestrator is imported in measure(), once the environment points at the mock
+    before = measure("BEFORE", run_before, messages, server)
+    after = measure("AFTER", run_after, messages, server)
+
+    print()
+    print(f"🚀 Speedup: {after / before:.1f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
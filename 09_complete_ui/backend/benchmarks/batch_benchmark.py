@@ -0,0 +1,109 @@
+"""
+Benchmarks - Batch Chat Throughput
+
+Pushes N prepared prompts through the real FastAPI app (served by uvicorn
+in a background thread) against the local mock upstream:
+- SEPARATE CALLS: one POST /api/chat per prompt, one after another
+  (how the nightly jobs work today)
+- BATCH cN: a single POST /api/chat/batch with concurrency N
+
+Prompts are all different, so the response cache and request coalescing
+don't hide the upstream latency.
+
+Run with: python batch_benchmark.py --items 200 --delay 0.2
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+# Benchmarks live one level below the backend folder; config.py is at the project root
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.dirname(os.path.dirname(BACKEND_DIR)))
+
+import httpx
+
+from mock_upstream import start_mock_upstream, use_mock_upstream
+
+
+TEMPLATES = ["Explain topic number {i}", "Quiz me on topic number {i}", "Tell me about day {i} of class"]
+
+
+def start_api(port):
+    """Serve api.app with uvicorn in a background thread"""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config("api:app", host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def run_separate(base_url, messages):
+    """One /api/chat call per prompt; returns the number of failures"""
+    failures = 0
+    with httpx.Client(base_url=base_url, timeout=120) as client:
+        for message in messages:
+            response = client.post("/api/chat", json={"message": message})
+            failures += response.status_code != 200
+    return failures
+
+
+def run_batch(base_url, messages, concurrency):
+    """One /api/chat/batch call; returns the number of failed items"""
+    items = [{"id": str(i), "message": m} for i, m in enumerate(messages)]
+    failures = 0
+    with httpx.Client(base_url=base_url, timeout=600) as client:
+        with client.stream("POST", "/api/chat/batch",
+                           json={"items": items, "concurrency": concurrency}) as response:
+            for line in response.iter_lines():
+                if line:
+                    failures += json.loads(line)["status"] != "ok"
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch chat throughput benchmark")
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.2, help="Mock upstream delay per call (s)")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    upstream = start_mock_upstream(delay=args.delay)
+    use_mock_upstream(upstream)
+    os.environ["BATCH_MAX_CONCURRENCY"] = "64"
+    api_server = start_api(args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    print("=" * 70)
+    print("BATCH CHAT THROUGHPUT")
+    print("=" * 70)
+    print(f"{args.items} prompts, mock upstream delay {args.delay}s per call")
+    print()
+    print(f"{'mode':<16} {'time':>8} {'items/s':>9} {'failed':>7}")
+
+    runs = [("SEPARATE CALLS", lambda messages: run_separate(base_url, messages))]
+    for concurrency in (1, 8, 32, 64):
+        runs.append((f"BATCH c{concurrency}",
+                     lambda messages, c=concurrency: run_batch(base_url, messages, c)))
+
+    for round_number, (label, runner) in enumerate(runs):
+        # New prompts every round, so nothing is answered from the cache
+        messages = [TEMPLATES[i % len(TEMPLATES)].format(i=i + round_number * args.items)
+                    for i in range(args.items)]
+        start = time.perf_counter()
+        failures = runner(messages)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<16} {elapsed:>7.2f}s {args.items / elapsed:>9.1f} {failures:>7}")
+
+    api_server.should_exit = True
+    upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
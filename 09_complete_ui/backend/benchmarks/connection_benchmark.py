@@ -0,0 +1,136 @@
+"""
+Benchmarks - Upstream Connection Reuse
+
+Counts how many new TCP connections the backend opens per 1k requests.
+Every request makes two upstream calls, as /api/chat does when the local
+router isn't confident and routing falls back to GPT-4: a routing call,
+then a call from one of the three agents (locally routed requests only
+make the agent call). Three client setups are compared against the local
+mock upstream:
+
+- NEW CLIENT PER CALL: a fresh client for each call, like the CLI steps
+  (no connection is ever reused)
+- ONE CLIENT PER AGENT: the old backend, with separate clients for the
+  orchestrator and each agent, so four connection pools
+- SHARED PROVIDER: client_provider.get_async_client(), one pool for everything
+
+Every new connection to Azure also costs a TLS handshake, so fewer
+connections means lower latency.
+
+Run with: python connection_benchmark.py --requests 1000 --concurrency 20 [--per-call]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+# Benchmarks live one level below the backend folder; config.py is at the project root
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.dirname(os.path.dirname(BACKEND_DIR)))
+
+from mock_upstream import start_mock_upstream, use_mock_upstream
+
+
+async def call(client, model):
+    """One small completion (the content doesn't matter here)"""
+    await client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": "hello"}],
+        max_tokens=10,
+    )
+
+
+async def run(setup, model, requests, concurrency):
+    """
+    Run `requests` route+agent pairs with a client setup
+
+    Args:
+        setup: Function (role) -> (client, close_after_use)
+        model: Deployment name to call
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    rng = random.Random(0)
+    opened = []
+
+    async def one_request():
+        async with semaphore:
+            for role in ("router", rng.choice(["chat", "quiz", "explanation"])):
+                client, close_after = setup(role)
+                await call(client, model)
+                if close_after:
+                    await client.close()
+                else:
+                    opened.append(client)
+
+    await asyncio.gather(*(one_request() for _ in range(requests)))
+    for client in set(opened):
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upstream connection reuse benchmark")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.005, help="Mock upstream delay per call (s)")
+    parser.add_argument("--per-call", action="store_true",
+                        help="Also run the (slow) new-client-per-call setup")
+    args = parser.parse_args()
+
+    server = start_mock_upstream(delay=args.delay)
+    use_mock_upstream(server)
+
+    # Import only after the environment points at the mock
+    import config
+    import client_provider
+    from openai import AsyncAzureOpenAI
+
+    def new_client():
+        return AsyncAzureOpenAI(
+            azure_endpoint=config.AZURE_OPENAI_ENDPOINT,
+            api_key=config.AZURE_OPENAI_API_KEY,
+            api_version=config.AZURE_OPENAI_API_VERSION,
+        )
+
+    def per_call(role):
+        return new_client(), True
+
+    per_agent_clients = {}
+
+    def per_agent(role):
+        if role not in per_agent_clients:
+            per_agent_clients[role] = new_client()
+        return per_agent_clients[role], False
+
+    def shared(role):
+        return client_provider.get_async_client(), False
+
+    print("=" * 70)
+    print("UPSTREAM CONNECTION REUSE")
+    print("=" * 70)
+    print(f"{args.requests} requests (GPT-4 routing + agent call each), concurrency {args.concurrency}")
+    print()
+    print(f"{'setup':<22} {'connections':>12} {'per 1k req':>11} {'time':>8}")
+
+    setups = [("ONE CLIENT PER AGENT", per_agent), ("SHARED PROVIDER", shared)]
+    if args.per_call:
+        setups.insert(0, ("NEW CLIENT PER CALL", per_call))
+
+    for label, setup in setups:
+        client_provider.reset_clients()
+        per_agent_clients.clear()
+        before = server.connections
+        start = time.perf_counter()
+        asyncio.run(run(setup, config.GPT4_DEPLOYMENT_NAME, args.requests, args.concurrency))
+        elapsed = time.perf_counter() - start
+        opened = server.connections - before
+        print(f"{label:<22} {opened:>12} {opened * 1000 / args.requests:>11.1f} {elapsed:>7.2f}s")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmarks - Conversation Store
+
+How fast the SQLite conversation store takes chat turns, and how cheap it
+is to bring a long conversation back:
+- APPEND: turns stored through the SessionStore (as the backend does),
+  with commits batched by the writer thread (BATCHED) vs a commit after
+  every turn (PER TURN). Messages/s counts until everything is on disk.
+- RESTORE: a session with --history messages is reloaded after a restart:
+  only the window (summary + newest messages) vs the whole history
+- PRUNE: one retention run over everything written
+
+Run with: python conversation_store_benchmark.py --turns 20000 --sessions 500
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# Benchmarks live one level below the backend folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_store import ConversationStore
+from session_store import SessionStore
+
+
+def make_text(rng, min_chars=40, max_chars=400):
+    return "x" * rng.randint(min_chars, max_chars)
+
+
+def append_run(path, turns, sessions, commit_each, flush_ms):
+    """Store `turns` chat turns; returns messages per second (until all are committed)"""
+    rng = random.Random(42)
+    persistent = ConversationStore(path, flush_interval=flush_ms / 1000)
+    store = SessionStore(max_sessions=sessions, max_messages=50, persistent=persistent)
+
+    start = time.perf_counter()
+    for turn in range(turns):
+        session_id = f"student-{rng.randrange(sessions)}"
+        store.add_turn(session_id, make_text(rng), make_text(rng))
+        if commit_each:
+            persistent.flush()
+    persistent.close()
+    elapsed = time.perf_counter() - start
+
+    stats = persistent.stats()
+    assert stats["committed"] == turns * 2, stats
+    return turns * 2 / elapsed, stats["commits"]
+
+
+def restore_run(path, history, window, repeats):
+    """Time reloading a long session: window only vs everything"""
+    rng = random.Random(7)
+    persistent = ConversationStore(path, max_messages=0)
+    for start in range(0, history, 1000):
+        messages = []
+        for i in range(start, min(history, start + 1000)):
+            messages.append({"role": "user" if i % 2 == 0 else "assistant", "content": make_text(rng)})
+        persistent.append("long-session", start, messages)
+    persistent.update("long-session", summary="The student is working through fractions.",
+                      folded_upto=history - window)
+    persistent.flush()
+
+    window_ms = []
+    for _ in range(repeats):
+        # A new SessionStore is a restarted backend: the session is only on disk
+        store = SessionStore(max_messages=window, persistent=persistent)
+        started = time.perf_counter()
+        session = store.get("long-session")
+        window_ms.append((time.perf_counter() - started) * 1000)
+    assert len(session.messages) == window
+
+    full_ms = []
+    connection = sqlite3.connect(path)
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = connection.execute(
+            "SELECT role, content FROM messages WHERE session = ? ORDER BY seq", ("long-session",)
+        ).fetchall()
+        [{"role": role, "content": content} for role, content in rows]
+        full_ms.append((time.perf_counter() - started) * 1000)
+    connection.close()
+    persistent.close()
+    return statistics.median(window_ms), statistics.median(full_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversation store benchmark")
+    parser.add_argument("--turns", type=int, default=20000, help="Chat turns to store (2 messages each)")
+    parser.add_argument("--sessions", type=int, default=500, help="Students the turns are spread over")
+    parser.add_argument("--flush-ms", type=int, default=50, help="Writer thread commit interval (ms)")
+    parser.add_argument("--per-turn-turns", type=int, default=2000,
+                        help="Turns for the commit-per-turn baseline (it is slow)")
+    parser.add_argument("--history", type=int, default=20000, help="Messages in the long session for RESTORE")
+    parser.add_argument("--window", type=int, default=50, help="Messages the prompt window needs")
+    parser.add_argument("--repeats", type=int, default=20, help="Restores to time (median is shown)")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="conversations-")
+    try:
+        print("=" * 70)
+        print(f"APPEND: {args.turns} turns over {args.sessions} sessions")
+        print("=" * 70)
+        batched, commits = append_run(os.path.join(folder, "batched.sqlite"), args.turns,
+                                      args.sessions, False, args.flush_ms)
+        print(f"  BATCHED  ({args.flush_ms}ms): {batched:>10,.0f} messages/s  ({commits} commits)")
+        per_turn, commits = append_run(os.path.join(folder, "per_turn.sqlite"), args.per_turn_turns,
+                                       args.sessions, True, args.flush_ms)
+        print(f"  PER TURN       : {per_turn:>10,.0f} messages/s  ({commits} commits, "
+              f"{args.per_turn_turns} turns)")
+        print(f"  Speedup        : {batched / per_turn:>10.1f}x")
+        print()
+
+        print("=" * 70)
+        print(f"RESTORE: a session with {args.history:,} messages, window of {args.window}")
+        print("=" * 70)
+        window_ms, full_ms = restore_run(os.path.join(folder, "long.sqlite"), args.history,
+                                         args.window, args.repeats)
+        print(f"  Window only    : {window_ms:>8.2f} ms")
+        print(f"  Whole history  : {full_ms:>8.2f} ms")
+        print()
+
+        print("=" * 70)
+        print("PRUNE: keep 100 messages per session")
+        print("=" * 70)
+        persistent = ConversationStore(os.path.join(folder, "batched.sqlite"), max_messages=100)
+        started = time.perf_counter()
+        deleted = persistent.prune()
+        print(f"  Deleted {deleted:,} messages in {(time.perf_counter() - started) * 1000:.1f} ms")
+        persistent.close()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Benchmarks - End-to-End Load Test
+
+Simulates a classroom hitting the real backend: every student has their own
+session and keeps sending a mix of chat, quiz and explanation messages to
+/api/chat and /api/chat/stream, one after another (with optional think
+time). Each concurrency level runs for a fixed time and reports:
+- requests/sec actually sustained
+- p50/p95/p99 latency per endpoint, and time to first token for streams
+- error rate (non-200 answers, error events, timeouts, dropped connections)
+
+The mock upstream and uvicorn run as separate processes, so the load
+generator doesn't compete with the server for the GIL. Use --url to test
+a server you started yourself (e.g. with --workers 4) instead.
+
+Results are written as JSON; pass an earlier file to --compare to see the
+change in throughput and latency per level.
+
+Run with: python load_test.py --students 10,100,1000 --duration 30 --stream-share 0.3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+# Benchmarks live one level below the backend folder; config.py is at the project root
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+import httpx
+
+
+TOPICS = [
+    "fractions", "photosynthesis", "recursion", "the water cycle", "Newton's laws",
+    "binary search", "supply and demand", "the French Revolution", "cell division",
+    "linear equations", "plate tectonics", "probability", "sorting algorithms",
+    "the periodic table", "electric circuits", "World War I", "derivatives",
+    "climate change", "DNA replication", "object-oriented programming",
+]
+
+MESSAGES = {
+    "chat": [
+        "I'm stuck on {topic}, any study tips?",
+        "What should I review before the {topic} test?",
+        "Thanks, that makes {topic} a lot clearer!",
+    ],
+    "quiz": [
+        "Quiz me on {topic}",
+        "Give me practice problems on {topic}",
+    ],
+    "explanation": [
+        "Explain {topic}",
+        "Can you explain how {topic} works?",
+    ],
+}
+
+
+def parse_mix(text):
+    """"chat=0.6,quiz=0.2,explanation=0.2" -> {"chat": 0.6, ...}"""
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in MESSAGES:
+            raise argparse.ArgumentTypeError(f"Unknown message kind: {kind}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def percentile(values, share):
+    """Nearest-rank percentile of a list (None if it is empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(share * len(ordered)) - 1))]
+
+
+def summarize(values):
+    """p50/p95/p99 in milliseconds"""
+    return {f"p{int(share * 100)}_ms": None if percentile(values, share) is None
+            else round(percentile(values, share) * 1000, 1)
+            for share in (0.5, 0.95, 0.99)}
+
+
+def raise_file_limit():
+    """1000 students need more sockets than the usual limit of 1024 files"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        target = 65536 if hard == resource.RLIM_INFINITY else hard
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+def wait_until_up(url, process, timeout=30):
+    """Poll until the server answers (or its process died)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not start within {timeout}s")
+
+
+def start_servers(args):
+    """Start the mock upstream and uvicorn as subprocesses; returns (processes, base_url)"""
+    mock = subprocess.Popen([
+        sys.executable, os.path.join(BENCHMARKS_DIR, "mock_upstream.py"),
+        "--port", str(args.upstream_port), "--delay", str(args.ttft),
+        "--token-delay", str(args.token_delay), "--output-tokens", str(args.output_tokens),
+        "--error-rate", str(args.error_rate), "--seed", str(args.seed),
+    ], stdout=subprocess.DEVNULL)
+    upstream_url = f"http://127.0.0.1:{args.upstream_port}"
+
+    env = dict(os.environ,
+               AZURE_OPENAI_ENDPOINT=upstream_url,
+               AZURE_OPENAI_API_KEY="mock-key",
+               GPT4_DEPLOYMENT_NAME="mock-gpt-4")
+    api = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1",
+        "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning",
+        "--backlog", "4096",
+    ], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL)
+
+    processes = [mock, api]
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_up(upstream_url, mock)
+        wait_until_up(f"{base_url}/health", api)
+    except Exception:
+        stop_servers(processes)
+        raise
+    return processes, base_url
+
+
+def stop_servers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait(timeout=10)
+
+
+class Recorder:
+    """Collects the outcome of every request in one level"""
+
+    def __init__(self):
+        self.latencies = {"chat": [], "stream": []}
+        self.ttfts = []
+        self.kinds = {kind: 0 for kind in MESSAGES}
+        self.errors = {}
+        self.requests = 0
+
+    def error(self, reason):
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+
+async def send_chat(client, session_id, message, recorder):
+    start = time.perf_counter()
+    response = await client.post("/api/chat", json={"message": message},
+                                 headers={"X-Session-ID": session_id})
+    if response.status_code != 200:
+        recorder.error(f"http_{response.status_code}")
+        return
+    recorder.latencies["chat"].append(time.perf_counter() - start)
+
+
+async def send_stream(client, session_id, message, recorder):
+    start = time.perf_counter()
+    first_token = None
+    event = None
+    async with client.stream("POST", "/api/chat/stream", json={"message": message},
+                             headers={"X-Session-ID": session_id}) as response:
+        if response.status_code != 200:
+            recorder.error(f"http_{response.status_code}")
+            return
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter()
+                elif event == "error":
+                    recorder.error("stream_error")
+                    return
+    if event is None:
+        recorder.error("empty_stream")
+        return
+    recorder.latencies["stream"].append(time.perf_counter() - start)
+    if first_token is not None:
+        recorder.ttfts.append(first_token - start)
+
+
+async def student(client, args, rng, stop_at, recorder, counter):
+    """One simulated student: a closed loop of requests until time is up"""
+    session_id = uuid.uuid4().hex
+    kinds, weights = zip(*args.mix.items())
+    while time.perf_counter() < stop_at:
+        kind = rng.choices(kinds, weights)[0]
+        message = rng.choice(MESSAGES[kind]).format(topic=rng.choice(TOPICS))
+        if args.unique:
+            # A new wording every time, so the response cache never answers
+            counter[0] += 1
+            message += f" (#{counter[0]})"
+        recorder.kinds[kind] += 1
+        recorder.requests += 1
+        send = send_stream if rng.random() < args.stream_share else send_chat
+        try:
+            await asyncio.wait_for(send(client, session_id, message, recorder), args.timeout)
+        except asyncio.TimeoutError:
+            recorder.error("timeout")
+        except httpx.HTTPError as e:
+            recorder.error(type(e).__name__)
+        if args.think:
+            # Exponential think time, like students reading the answer
+            await asyncio.sleep(rng.expovariate(1 / args.think))
+
+
+async def run_level(base_url, students, args):
+    """Drive one concurrency level; returns its results dict"""
+    limits = httpx.Limits(max_connections=students, max_keepalive_connections=students)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        counter = [0]
+        if args.warmup:
+            warmup = Recorder()
+            stop_at = time.perf_counter() + args.warmup
+            await asyncio.gather(*(student(client, args, random.Random(args.seed + i), stop_at, warmup, counter)
+                                   for i in range(students)))
+
+        recorder = Recorder()
+        start = time.perf_counter()
+        stop_at = start + args.duration
+        await asyncio.gather(*(student(client, args, random.Random(args.seed * 1000 + i), stop_at,
+                                       recorder, counter)
+                               for i in range(students)))
+        elapsed = time.perf_counter() - start
+
+    completed = sum(len(values) for values in recorder.latencies.values())
+    failed = sum(recorder.errors.values())
+    return {
+        "students": students,
+        "elapsed_s": round(elapsed, 2),
+        "requests": recorder.requests,
+        "completed": completed,
+        "requests_per_sec": round(completed / elapsed, 2),
+        "error_rate": round(failed / recorder.requests, 4) if recorder.requests else 0.0,
+        "errors": recorder.errors,
+        "mix": recorder.kinds,
+        "latency": {"chat": summarize(recorder.latencies["chat"]),
+                    "stream": summarize(recorder.latencies["stream"])},
+        "ttft": summarize(recorder.ttfts),
+    }
+
+
+def print_level(level):
+    chat, stream, ttft = level["latency"]["chat"], level["latency"]["stream"], level["ttft"]
+
+    def ms(value):
+        return f"{value:>8.0f}" if value is not None else f"{'-':>8}"
+
+    print(f"{level['students']:>8} {level['requests_per_sec']:>8.1f} {level['error_rate']:>7.1%} "
+          f"{ms(chat['p50_ms'])}{ms(chat['p95_ms'])}{ms(chat['p99_ms'])} "
+          f"{ms(ttft['p50_ms'])}{ms(ttft['p95_ms'])}{ms(ttft['p99_ms'])}")
+
+
+def compare(results, previous_path):
+    """Print the change against an earlier results file, level by level"""
+    with open(previous_path) as f:
+        previous = {level["students"]: level for level in json.load(f)["levels"]}
+
+    def change(now, before):
+        if now is None or not before:
+            return "       -"
+        return f"{(now - before) / before:>+8.1%}"
+
+    print()
+    print(f"Compared with {previous_path}:")
+    print(f"{'students':>8} {'req/s':>8} {'errors':>8} {'chat p95':>8} {'ttft p95':>8}")
+    for level in results["levels"]:
+        before = previous.get(level["students"])
+        if before is None:
+            continue
+        print(f"{level['students']:>8} "
+              f"{change(level['requests_per_sec'], before['requests_per_sec'])} "
+              f"{level['error_rate'] - before['error_rate']:>+8.1%} "
+              f"{change(level['latency']['chat']['p95_ms'], before['latency']['chat']['p95_ms'])} "
+              f"{change(level['ttft']['p95_ms'], before['ttft']['p95_ms'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test for the backend API")
+    parser.add_argument("--students", default="10,100,1000", help="Concurrency levels (comma-separated)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds measured per level")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before each level")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("chat=0.6,quiz=0.2,explanation=0.2"),
+                        help="Traffic mix, e.g. chat=0.6,quiz=0.2,explanation=0.2")
+    parser.add_argument("--stream-share", type=float, default=0.3, help="Share of requests sent to /api/chat/stream")
+    parser.add_argument("--think", type=float, default=0.0, help="Mean think time between a student's requests (s)")
+    parser.add_argument("--unique", action="store_true", help="Never repeat a message (defeats the response cache)")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds before a request counts as failed")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ttft", type=float, default=0.5, help="Mock upstream time to first token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Mock upstream seconds between tokens")
+    parser.add_argument("--output-tokens", type=int, default=100, help="Mock upstream words per answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream calls that fail")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--upstream-port", type=int, default=8766)
+    parser.add_argument("--url", help="Test this running server instead of starting one")
+    parser.add_argument("--out", default=None, help="Results file (default: results/load_test_<time>.json)")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare with")
+    args = parser.parse_args()
+    levels = [int(n) for n in args.students.split(",")]
+
+    raise_file_limit()
+    processes = []
+    base_url = args.url
+    if base_url is None:
+        processes, base_url = start_servers(args)
+
+    print("=" * 78)
+    print(f"LOAD TEST: {base_url}, {args.duration:.0f}s per level, mix "
+          + ", ".join(f"{kind} {weight:.0%}" for kind, weight in args.mix.items())
+          + f", {args.stream_share:.0%} streamed")
+    print("=" * 78)
+    print(f"{'students':>8} {'req/s':>8} {'errors':>7} {'chat p50':>8}{'p95':>8}{'p99':>8} "
+          f"{'ttft p50':>8}{'p95':>8}{'p99':>8}")
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "levels": [],
+    }
+    try:
+        for students in levels:
+            level = asyncio.run(run_level(base_url, students, args))
+            results["levels"].append(level)
+            print_level(level)
+    finally:
+        stop_servers(processes)
+
+    out = args.out or os.path.join(
+        BENCHMARKS_DIR, "results", f"load_test_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print()
+    print(f"📄 Results written to {out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmarks - Message Memory
+
+Bytes per chat turn kept in memory for --sessions students:
+- DICTS:   the old layout, a list of {"role", "content"} dicts per session
+- COMPACT: the SessionStore's MessageLog (role bytes, shared long texts)
+
+Student messages are unique. A share of the answers (--shared) is one of a
+few long cached answers (a popular quiz or explanation), rendered anew for
+every student - equal text, separate string - the rest are unique. Memory
+is measured with tracemalloc, including the texts themselves.
+
+Run with: python message_memory_benchmark.py --sessions 10000 --turns 5 --shared 0.4
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+# Benchmarks live one level below the backend folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_store import SessionStore
+
+
+def conversation(args):
+    """The same turns for every layout: (session id, question, answer)"""
+    rng = random.Random(42)
+    cached = [
+        (f"**Quiz {n}**\n", "".join(rng.choice("abcdefgh ") for _ in range(rng.randint(1500, 3000))))
+        for n in range(args.cached_answers)
+    ]
+    for turn in range(args.turns):
+        for session in range(args.sessions):
+            question = f"[{session}/{turn}] " + "q" * rng.randint(20, 200)
+            if rng.random() < args.shared:
+                title, body = rng.choice(cached)
+                answer = title + body  # a new string each time, like a fresh render
+            else:
+                answer = f"[{session}/{turn}] " + "a" * rng.randint(200, 1500)
+            yield f"student-{session}", question, answer
+
+
+def measure(build, args):
+    """Memory held by what build() returns, in bytes"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(args)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used, kept
+
+
+def build_dicts(args):
+    sessions = {}
+    for session_id, question, answer in conversation(args):
+        history = sessions.setdefault(session_id, [])
+        history.append({"role": "user", "content": question})
+        history.append({"role": "assistant", "content": answer})
+    return sessions
+
+
+def build_compact(args):
+    store = SessionStore(max_sessions=args.sessions, max_bytes=1 << 40, max_messages=2 * args.turns,
+                         ttl_seconds=1 << 30)
+    for session_id, question, answer in conversation(args):
+        store.add_turn(session_id, question, answer)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Message memory benchmark")
+    parser.add_argument("--sessions", type=int, default=10000, help="Students")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per student")
+    parser.add_argument("--shared", type=float, default=0.4, help="Share of answers that are cached answers")
+    parser.add_argument("--cached-answers", type=int, default=50, help="Distinct cached answers")
+    args = parser.parse_args()
+
+    turns = args.sessions * args.turns
+    print("=" * 70)
+    print(f"MESSAGE MEMORY: {args.sessions:,} sessions x {args.turns} turns, "
+          f"{args.shared:.0%} cached answers")
+    print("=" * 70)
+
+    dicts, kept = measure(build_dicts, args)
+    del kept
+    compact, store = measure(build_compact, args)
+
+    print(f"{'layout':<10} {'total MB':>10} {'bytes/turn':>12}")
+    print(f"{'DICTS':<10} {dicts / 2**20:>10.1f} {dicts / turns:>12,.0f}")
+    print(f"{'COMPACT':<10} {compact / 2**20:>10.1f} {compact / turns:>12,.0f}")
+    print(f"Saved: {(dicts - compact) / turns:,.0f} bytes/turn ({1 - compact / dicts:.0%})")
+    print()
+
+    stats = store.stats()
+    shared = stats["shared_texts"]
+    print(f"📊 Store accounting: {stats['total_bytes'] / 2**20:.1f} MB; "
+          f"{shared['blobs']} shared texts, {shared['saved_bytes'] / 2**20:.1f} MB of copies avoided")
+
+
+if __name__ == "__main__":
+    main()
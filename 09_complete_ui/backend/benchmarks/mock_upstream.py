@@ -0,0 +1,489 @@
+"""
+Benchmarks - Mock Azure OpenAI Upstream
+
+A local stand-in for the Azure OpenAI chat completions endpoint, so the
+tutorial steps, the backend and the benchmarks run offline, without
+spending quota and without upstream noise in the numbers.
+
+Every request waits `delay` seconds (the time to first token), plus
+`token_delay` per further token, and gets a deterministic completion:
+- non-streaming and streaming (stream=True, as SSE chunks with an
+  optional delay between tokens and a final usage chunk)
+- `output_tokens` words long (default: one short canned sentence)
+- tool calls when the request offers tools: every tool whose name appears
+  in the prompt ("quiz" -> generate_quiz) is called, with arguments built
+  from its JSON schema; once tool results are sent back, a text answer
+- routing prompts get a real agent name back, picked with simple keywords,
+  so the orchestrator behaves the same way it would against GPT-4
+- structured outputs (response_format json_schema) get JSON that matches
+  the schema, e.g. a quiz with as many questions as the prompt asks for
+
+Faults can be injected: a share of requests (error_rate) fail with
+error_status (e.g. 429 or 503), optionally with a Retry-After header.
+A requests-per-minute quota (rpm_quota) can be enforced like Azure does:
+over one-second windows, with a 429 for everything above it.
+A concurrency cap (max_concurrency) either rejects extra requests with a
+429 or queues them, like an upstream with limited capacity.
+With a seed, injected errors are the same on every run.
+
+Run standalone with: python mock_upstream.py --port 8100 --delay 0.5
+and point config.py at it:
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8100 AZURE_OPENAI_API_KEY=mock GPT4_DEPLOYMENT_NAME=mock-gpt-4
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+CANNED_RESPONSE = "This is a mock response from the local upstream."
+
+
+def pick_agent(prompt):
+    """Keyword routing so the mock answers routing prompts sensibly"""
+    text = prompt.lower()
+    if "quiz" in text or "test me" in text:
+        return "quiz"
+    if "explain" in text:
+        return "explanation"
+    return "chat"
+
+
+def make_content(output_tokens):
+    """The canned answer, repeated or cut to `output_tokens` words (None: as is)"""
+    if output_tokens is None:
+        return CANNED_RESPONSE
+    words = CANNED_RESPONSE.split(" ")
+    return " ".join(words[i % len(words)] for i in range(max(1, output_tokens)))
+
+
+def estimate_prompt_tokens(messages):
+    """Roughly 4 characters per token, like tokens.py (no tokenizer needed)"""
+    text = "".join(str(m.get("content") or "") for m in messages)
+    return max(1, len(text) // 4)
+
+
+def make_arguments(parameters, prompt):
+    """
+    Fill in a tool's JSON-schema parameters from the prompt
+
+    Strings get the prompt itself, numbers the first number in it (else the
+    schema default, else 1), booleans their default. Optional parameters
+    are only included when the prompt has a number for them.
+    """
+    properties = (parameters or {}).get("properties", {})
+    required = set((parameters or {}).get("required", []))
+    number = re.search(r"\d+", prompt)
+    arguments = {}
+    for name, schema in properties.items():
+        kind = schema.get("type")
+        if kind in ("integer", "number"):
+            if number is not None:
+                arguments[name] = int(number.group())
+            elif name in required:
+                arguments[name] = schema.get("default", 1)
+        elif name in required:
+            if kind == "boolean":
+                arguments[name] = schema.get("default", False)
+            elif "enum" in schema:
+                arguments[name] = schema["enum"][0]
+            else:
+                arguments[name] = prompt
+    return arguments
+
+
+def make_structured(schema, prompt, index=0, name="text", variant=0):
+    """
+    Build a value matching a JSON schema (for response_format json_schema)
+
+    Arrays of objects get as many items as the first number in the prompt
+    ("Create a 3-question quiz"), arrays of plain values 4 (like answer
+    options). Enums rotate with the item's position, so not every answer is "A".
+    Strings include `variant`, so separate requests get different answers.
+    """
+    kind = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][index % len(schema["enum"])]
+    if kind == "object":
+        return {key: make_structured(sub, prompt, index, key, variant)
+                for key, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        items = schema.get("items", {})
+        number = re.search(r"\d+", prompt)
+        count = int(number.group()) if items.get("type") == "object" and number else 4
+        return [make_structured(items, prompt, i, name, variant) for i in range(max(1, min(count, 50)))]
+    if kind in ("integer", "number"):
+        return index
+    if kind == "boolean":
+        return index % 2 == 0
+    return f"Mock {name} {index + 1}" + (f" (#{variant})" if variant else "")
+
+
+def pick_tool_calls(body, prompt):
+    """
+    Decide which tools the mock "model" calls
+
+    Returns:
+        List of tool-call dicts (empty to answer with text instead)
+    """
+    tools = [tool["function"] for tool in body.get("tools") or [] if tool.get("type") == "function"]
+    messages = body.get("messages") or []
+    tool_choice = body.get("tool_choice", "auto")
+    if not tools or tool_choice == "none" or (messages and messages[-1].get("role") == "tool"):
+        return []
+
+    if isinstance(tool_choice, dict):
+        forced = tool_choice.get("function", {}).get("name")
+        chosen = [tool for tool in tools if tool["name"] == forced]
+    else:
+        text = prompt.lower()
+        chosen = [
+            tool for tool in tools
+            if any(len(word) > 3 and word in text for word in tool["name"].lower().split("_"))
+        ]
+        if not chosen and tool_choice == "required":
+            chosen = tools[:1]
+    if body.get("parallel_tool_calls") is False:
+        chosen = chosen[:1]
+
+    return [
+        {
+            "id": f"call_mock_{i}",
+            "type": "function",
+            "function": {"name": tool["name"],
+                         "arguments": json.dumps(make_arguments(tool.get("parameters"), prompt))},
+        }
+        for i, tool in enumerate(chosen)
+    ]
+
+
+class MockUpstreamHandler(BaseHTTPRequestHandler):
+    """Handles POST .../chat/completions with a fixed delay"""
+
+    # Keep-alive, so clients can reuse connections like they would with Azure
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.split("?")[0].endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        self.server.received()
+        retry_after = self.server.over_quota()
+        if retry_after is not None:
+            self._send_json(429, {
+                "error": {"code": "429", "message": "Requests exceed the mock rate limit"}
+            }, {"Retry-After": f"{retry_after:.2f}"})
+            return
+
+        if not self.server.enter():
+            self._send_json(429, {
+                "error": {"code": "429", "message": "Too many concurrent requests"}
+            }, {"Retry-After": "1"})
+            return
+        try:
+            self._complete(body)
+        finally:
+            self.server.leave()
+
+    def _complete(self, body):
+        time.sleep(self.server.delay)
+
+        if self.server.inject_error():
+            headers = {}
+            if self.server.retry_after is not None:
+                headers["Retry-After"] = str(self.server.retry_after)
+            self._send_json(self.server.error_status, {
+                "error": {"code": str(self.server.error_status), "message": "Injected mock failure"}
+            }, headers)
+            return
+
+        messages = body.get("messages") or [{}]
+        user_messages = [m for m in messages if m.get("role") == "user"] or messages
+        prompt = str(user_messages[-1].get("content") or "")
+        tool_calls = pick_tool_calls(body, prompt)
+        response_format = body.get("response_format") or {}
+        if "Respond with ONLY the agent name" in prompt:
+            content = pick_agent(prompt.split("Available agents:")[0])
+        elif response_format.get("type") == "json_schema":
+            schema = response_format.get("json_schema", {}).get("schema", {})
+            variant = self.server.random.randrange(1, 10 ** 6)
+            content = json.dumps(make_structured(schema, prompt, variant=variant))
+        elif response_format.get("type") == "json_object":
+            content = json.dumps({"answer": make_content(self.server.output_tokens)})
+        else:
+            content = make_content(self.server.output_tokens)
+
+        model = body.get("model", "mock")
+        prompt_tokens = estimate_prompt_tokens(messages)
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            self._send_stream(model, content, tool_calls, prompt_tokens, include_usage)
+            return
+
+        if tool_calls:
+            message = {"role": "assistant", "content": None, "tool_calls": tool_calls}
+            completion_tokens = sum(len(call["function"]["arguments"]) // 4 + 1 for call in tool_calls)
+        else:
+            message = {"role": "assistant", "content": content}
+            completion_tokens = len(content.split(" "))
+        if self.server.token_delay:
+            # Generating the rest of the answer takes as long as streaming it would
+            time.sleep(self.server.token_delay * (completion_tokens - 1))
+        self._send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model, content, tool_calls, prompt_tokens, include_usage):
+        """Send the completion as OpenAI-style SSE chunks (chunked encoding)"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        if tool_calls:
+            deltas = []
+            for index, call in enumerate(tool_calls):
+                # Name first, then the arguments a few characters at a time
+                deltas.append({"role": "assistant", "tool_calls": [{
+                    "index": index, "id": call["id"], "type": "function",
+                    "function": {"name": call["function"]["name"], "arguments": ""},
+                }]})
+                arguments = call["function"]["arguments"]
+                for start in range(0, len(arguments), 8):
+                    deltas.append({"tool_calls": [{
+                        "index": index, "function": {"arguments": arguments[start:start + 8]},
+                    }]})
+            finish_reason = "tool_calls"
+        else:
+            deltas = [{"content": word + " "} for word in content.split(" ")]
+            finish_reason = "stop"
+
+        for i, delta in enumerate(deltas):
+            if i and self.server.token_delay:
+                time.sleep(self.server.token_delay)
+            self._write_chunk(self._stream_chunk(model, delta, None))
+
+        self._write_chunk(self._stream_chunk(model, {}, finish_reason))
+        if include_usage:
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(deltas),
+                     "total_tokens": prompt_tokens + len(deltas)}
+            self._write_chunk({"id": "chatcmpl-mock", "object": "chat.completion.chunk",
+                               "created": int(time.time()), "model": model,
+                               "choices": [], "usage": usage})
+        self._write_chunk("[DONE]")
+        # Zero-length chunk ends the chunked body
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _stream_chunk(self, model, delta, finish_reason):
+        return {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    def _write_chunk(self, payload):
+        data = payload if isinstance(payload, str) else json.dumps(payload)
+        line = f"data: {data}\n\n".encode()
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        """Silence per-request logging (it would dominate benchmark output)"""
+        pass
+
+
+class MockUpstreamServer(ThreadingHTTPServer):
+    """Threaded HTTP server that can take hundreds of concurrent requests"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, delay, token_delay=0.0, error_rate=0.0, error_status=503,
+                 retry_after=None, output_tokens=None, max_concurrency=None, overflow="reject",
+                 seed=None):
+        super().__init__(address, MockUpstreamHandler)
+        self.delay = delay  # time to first token
+        self.token_delay = token_delay
+        self.output_tokens = output_tokens
+        self.connections = 0  # TCP connections accepted so far
+        self.requests = 0  # chat completion requests received
+
+        # Fault injection (can be changed while the server is running)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.errors = 0  # injected failures sent so far
+        self.random = random.Random(seed)
+
+        # Requests-per-minute quota, enforced per second (None = unlimited)
+        self.rpm_quota = None
+        self.throttled = 0  # 429s sent for going over the quota
+        self._window = (0, 0)  # (second, requests seen in it)
+        self._quota_lock = threading.Lock()
+
+        # Concurrency cap: "reject" answers 429 above it, "queue" makes requests wait
+        self.max_concurrency = max_concurrency
+        self.overflow = overflow
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.rejected = 0  # 429s sent for going over the cap
+        self._slots = threading.Condition()
+
+    def received(self):
+        """Count one chat completion request"""
+        with self._quota_lock:
+            self.requests += 1
+
+    def over_quota(self):
+        """Count a request against the quota; returns Retry-After seconds if it is over"""
+        if not self.rpm_quota:
+            return None
+        with self._quota_lock:
+            now = time.time()
+            second, count = self._window
+            if int(now) != second:
+                second, count = int(now), 0
+            self._window = (second, count + 1)
+            if count < self.rpm_quota / 60:
+                return None
+            self.throttled += 1
+            return second + 1 - now
+
+    def inject_error(self):
+        """Decide whether this request fails (reproducible with a seed)"""
+        with self._quota_lock:
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors += 1
+                return True
+            return False
+
+    def enter(self):
+        """Take a concurrency slot; False if the request is rejected"""
+        with self._slots:
+            if self.max_concurrency:
+                if self.overflow == "queue":
+                    self._slots.wait_for(lambda: self.in_flight < self.max_concurrency)
+                elif self.in_flight >= self.max_concurrency:
+                    self.rejected += 1
+                    return False
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+
+    def leave(self):
+        with self._slots:
+            self.in_flight -= 1
+            self._slots.notify()
+
+    def process_request(self, request, client_address):
+        # Called once per accepted connection (not per HTTP request),
+        # so this counts how often clients had to open a new connection
+        self.connections += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        # Clients that cancel a call (e.g. a discarded speculative request)
+        # hang up mid-response; that is expected, not worth a traceback
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def start_mock_upstream(port=0, delay=0.5, token_delay=0.0, error_rate=0.0, error_status=503,
+                        retry_after=None, output_tokens=None, max_concurrency=None,
+                        overflow="reject", seed=None):
+    """
+    Start the mock upstream in a background thread
+
+    Args:
+        port: Port to listen on (0 picks a free port)
+        delay: Seconds to wait before answering each request (time to first token)
+        token_delay: Seconds between streamed tokens
+        error_rate: Share of requests (0-1) that fail with error_status
+        error_status: HTTP status of injected failures
+        retry_after: Retry-After header (seconds) sent with failures
+        output_tokens: Words per answer (None: one short canned sentence)
+        max_concurrency: Requests handled at once (None: unlimited)
+        overflow: Above the cap, "reject" with a 429 or "queue"
+        seed: Seed for error injection, for identical runs
+
+    Returns:
+        The running server (server.server_address has the real port)
+    """
+    server = MockUpstreamServer(("127.0.0.1", port), delay, token_delay, error_rate, error_status,
+                                retry_after, output_tokens, max_concurrency, overflow, seed)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def use_mock_upstream(server):
+    """
+    Point config.py at the mock upstream
+
+    Must be called BEFORE importing config / the agents, because config.py
+    reads the environment once at import time.
+    """
+    host, port = server.server_address
+    os.environ["AZURE_OPENAI_ENDPOINT"] = f"http://{host}:{port}"
+    os.environ["AZURE_OPENAI_API_KEY"] = "mock-key"
+    os.environ["GPT4_DEPLOYMENT_NAME"] = "mock-gpt-4"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Azure OpenAI upstream")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--delay", "--ttft", type=float, default=0.5,
+                        help="Seconds before the answer (or first streamed token)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed tokens")
+    parser.add_argument("--output-tokens", type=int, default=None, help="Words per answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail (0-1)")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected failures")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds on failures")
+    parser.add_argument("--rpm-quota", type=int, default=None, help="Requests per minute before 429s")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="Requests handled at once")
+    parser.add_argument("--overflow", choices=("reject", "queue"), default="reject",
+                        help="Above --max-concurrency: answer 429 or wait")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for error injection")
+    args = parser.parse_args()
+
+    print(f"🧪 Mock upstream on http://127.0.0.1:{args.port} (delay {args.delay}s)")
+    print(f"   Use it with: AZURE_OPENAI_ENDPOINT=http://127.0.0.1:{args.port} "
+          f"AZURE_OPENAI_API_KEY=mock GPT4_DEPLOYMENT_NAME=mock-gpt-4")
+    server = MockUpstreamServer(("127.0.0.1", args.port), args.delay, args.token_delay, args.error_rate,
+                                args.error_status, args.retry_after, args.output_tokens,
+                                args.max_concurrency, args.overflow, args.seed)
+    server.rpm_quota = args.rpm_quota
+    server.serve_forever()
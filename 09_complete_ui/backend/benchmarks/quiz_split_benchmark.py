@@ -0,0 +1,95 @@
+"""
+Benchmarks - Split Quiz Generation
+
+Wall-clock time to generate quizzes of growing size, against a mock
+upstream whose answers take longer the more tokens they have (like GPT-4):
+- SINGLE: one completion with all N questions
+- SPLIT:  chunks of at most --chunk-size questions, generated concurrently
+          and merged (quiz_agent.split_quiz)
+
+With --error-rate some chunks fail, to show that the other chunks'
+questions are still returned.
+
+Run with: python quiz_split_benchmark.py --sizes 3,5,10,15,20,30 --chunk-size 5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Benchmarks live one level below the backend folder; config.py is at the project root
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.dirname(os.path.dirname(BACKEND_DIR)))
+
+from mock_upstream import start_mock_upstream, use_mock_upstream
+
+
+async def timed_quiz(agent, topic, num_questions):
+    """Generate one fresh quiz; returns (seconds, questions received or None on failure)"""
+    start = time.perf_counter()
+    try:
+        quiz = await agent.acreate_quiz(topic, num_questions, fresh=True)
+    except Exception:
+        return time.perf_counter() - start, None
+    return time.perf_counter() - start, len(quiz)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split quiz generation benchmark")
+    parser.add_argument("--sizes", default="3,5,10,15,20,30", help="Quiz sizes to try (comma-separated)")
+    parser.add_argument("--chunk-size", type=int, default=5, help="Questions per chunk in SPLIT mode")
+    parser.add_argument("--repeats", type=int, default=3, help="Quizzes per size and mode (median is shown)")
+    parser.add_argument("--ttft", type=float, default=0.5, help="Mock time to first token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Mock time per output token (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream calls that fail")
+    args = parser.parse_args()
+
+    server = start_mock_upstream(delay=args.ttft, token_delay=args.token_delay,
+                                 error_rate=args.error_rate, seed=0)
+    use_mock_upstream(server)
+    # Failures should reach the agent, not be retried away
+    os.environ["RETRY_MAX_ATTEMPTS"] = "1"
+
+    # Import only after the environment points at the mock
+    from quiz_agent import QuizAgent
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    modes = (("SINGLE", QuizAgent(chunk_size=0)), ("SPLIT", QuizAgent(chunk_size=args.chunk_size)))
+
+    print("=" * 70)
+    print(f"SPLIT QUIZ GENERATION: chunks of {args.chunk_size}, mock TTFT {args.ttft}s, "
+          f"{args.token_delay * 1000:.0f}ms/token")
+    print("=" * 70)
+    print(f"{'questions':>9} {'single s':>9} {'split s':>9} {'speedup':>8} {'got (single/split)':>20}")
+
+    async def run():
+        for size in sizes:
+            row = {}
+            for label, agent in modes:
+                results = [await timed_quiz(agent, "photosynthesis", size) for _ in range(args.repeats)]
+                seconds = statistics.median(elapsed for elapsed, _ in results)
+                received = [got for _, got in results]
+                row[label] = (seconds, received)
+            single, split = row["SINGLE"], row["SPLIT"]
+
+            def got(received):
+                return "/".join("x" if n is None else str(n) for n in received)
+
+            print(f"{size:>9} {single[0]:>9.2f} {split[0]:>9.2f} {single[0] / split[0]:>7.1f}x "
+                  f"{got(single[1]) + ' | ' + got(split[1]):>20}")
+
+    asyncio.run(run())
+
+    stats = modes[1][1].generation_stats
+    print()
+    print(f"📊 SPLIT: {stats['chunks']} chunks, {stats['failed_chunks']} failed, "
+          f"{stats['partial']} partial quizzes, {stats['duplicates']} duplicates dropped")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
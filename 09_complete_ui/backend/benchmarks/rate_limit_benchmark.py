@@ -0,0 +1,132 @@
+"""
+Benchmarks - Client-Side Rate Limiting
+
+Several worker processes (like uvicorn --workers N) send bursts of calls to
+a mock upstream that enforces a requests-per-minute quota the way Azure
+does, answering 429 to everything above it:
+- NO LIMITER:     every worker sends as fast as it can
+- RETRIES ONLY:   the same, with the retry layer (backoff + Retry-After)
+- SHARED LIMITER: every worker waits for quota from one SQLite-backed
+                  token bucket (rate_limiter.py) before calling. It is set
+                  10% under the quota with a small burst, because the
+                  upstream counts per second rather than per minute
+
+Run with: python rate_limit_benchmark.py --workers 4 --requests 50 --rpm 1200
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# Benchmarks live one level below the backend folder; config.py is at the project root
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.dirname(os.path.dirname(BACKEND_DIR)))
+
+from openai import AsyncAzureOpenAI
+
+from mock_upstream import start_mock_upstream
+from rate_limiter import RateLimiter, SQLiteBucketStore
+from resilience import CircuitBreaker, Resilience, ResilientClient
+
+
+async def send(address, requests, concurrency, max_attempts, limiter):
+    """Send requests from one worker; returns (succeeded, error names)"""
+    host, port = address
+    client = ResilientClient(
+        AsyncAzureOpenAI(azure_endpoint=f"http://{host}:{port}", api_key="mock",
+                         api_version="2024-12-01-preview", max_retries=0),
+        # A breaker that never opens: 429s say nothing about upstream health anyway
+        Resilience(CircuitBreaker(failure_threshold=10 ** 6), max_attempts=max_attempts,
+                   base_delay=0.1, max_delay=2.0, deadline=60),
+        is_async=True,
+        limiter=limiter,
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = {}
+
+    async def one():
+        async with semaphore:
+            try:
+                await client.chat.completions.create(
+                    model="mock", messages=[{"role": "user", "content": "hello"}], max_tokens=50
+                )
+                return True
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                return False
+
+    results = await asyncio.gather(*(one() for _ in range(requests)))
+    await client.close()
+    return sum(results), errors
+
+
+def worker(address, requests, concurrency, max_attempts, rpm, store_path, results):
+    """One process, like one uvicorn worker"""
+    limiter = None
+    if store_path:
+        limiter = RateLimiter(rpm=int(rpm * 0.9), burst_seconds=0.1, store=SQLiteBucketStore(store_path))
+    results.put(asyncio.run(send(address, requests, concurrency, max_attempts, limiter)))
+
+
+def scenario(label, server, args, max_attempts=1, shared_limiter=False):
+    """Run all workers at once and print what got through"""
+    store_path = None
+    if shared_limiter:
+        store_path = os.path.join(tempfile.mkdtemp(), "rate_limit.sqlite")
+
+    throttled_before = server.throttled
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(
+            server.server_address, args.requests, args.concurrency, max_attempts, args.rpm,
+            store_path, results,
+        ))
+        for _ in range(args.workers)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    succeeded = sum(ok for ok, _ in outcomes)
+    errors = {}
+    for _, worker_errors in outcomes:
+        for name, count in worker_errors.items():
+            errors[name] = errors.get(name, 0) + count
+    total = args.workers * args.requests
+    summary = ", ".join(f"{name} x{count}" for name, count in errors.items()) or "-"
+    print(f"  {label:<15} ok {succeeded:>4}/{total}  {elapsed:>6.2f}s  "
+          f"upstream 429s {server.throttled - throttled_before:>4}  errors: {summary}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Client-side rate limiting benchmark")
+    parser.add_argument("--workers", type=int, default=4, help="Processes sharing the quota")
+    parser.add_argument("--requests", type=int, default=50, help="Calls per worker")
+    parser.add_argument("--concurrency", type=int, default=20, help="Calls in flight per worker")
+    parser.add_argument("--rpm", type=int, default=1200, help="Upstream quota (requests per minute)")
+    args = parser.parse_args()
+
+    server = start_mock_upstream(delay=0.05)
+    server.rpm_quota = args.rpm
+
+    print("=" * 70)
+    print(f"RATE LIMITING: {args.workers} workers x {args.requests} calls, "
+          f"quota {args.rpm}/min ({args.rpm / 60:.0f}/s)")
+    print("=" * 70)
+    scenario("NO LIMITER", server, args)
+    scenario("RETRIES ONLY", server, args, max_attempts=4)
+    scenario("SHARED LIMITER", server, args, shared_limiter=True)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
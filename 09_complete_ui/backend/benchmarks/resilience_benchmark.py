@@ -0,0 +1,113 @@
+"""
+Benchmarks - Upstream Resilience
+
+Runs the shared resilience layer (resilience.py) against the mock upstream
+with injected faults, next to a plain client without retries:
+- FLAKY:    a share of responses are 429s with a Retry-After header
+- OUTAGE:   every response is a 503; the circuit breaker should open and
+            stop sending requests to the broken upstream
+- DEADLINE: the upstream is slower than the per-call deadline
+
+Run with: python resilience_benchmark.py --requests 200 --error-rate 0.3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Benchmarks live one level below the backend folder; config.py is at the project root
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.dirname(os.path.dirname(BACKEND_DIR)))
+
+from openai import AsyncAzureOpenAI
+
+from mock_upstream import start_mock_upstream
+from resilience import CircuitBreaker, Resilience, ResilientClient
+
+
+def make_clients(server, deadline=60.0):
+    """A plain client (no retries at all) and one behind the resilience layer"""
+    host, port = server.server_address
+    options = {"azure_endpoint": f"http://{host}:{port}", "api_key": "mock",
+               "api_version": "2024-12-01-preview", "max_retries": 0}
+    plain = AsyncAzureOpenAI(**options)
+    resilience = Resilience(CircuitBreaker(failure_threshold=5, reset_timeout=30),
+                            base_delay=0.1, max_delay=2.0, deadline=deadline)
+    return plain, ResilientClient(AsyncAzureOpenAI(**options), resilience, is_async=True)
+
+
+async def run(client, requests, concurrency):
+    """Send requests; returns (succeeded, elapsed seconds, error names)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = {}
+
+    async def one():
+        async with semaphore:
+            try:
+                await client.chat.completions.create(
+                    model="mock", messages=[{"role": "user", "content": "hello"}]
+                )
+                return True
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                return False
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    await client.close()  # inside the loop that owns the connections
+    return sum(results), elapsed, errors
+
+
+def scenario(title, server, requests, concurrency, deadline=60.0):
+    """Run one fault scenario with both clients and print a comparison"""
+    print(title)
+    for label in ("NO RETRIES", "RESILIENCE"):
+        plain, resilient = make_clients(server, deadline)
+        client = plain if label == "NO RETRIES" else resilient
+        # Only the resilient client takes a deadline; give the plain one the same budget
+        if client is plain:
+            client = plain.with_options(timeout=deadline)
+
+        errors_before = server.errors
+        succeeded, elapsed, errors = asyncio.run(run(client, requests, concurrency))
+        upstream_failures = server.errors - errors_before
+        summary = ", ".join(f"{name} x{count}" for name, count in errors.items()) or "-"
+        print(f"  {label:<11} ok {succeeded:>4}/{requests}  {elapsed:>6.2f}s  "
+              f"upstream failures {upstream_failures:>4}  errors: {summary}")
+        if client is resilient:
+            print(f"  {'':<11} {resilient.resilience.stats()}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upstream resilience benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.3, help="Share of 429s in the FLAKY run")
+    args = parser.parse_args()
+
+    server = start_mock_upstream(delay=0.05)
+
+    print("=" * 70)
+    print("UPSTREAM RESILIENCE")
+    print("=" * 70)
+
+    server.error_rate, server.error_status, server.retry_after = args.error_rate, 429, 0.2
+    scenario(f"FLAKY: {args.error_rate:.0%} of responses are 429 (Retry-After: 0.2s)",
+             server, args.requests, args.concurrency)
+
+    server.error_rate, server.error_status, server.retry_after = 1.0, 503, None
+    scenario("OUTAGE: every response is a 503", server, args.requests, args.concurrency)
+
+    server.error_rate, server.delay = 0.0, 3.0
+    scenario("DEADLINE: upstream takes 3s, deadline is 1s", server, 10, 10, deadline=1.0)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
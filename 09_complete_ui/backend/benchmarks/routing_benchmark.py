@@ -0,0 +1,124 @@
+"""
+Benchmarks - Local Intent Router
+
+Trains the router on the "train" split of data/routing_dataset.jsonl and
+evaluates it on two splits:
+- "test": generated from the same templates as "train" (most rows share
+  their phrasing with a training row), so it mostly checks the topics vary
+- "heldout": hand-written messages in phrasings the training data doesn't
+  use, including ones that mention a quiz without asking for one. Quote
+  this one: it is the closer estimate of real traffic.
+
+For each: accuracy of the decisions made locally (confidence >= threshold),
+the share decided by a rule, the fallback rate (messages that would still
+go to GPT-4) and routing latency p50/p99 (microseconds).
+
+A threshold sweep shows the accuracy / fallback trade-off for tuning
+ROUTER_CONFIDENCE_THRESHOLD.
+
+Run with: python routing_benchmark.py --threshold 0.8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Benchmarks live one level below the backend folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_router import IntentRouter, load_dataset
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def evaluate(router, examples, threshold, rules_only=False):
+    """
+    Score the router at one confidence threshold
+
+    Returns:
+        Dict with local accuracy, fallback rate and overall accuracy
+        (assuming GPT-4 gets every fallback right, i.e. an upper bound).
+        rules_only: the model never decides (the default backend setting)
+    """
+    local = correct = rules = 0
+    for text, label in examples:
+        predicted, confidence, source = router.classify(text)
+        rules += source == "rule"
+        if confidence >= threshold and (source == "rule" or not rules_only):
+            local += 1
+            correct += predicted == label
+
+    fallbacks = len(examples) - local
+    return {
+        "local_accuracy": correct / local if local else 0.0,
+        "fallback_rate": fallbacks / len(examples),
+        "overall_accuracy": (correct + fallbacks) / len(examples),
+        "rule_rate": rules / len(examples),
+    }
+
+
+def measure_latency(router, examples, repeats):
+    """Time every classify() call, in microseconds"""
+    timings = []
+    for _ in range(repeats):
+        for text, _ in examples:
+            start = time.perf_counter_ns()
+            router.classify(text)
+            timings.append((time.perf_counter_ns() - start) / 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local intent router benchmark")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--repeats", type=int, default=50, help="Latency passes over each split")
+    args = parser.parse_args()
+
+    train = load_dataset(split="train")
+    splits = {name: load_dataset(split=name) for name in ("test", "heldout")}
+
+    start = time.perf_counter()
+    router = IntentRouter()
+    router.train(train)
+    train_ms = (time.perf_counter() - start) * 1000
+
+    print("=" * 70)
+    print("LOCAL INTENT ROUTER")
+    print("=" * 70)
+    print(f"Train examples: {len(train)}   Training: {train_ms:.0f} ms   Threshold: {args.threshold}")
+
+    for name, examples in splits.items():
+        result = evaluate(router, examples, args.threshold)
+        model_only = evaluate(router, examples, 0.0)
+        rules_only = evaluate(router, examples, args.threshold, rules_only=True)
+        timings = measure_latency(router, examples, args.repeats)
+
+        print()
+        print(f"--- {name}: {len(examples)} examples ---")
+        print(f"Rules only (default):      {rules_only['local_accuracy']:.1%} accurate, "
+              f"{rules_only['fallback_rate']:.1%} to GPT-4")
+        print("With ROUTER_LOCAL_MODEL:")
+        print(f"Local decision accuracy:   {result['local_accuracy']:.1%}")
+        print(f"Fallback rate (→ GPT-4):   {result['fallback_rate']:.1%}")
+        print(f"Overall accuracy*:         {result['overall_accuracy']:.1%}")
+        print(f"Accuracy, never fall back: {model_only['local_accuracy']:.1%}")
+        print(f"Routing latency p50:       {percentile(timings, 50):.1f} µs")
+        print(f"Routing latency p99:       {percentile(timings, 99):.1f} µs")
+    print("* assuming GPT-4 routes every fallback correctly")
+    print()
+
+    print("Threshold sweep (heldout):")
+    print(f"{'threshold':>10} {'local acc':>10} {'fallback':>10}")
+    for threshold in (0.5, 0.6, 0.7, 0.8, 0.9, 0.95):
+        row = evaluate(router, splits["heldout"], threshold)
+        print(f"{threshold:>10.2f} {row['local_accuracy']:>10.1%} {row['fallback_rate']:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
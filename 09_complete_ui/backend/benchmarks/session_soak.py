@@ -0,0 +1,132 @@
+"""
+Benchmarks - Session Store Soak Test
+
+Simulates a long-running backend: many students, 100k chat turns.
+Every turn does what the backend does for a chat message:
+get the session's history, build the prompt, store the new exchange.
+
+RSS (resident memory) is sampled as the run goes. With the bounded
+SessionStore it should level off once the limits are reached and stay flat.
+With --baseline the old behaviour is simulated instead: one shared history
+list that every turn is appended to (RSS keeps climbing).
+
+Run with: python session_soak.py --turns 100000
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+
+# Benchmarks live one level below the backend folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_store import SessionStore
+
+
+SYSTEM_PROMPT = "You are a friendly teaching assistant who helps students learn through conversation."
+
+
+def rss_mb():
+    """Current resident set size in MB (falls back to peak RSS off Linux)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # ru_maxrss is KB on Linux, bytes on macOS; this path is only a fallback
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def make_text(turn, rng, min_chars, max_chars):
+    """A unique message of random length (unique so nothing gets shared)"""
+    length = rng.randint(min_chars, max_chars)
+    return f"[turn {turn}] " + "x" * length
+
+
+def run(args):
+    rng = random.Random(42)
+
+    store = SessionStore(
+        max_sessions=args.max_sessions,
+        ttl_seconds=args.ttl,
+        max_bytes=args.max_mb * 1024 * 1024,
+        max_messages=args.max_messages,
+    )
+    shared_history = [{"role": "system", "content": SYSTEM_PROMPT}]
+
+    checkpoint_every = max(1, args.turns // 10)
+    samples = []
+    start = time.perf_counter()
+
+    for turn in range(1, args.turns + 1):
+        session_id = f"student-{rng.randrange(args.students)}"
+        user_message = make_text(turn, rng, 20, 200)
+        reply = make_text(turn, rng, 200, 2000)
+
+        if args.baseline:
+            # Old behaviour: one global ChatAgent.messages list
+            shared_history.append({"role": "user", "content": user_message})
+            prompt = shared_history
+            shared_history.append({"role": "assistant", "content": reply})
+        else:
+            history = store.get_history(session_id)
+            prompt = (
+                [{"role": "system", "content": SYSTEM_PROMPT}]
+                + history
+                + [{"role": "user", "content": user_message}]
+            )
+            store.add_turn(session_id, user_message, reply)
+
+        if turn % checkpoint_every == 0:
+            stats = store.stats()
+            samples.append((turn, rss_mb(), len(prompt), stats))
+            print(
+                f"{turn:>9,} turns  RSS {samples[-1][1]:8.1f} MB  "
+                f"prompt {len(prompt):>7,} msgs  "
+                f"sessions {stats['sessions']:>6,}  evictions {stats['evictions']:>7,}"
+            )
+
+    elapsed = time.perf_counter() - start
+    return samples, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session store soak test")
+    parser.add_argument("--turns", type=int, default=100_000)
+    parser.add_argument("--students", type=int, default=1_500, help="Distinct session ids")
+    parser.add_argument("--max-sessions", type=int, default=1000)
+    parser.add_argument("--ttl", type=int, default=1800, help="Idle TTL in seconds")
+    parser.add_argument("--max-mb", type=int, default=32, help="Store memory ceiling")
+    parser.add_argument("--max-messages", type=int, default=50)
+    parser.add_argument("--baseline", action="store_true",
+                        help="Simulate the old single shared history instead")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("SESSION STORE SOAK TEST" + (" (BASELINE: shared history)" if args.baseline else ""))
+    print("=" * 70)
+    print(f"Start RSS: {rss_mb():.1f} MB")
+    print()
+
+    samples, elapsed = run(args)
+
+    # Compare the end of the run against its midpoint (after warm-up)
+    warm = samples[len(samples) // 2 - 1][1]
+    final = samples[-1][1]
+    growth = (final - warm) / warm * 100
+
+    print()
+    print(f"⏱️  {args.turns:,} turns in {elapsed:.1f}s ({args.turns / elapsed:,.0f} turns/s)")
+    print(f"📈 RSS growth over the second half of the run: {growth:+.1f}%")
+    if growth < 5:
+        print("✅ Memory is flat")
+    else:
+        print("⚠️  Memory is still growing")
+
+
+if __name__ == "__main__":
+    main()
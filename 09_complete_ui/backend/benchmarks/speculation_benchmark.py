@@ -0,0 +1,126 @@
+"""
+Benchmarks - Speculative Routing
+
+Measures what speculative routing saves and what it wastes when every
+request needs GPT-4 routing (the local router is switched off).
+
+Simulated students send a few messages each. A student usually keeps using
+the same agent (--stickiness), which is what the speculative guess (the
+session's previous agent) relies on. Both modes run against the local mock
+upstream:
+- SEQUENTIAL:  route with GPT-4, then call the agent
+- SPECULATIVE: start the guessed agent while GPT-4 is routing
+
+Run with: python speculation_benchmark.py --students 20 --turns 10 --stickiness 0.8
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+# Benchmarks live one level below the backend folder; config.py is at the project root
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.dirname(os.path.dirname(BACKEND_DIR)))
+
+from mock_upstream import start_mock_upstream, use_mock_upstream
+
+
+# The mock routes on keywords, so these always land on the intended agent
+PROMPTS = {
+    "chat": ["How are you today?", "I'm stuck on my homework", "What should I study next?"],
+    "quiz": ["Quiz me on fractions", "Give me a quiz on the French Revolution", "Quiz me on Python loops"],
+    "explanation": ["Explain photosynthesis", "Explain recursion", "Explain supply and demand"],
+}
+
+
+def make_conversations(students, turns, stickiness, seed=0):
+    """One list of messages per student; agents repeat with probability `stickiness`"""
+    rng = random.Random(seed)
+    conversations = []
+    for _ in range(students):
+        agent = rng.choice(list(PROMPTS))
+        messages = []
+        for _ in range(turns):
+            if rng.random() > stickiness:
+                agent = rng.choice(list(PROMPTS))
+            messages.append(rng.choice(PROMPTS[agent]))
+        conversations.append(messages)
+    return conversations
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run(orchestrator, conversations):
+    """Run all students concurrently (each student's messages in order)"""
+    latencies = []
+
+    async def student(index, messages):
+        session_id = f"student-{index}"
+        for message in messages:
+            start = time.perf_counter()
+            await orchestrator.aprocess_request(message, session_id=session_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(student(i, m) for i, m in enumerate(conversations)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speculative routing benchmark")
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=10, help="Messages per student")
+    parser.add_argument("--stickiness", type=float, default=0.8,
+                        help="Chance a student's next message goes to the same agent")
+    parser.add_argument("--delay", type=float, default=0.2, help="Mock upstream delay per call (s)")
+    args = parser.parse_args()
+
+    server = start_mock_upstream(delay=args.delay)
+    use_mock_upstream(server)
+    # Every request goes to GPT-4 routing, and nothing is answered from cache
+    os.environ["ROUTER_CONFIDENCE_THRESHOLD"] = "2"
+    os.environ["RESPONSE_CACHE_AGENTS"] = ""
+
+    # Import only after the environment points at the mock
+    import client_provider
+    from orchestrator import Orchestrator
+    from session_store import SessionStore
+
+    conversations = make_conversations(args.students, args.turns, args.stickiness)
+    total = args.students * args.turns
+
+    print("=" * 70)
+    print("SPECULATIVE ROUTING")
+    print("=" * 70)
+    print(f"{args.students} students x {args.turns} turns, stickiness {args.stickiness}, "
+          f"mock delay {args.delay}s per call")
+    print()
+    print(f"{'mode':<12} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'hit rate':>9} {'wasted tok/req':>15}")
+
+    for label, speculative in (("SEQUENTIAL", False), ("SPECULATIVE", True)):
+        client_provider.reset_clients()
+        orchestrator = Orchestrator(session_store=SessionStore(), speculative=speculative)
+        latencies = asyncio.run(run(orchestrator, conversations))
+
+        spec = orchestrator.speculation_stats
+        hit_rate = spec["hits"] / spec["attempts"] if spec["attempts"] else 0.0
+        print(f"{label:<12} {percentile(latencies, 50):>8.0f} {percentile(latencies, 99):>8.0f} "
+              f"{sum(latencies) / len(latencies):>8.0f} {hit_rate:>9.1%} "
+              f"{spec['tokens_wasted'] / total:>15.1f}")
+
+    print()
+    print(f"Latency saved by right guesses: {spec['latency_saved_ms'] / 1000:.1f}s "
+          f"over {spec['hits']} requests")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Step 9: Complete UI - Bulk Quiz Generation
+
+Builds question banks for a whole syllabus offline.
+
+Looping over QuizAgent.generate_quiz() for hundreds of topics takes hours,
+and one crash loses everything. This script:
+1. Reads a topic list (one topic per line, # starts a comment)
+2. Writes the requests as a batch input file (the OpenAI / Azure OpenAI
+   batch JSONL format, so it can also be submitted to the Batch API)
+3. Runs them with an async worker pool, using the same prompt as QuizAgent
+4. Appends every answer to results.jsonl (batch output format) as soon as
+   it arrives
+5. Exports the finished quizzes, parsed and checked (see quiz_model.py),
+   to quizzes.jsonl, and with --bank into the question bank the backend
+   draws quizzes from (see question_bank.py)
+
+results.jsonl is the checkpoint: run the same command again after a crash
+or Ctrl+C and only the unfinished (or failed, or invalid) topics are
+generated.
+
+Run with: python bulk_quiz.py topics.txt --questions 20 --out question_bank
+
+To try it without Azure, start the stand-in server and point config at it:
+    python benchmarks/mock_upstream.py --port 8100 --delay 0.5
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8100 AZURE_OPENAI_API_KEY=mock python bulk_quiz.py topics.txt
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+import uuid
+
+# Add path for config import (go up 3 levels to reach project root)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from config import GPT4_DEPLOYMENT_NAME, QUESTION_BANK_PATH
+from client_provider import get_async_client
+from quiz_agent import QuizAgent
+from quiz_model import RESPONSE_FORMAT, Quiz, QuizFormatError
+from question_bank import QuestionBank
+
+
+def load_topics(path):
+    """Read one topic per line, skipping blank lines, comments and duplicates"""
+    topics = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            topic = line.split("#", 1)[0].strip()
+            if topic and topic not in topics:
+                topics.append(topic)
+    return topics
+
+
+def request_id(topic, num_questions):
+    """
+    Stable custom_id for a topic
+
+    Derived from the request itself (not its line number), so reordering or
+    extending the topic list doesn't invalidate finished work.
+    """
+    digest = hashlib.sha1(f"{topic}|{num_questions}".encode()).hexdigest()[:12]
+    return f"quiz-{digest}"
+
+
+def build_requests(topics, num_questions, agent):
+    """
+    Build one batch request line per topic
+
+    Returns:
+        List of {"custom_id", "method", "url", "body"} dicts
+    """
+    return [
+        {
+            "custom_id": request_id(topic, num_questions),
+            "method": "POST",
+            "url": "/chat/completions",
+            "body": {
+                "model": GPT4_DEPLOYMENT_NAME,
+                "messages": agent._build_messages(topic, num_questions),
+                "temperature": 0.7,
+                "response_format": RESPONSE_FORMAT,
+            },
+        }
+        for topic in topics
+    ]
+
+
+def read_jsonl(path):
+    """Read a JSONL file, ignoring a half-written last line after a crash"""
+    rows = []
+    if not os.path.exists(path):
+        return rows
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return rows
+
+
+def write_jsonl(path, rows):
+    """Write rows as a JSONL file (replacing it)"""
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+def append_line(f, row):
+    """Append one record and make sure it is on disk before moving on"""
+    f.write(json.dumps(row) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+async def run_requests(requests, client, workers, results_path, errors_path):
+    """
+    Send batch requests with a pool of async workers
+
+    Every finished request is appended to results_path (or errors_path)
+    straight away, so an interrupted run loses at most the requests in flight.
+
+    Returns:
+        Tuple of (succeeded, failed)
+    """
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+
+    total = len(requests)
+    counts = {"ok": 0, "failed": 0}
+
+    with open(results_path, "a", encoding="utf-8") as results, \
+            open(errors_path, "w", encoding="utf-8") as errors:
+
+        async def worker():
+            while not queue.empty():
+                request = queue.get_nowait()
+                start_time = time.perf_counter()
+                line = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": request["custom_id"]}
+                try:
+                    response = await client.chat.completions.create(**request["body"])
+                    line["response"] = {"status_code": 200, "body": response.model_dump()}
+                    line["error"] = None
+                    append_line(results, line)
+                    counts["ok"] += 1
+                    status = "✅"
+                except Exception as e:
+                    line["response"] = None
+                    line["error"] = {"code": type(e).__name__, "message": str(e)}
+                    append_line(errors, line)
+                    counts["failed"] += 1
+                    status = "❌"
+
+                done = counts["ok"] + counts["failed"]
+                elapsed = time.perf_counter() - start_time
+                print(f"{status} [{done}/{total}] {request['custom_id']} ({elapsed:.1f}s)")
+
+        await asyncio.gather(*(worker() for _ in range(max(1, min(workers, total)))))
+
+    return counts["ok"], counts["failed"]
+
+
+def read_quizzes(topics, num_questions, results_path):
+    """
+    Parse the latest answer for every topic in results_path
+
+    Returns:
+        Tuple of ({custom_id: Quiz} in topic order, {custom_id: error} for
+        answers that aren't a valid quiz)
+    """
+    answers = {}
+    for row in read_jsonl(results_path):
+        if row.get("error") is None and row.get("response"):
+            answers[row["custom_id"]] = row["response"]["body"]["choices"][0]["message"]["content"]
+
+    quizzes, invalid = {}, {}
+    for topic in topics:
+        custom_id = request_id(topic, num_questions)
+        if custom_id not in answers:
+            continue
+        try:
+            quizzes[custom_id] = Quiz.from_json(answers[custom_id], topic)
+        except QuizFormatError as e:
+            invalid[custom_id] = f"{topic}: {e}"
+    return quizzes, invalid
+
+
+def export_quizzes(topics, num_questions, results_path, export_path):
+    """
+    Write the finished question bank as Quiz.to_dict() lines
+
+    Answers that aren't a valid quiz are skipped (and reported); they don't
+    count as finished, so the next run regenerates them.
+
+    Returns:
+        Number of topics with a quiz
+    """
+    quizzes, invalid = read_quizzes(topics, num_questions, results_path)
+    for custom_id, error in invalid.items():
+        print(f"⚠️  {custom_id} ({error})")
+    write_jsonl(export_path, [quiz.to_dict() for quiz in quizzes.values()])
+    return len(quizzes)
+
+
+def fill_bank(export_path, bank_path):
+    """
+    Add every exported question to the question bank (duplicates are skipped)
+
+    Returns:
+        Tuple of (new questions, questions already in the bank)
+    """
+    bank = QuestionBank(bank_path)
+    for row in read_jsonl(export_path):
+        bank.add(row["topic"], Quiz.from_dict(row))
+    return bank.added, bank.duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate quizzes for a list of topics")
+    parser.add_argument("topics", help="Text file with one topic per line")
+    parser.add_argument("--questions", type=int, default=20, help="Questions per quiz")
+    parser.add_argument("--out", default="question_bank", help="Output folder (also the checkpoint)")
+    parser.add_argument("--workers", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--bank", default=QUESTION_BANK_PATH or None,
+                        help="Also add the questions to this question bank (SQLite file)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only write the batch input file (e.g. to submit to the Batch API)")
+    args = parser.parse_args()
+
+    topics = load_topics(args.topics)
+    os.makedirs(args.out, exist_ok=True)
+    input_path = os.path.join(args.out, "batch_input.jsonl")
+    results_path = os.path.join(args.out, "results.jsonl")
+    errors_path = os.path.join(args.out, "errors.jsonl")
+    export_path = os.path.join(args.out, "quizzes.jsonl")
+
+    requests = build_requests(topics, args.questions, QuizAgent())
+    write_jsonl(input_path, requests)
+    print(f"📝 {len(requests)} requests written to {input_path}")
+    if args.dry_run:
+        return
+
+    finished, _ = read_quizzes(topics, args.questions, results_path)
+    todo = [r for r in requests if r["custom_id"] not in finished]
+    if len(todo) < len(requests):
+        print(f"⏩ Resuming: {len(requests) - len(todo)} topics already done, {len(todo)} to go")
+
+    start_time = time.perf_counter()
+    succeeded, failed = asyncio.run(
+        run_requests(todo, get_async_client(), args.workers, results_path, errors_path)
+    )
+    elapsed = time.perf_counter() - start_time
+
+    exported = export_quizzes(topics, args.questions, results_path, export_path)
+    print()
+    print(f"🎓 {succeeded} generated, {failed} failed in {elapsed:.1f}s")
+    print(f"   {exported}/{len(requests)} quizzes in {export_path}")
+    if args.bank:
+        added, duplicates = fill_bank(export_path, args.bank)
+        print(f"   {added} new questions in {args.bank} ({duplicates} were already there)")
+    if failed:
+        print(f"   Failed requests are in {errors_path}; run the same command again to retry them")
+    if exported < len(requests) - failed:
+        print("   Answers that weren't a valid quiz are regenerated by the next run too")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@
 Step 9: Complete UI - Chat Agent
 
 This is a copy of the ChatAgent for Step 9 to keep this folder self-contained.
+
+The backend also needs a non-blocking path, so each method has an async
+twin (chat -> achat) built on AsyncAzureOpenAI. The sync API is unchanged.
 """
 
 import sys
@@ -9,13 +12,10 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from openai import AzureOpenAI
-from config import (
-    AZURE_OPENAI_ENDPOINT,
-    AZURE_OPENAI_API_KEY,
-    AZURE_OPENAI_API_VERSION,
-    GPT4_DEPLOYMENT_NAME
-)
+from config import GPT4_DEPLOYMENT_NAME
+from client_provider import get_client, get_async_client
+from streaming import stream_completion
+from metrics import instrument_agent, record_usage
 
 
 class ChatAgent:
@@ -26,27 +26,87 @@ class ChatAgent:
     """
     
     def __init__(self):
-        self.client = AzureOpenAI(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=AZURE_OPENAI_API_VERSION,
-        )
+        # Shared, connection-pooled clients (see client_provider.py);
+        # the async one is for the FastAPI backend
+        self.client = get_client()
+        self.async_client = get_async_client()
         
         self.system_prompt = "You are a friendly teaching assistant who helps students learn through conversation."
         self.messages = [{"role": "system", "content": self.system_prompt}]
     
-    def chat(self, user_message):
+    def _prepare_messages(self, user_message, history):
+        """
+        Build the message list for one turn
+        
+        With history=None the agent uses (and grows) its own self.messages,
+        like in Steps 6-8. With a history list (one student's session) a
+        fresh list is built and the caller is responsible for storing the turn.
+        """
+        if history is None:
+            self.messages.append({"role": "user", "content": user_message})
+            return self.messages
+        
+        return (
+            [{"role": "system", "content": self.system_prompt}]
+            + history
+            + [{"role": "user", "content": user_message}]
+        )
+    
+    def _record_reply(self, response_text, history):
+        """Add the reply to the agent's own history (only when it owns it)"""
+        if history is None:
+            self.messages.append({"role": "assistant", "content": response_text})
+    
+    @instrument_agent("chat")
+    def chat(self, user_message, history=None):
         """Handle a chat message"""
-        self.messages.append({"role": "user", "content": user_message})
+        messages = self._prepare_messages(user_message, history)
         
         response = self.client.chat.completions.create(
             model=GPT4_DEPLOYMENT_NAME,
-            messages=self.messages,
+            messages=messages,
+            temperature=0.7
+        )
+        
+        record_usage("chat", response.usage)
+        response_text = response.choices[0].message.content
+        self._record_reply(response_text, history)
+        
+        return response_text
+    
+    @instrument_agent("chat")
+    async def achat(self, user_message, history=None):
+        """Handle a chat message without blocking the event loop"""
+        messages = self._prepare_messages(user_message, history)
+        
+        response = await self.async_client.chat.completions.create(
+            model=GPT4_DEPLOYMENT_NAME,
+            messages=messages,
             temperature=0.7
         )
         
+        record_usage("chat", response.usage)
         response_text = response.choices[0].message.content
-        self.messages.append({"role": "assistant", "content": response_text})
+        self._record_reply(response_text, history)
         
         return response_text
+    
+    @instrument_agent("chat")
+    async def astream_chat(self, user_message, history=None):
+        """
+        Stream a chat reply as ("token", text) / ("usage", dict) events
+        
+        The full reply is recorded once the stream finishes.
+        """
+        messages = self._prepare_messages(user_message, history)
+        
+        parts = []
+        async for event, data in stream_completion(self.async_client, messages, temperature=0.7):
+            if event == "token":
+                parts.append(data)
+            elif event == "usage":
+                record_usage("chat", data)
+            yield event, data
+        
+        self._record_reply("".join(parts), history)
 
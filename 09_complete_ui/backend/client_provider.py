@@ -0,0 +1,172 @@
+"""
+Step 9: Complete UI - Shared Upstream Clients
+
+One sync and one async Azure OpenAI client for the whole process.
+
+Previously the orchestrator and each agent built their own AzureOpenAI
+client, so every one of them had its own HTTP connection pool: the routing
+call and the agent call never shared a connection, and each pool paid its
+own TCP + TLS handshakes. Now every agent draws from the same pooled client.
+
+Both clients are wrapped in a ResilientClient (see resilience.py), so every
+call is retried with backoff and guarded by one shared circuit breaker. The
+SDK's own retries are switched off to avoid retrying twice. When RPM/TPM
+limits are configured, both clients also share one RateLimiter (see
+rate_limiter.py), optionally backed by a SQLite file shared by all workers.
+
+Pool size, keep-alive, HTTP/2, timeouts and retries are set in config.py.
+"""
+
+import sys
+import os
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from openai import AzureOpenAI, AsyncAzureOpenAI
+from resilience import CircuitBreaker, Resilience, ResilientClient
+from rate_limiter import MemoryBucketStore, RateLimiter, SQLiteBucketStore
+from config import (
+    AZURE_OPENAI_ENDPOINT,
+    AZURE_OPENAI_API_KEY,
+    AZURE_OPENAI_API_VERSION,
+    GPT4_DEPLOYMENT_NAME,
+    UPSTREAM_MAX_CONNECTIONS,
+    UPSTREAM_MAX_KEEPALIVE,
+    UPSTREAM_KEEPALIVE_EXPIRY,
+    UPSTREAM_HTTP2,
+    UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_READ_TIMEOUT,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    UPSTREAM_DEADLINE_SECONDS,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+    RATE_LIMIT_RPM,
+    RATE_LIMIT_TPM,
+    RATE_LIMIT_POLICY,
+    RATE_LIMIT_MAX_WAIT,
+    RATE_LIMIT_BURST_SECONDS,
+    RATE_LIMIT_COMPLETION_TOKENS,
+    RATE_LIMIT_STORE
+)
+
+# HTTP/2 needs the optional "h2" package (pip install httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+_lock = threading.Lock()
+_client = None
+_async_client = None
+_resilience = None
+_limiter = None
+
+
+def _http_options():
+    """Connection pool settings shared by the sync and async clients"""
+    http2 = UPSTREAM_HTTP2 and HTTP2_AVAILABLE
+    if UPSTREAM_HTTP2 and not HTTP2_AVAILABLE:
+        print("⚠️  UPSTREAM_HTTP2 is on but the 'h2' package is missing - using HTTP/1.1")
+
+    return {
+        "limits": httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(UPSTREAM_READ_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+        "http2": http2,
+    }
+
+
+def get_resilience():
+    """Get the retry policy and circuit breaker shared by both clients"""
+    global _resilience
+    with _lock:
+        if _resilience is None:
+            _resilience = Resilience(
+                CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS),
+                max_attempts=RETRY_MAX_ATTEMPTS,
+                base_delay=RETRY_BASE_DELAY,
+                max_delay=RETRY_MAX_DELAY,
+                deadline=UPSTREAM_DEADLINE_SECONDS,
+            )
+        return _resilience
+
+
+def get_rate_limiter():
+    """Get the RPM/TPM limiter shared by both clients (None if no limits are set)"""
+    global _limiter
+    if not RATE_LIMIT_RPM and not RATE_LIMIT_TPM:
+        return None
+    with _lock:
+        if _limiter is None:
+            store = SQLiteBucketStore(RATE_LIMIT_STORE) if RATE_LIMIT_STORE else MemoryBucketStore()
+            _limiter = RateLimiter(
+                rpm=RATE_LIMIT_RPM,
+                tpm=RATE_LIMIT_TPM,
+                policy=RATE_LIMIT_POLICY,
+                max_wait=RATE_LIMIT_MAX_WAIT,
+                burst_seconds=RATE_LIMIT_BURST_SECONDS,
+                completion_tokens=RATE_LIMIT_COMPLETION_TOKENS,
+                store=store,
+                name=GPT4_DEPLOYMENT_NAME or "default",
+            )
+        return _limiter
+
+
+def get_client():
+    """Get the process-wide AzureOpenAI client (created on first use)"""
+    global _client
+    resilience = get_resilience()
+    limiter = get_rate_limiter()
+    with _lock:
+        if _client is None:
+            _client = ResilientClient(AzureOpenAI(
+                azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                api_key=AZURE_OPENAI_API_KEY,
+                api_version=AZURE_OPENAI_API_VERSION,
+                http_client=httpx.Client(**_http_options()),
+                max_retries=0,
+            ), resilience, limiter=limiter)
+        return _client
+
+
+def get_async_client():
+    """Get the process-wide AsyncAzureOpenAI client (created on first use)"""
+    global _async_client
+    resilience = get_resilience()
+    limiter = get_rate_limiter()
+    with _lock:
+        if _async_client is None:
+            _async_client = ResilientClient(AsyncAzureOpenAI(
+                azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                api_key=AZURE_OPENAI_API_KEY,
+                api_version=AZURE_OPENAI_API_VERSION,
+                http_client=httpx.AsyncClient(**_http_options()),
+                max_retries=0,
+            ), resilience, is_async=True, limiter=limiter)
+        return _async_client
+
+
+def reset_clients():
+    """
+    Forget the shared clients so the next call creates new ones
+
+    The async client's connections belong to the event loop that opened
+    them, so benchmarks that start a new loop (asyncio.run) call this first.
+    Retry counters, the circuit breaker and the rate limiter start over too
+    (a SQLite store keeps its buckets, since other workers share them).
+    """
+    global _client, _async_client, _resilience, _limiter
+    with _lock:
+        _client = None
+        _async_client = None
+        _resilience = None
+        _limiter = None
@@ -0,0 +1,296 @@
+"""
+Step 9: Complete UI - Conversation Store
+
+Keeps every session's messages in a SQLite file, so conversations survive a
+backend restart and long histories don't have to stay in memory.
+
+The SessionStore only holds what the prompt builder needs (the running
+summary and the latest messages) and loses all of it on restart or when a
+session is evicted. With a ConversationStore behind it:
+- every message is appended to the file as well (rows are only ever
+  inserted; summaries and the last agent are kept per session)
+- appends are buffered and committed in batches by a background thread,
+  every flush_interval seconds or batch_size messages, so a chat turn never
+  waits for the disk. A crash loses at most the last flush_interval.
+- a session that isn't in memory is rebuilt from the file with only its
+  summary and newest messages (load(), called in a thread by the backend),
+  however long its history is
+- a retention policy deletes sessions idle for retention_days and keeps at
+  most max_messages messages per session (prune(), run by the writer thread)
+
+The file uses WAL mode, so reads (loading a session) don't block the writer.
+Sessions still live in one process's memory: with several uvicorn workers,
+route a session to the same worker, as without this store.
+"""
+
+import sqlite3
+import threading
+import time
+
+
+class ConversationStore:
+    """Append-only, batched SQLite storage for session histories"""
+
+    def __init__(self, path, flush_interval=0.05, batch_size=500, retention_days=30,
+                 max_messages=1000, prune_interval=3600, timeout=5.0):
+        """
+        Args:
+            path: SQLite file (created if missing)
+            flush_interval: Seconds between commits of buffered appends
+            batch_size: Buffered messages that trigger a commit right away
+            retention_days: Sessions idle for longer are deleted (0 = keep forever)
+            max_messages: Messages kept per session, oldest deleted first (0 = no limit)
+            prune_interval: Seconds between retention runs
+            timeout: Seconds to wait for another process's write lock
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self.max_messages = max_messages
+        self.prune_interval = prune_interval
+        self.timeout = timeout
+        self._local = threading.local()  # sqlite3 connections are per thread
+
+        self._pending_messages = []  # (session, seq, role, content, created)
+        self._pending_sessions = {}  # session -> {column: value} to upsert
+        self._pending_deletes = []  # sessions to forget
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.Lock()  # one batch at a time, in order
+        self._wake = threading.Event()
+        self._closed = False
+
+        self.appended = 0  # messages handed to append()
+        self.committed = 0  # messages written to the file
+        self.commits = 0
+        self.loads = 0
+        self.pruned = 0
+
+        self._connection()  # create the schema now, not on the first turn
+        self._last_prune = time.monotonic()
+        self._writer = threading.Thread(target=self._run_writer, name="conversation-writer", daemon=True)
+        self._writer.start()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode NORMAL only syncs at checkpoints: a power cut can lose
+            # the last commits, never corrupt the file
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "session TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+                "content TEXT NOT NULL, created REAL NOT NULL, "
+                "PRIMARY KEY (session, seq)) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session TEXT PRIMARY KEY, next_seq INTEGER NOT NULL DEFAULT 0, "
+                "summary TEXT, folded_upto INTEGER NOT NULL DEFAULT 0, "
+                "folded_tokens INTEGER NOT NULL DEFAULT 0, last_agent TEXT, "
+                "updated REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+            self._local.connection = connection
+        return connection
+
+    # ------------------------------------------------------------------
+    # Writing (buffered)
+    # ------------------------------------------------------------------
+
+    def append(self, session_id, start, messages):
+        """
+        Queue messages for writing
+
+        Args:
+            session_id: The session
+            start: Position of the first message in the whole history
+            messages: {"role", "content"} dicts (None content, e.g. a
+                content-filtered reply, is stored as "")
+        """
+        now = time.time()
+        rows = [
+            (session_id, start + i, message["role"], message["content"] or "", now)
+            for i, message in enumerate(messages)
+        ]
+        with self._buffer_lock:
+            self._pending_messages.extend(rows)
+            self._queue_session(session_id, next_seq=start + len(rows))
+            full = len(self._pending_messages) >= self.batch_size
+            self.appended += len(rows)
+        if full:
+            self._wake.set()
+
+    def update(self, session_id, **fields):
+        """
+        Queue new values for a session's summary or last agent
+
+        Args:
+            **fields: Any of summary, folded_upto, folded_tokens, last_agent
+        """
+        with self._buffer_lock:
+            self._queue_session(session_id, **fields)
+
+    def delete(self, session_id):
+        """Forget a session and all its messages"""
+        with self._buffer_lock:
+            self._pending_messages = [row for row in self._pending_messages if row[0] != session_id]
+            self._pending_sessions.pop(session_id, None)
+            self._pending_deletes.append(session_id)
+        self._wake.set()
+
+    def _queue_session(self, session_id, **fields):
+        """Merge updates to one session (caller holds the buffer lock)"""
+        self._pending_sessions.setdefault(session_id, {}).update(fields)
+
+    def flush(self):
+        """Write everything buffered so far, in one transaction"""
+        with self._write_lock:
+            with self._buffer_lock:
+                messages, self._pending_messages = self._pending_messages, []
+                sessions, self._pending_sessions = self._pending_sessions, {}
+                deletes, self._pending_deletes = self._pending_deletes, []
+            if not (messages or sessions or deletes):
+                return
+
+            now = time.time()
+            connection = self._connection()
+            with connection:
+                # Autocommit connection: without BEGIN every row would be its own commit
+                connection.execute("BEGIN IMMEDIATE")
+                for session_id in deletes:
+                    connection.execute("DELETE FROM messages WHERE session = ?", (session_id,))
+                    connection.execute("DELETE FROM sessions WHERE session = ?", (session_id,))
+                connection.executemany(
+                    "INSERT OR REPLACE INTO messages (session, seq, role, content, created) "
+                    "VALUES (?, ?, ?, ?, ?)", messages
+                )
+                for session_id, fields in sessions.items():
+                    connection.execute(
+                        "INSERT INTO sessions (session, updated) VALUES (?, ?) "
+                        "ON CONFLICT (session) DO UPDATE SET updated = excluded.updated",
+                        (session_id, now),
+                    )
+                    if fields:
+                        assignments = ", ".join(f"{column} = ?" for column in fields)
+                        connection.execute(
+                            f"UPDATE sessions SET {assignments} WHERE session = ?",
+                            (*fields.values(), session_id),
+                        )
+            self.committed += len(messages)
+            self.commits += 1
+
+    def _run_writer(self):
+        """Background thread: commit the buffer every flush_interval, prune now and then"""
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if time.monotonic() - self._last_prune >= self.prune_interval:
+                    self.prune()
+            except sqlite3.Error as e:
+                # Not fatal: the messages are lost from the file, the live session is unaffected
+                print(f"⚠️  Conversation store write failed: {e}")
+
+    def close(self):
+        """Stop the writer thread and write what is left"""
+        self._closed = True
+        self._wake.set()
+        self._writer.join(timeout=self.timeout)
+        self.flush()
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def load(self, session_id, max_messages):
+        """
+        Read what a prompt needs from a stored session
+
+        Only the messages after the summary are considered, and only the
+        newest max_messages of them are read. This flushes and reads the
+        file, so async code calls it in a thread (SessionStore.aload()).
+
+        Returns:
+            Dict with messages, offset (position of the first one), summary,
+            folded_tokens and last_agent; None for an unknown session
+        """
+        self.flush()  # a session may be evicted while its last turn is still buffered
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT next_seq, summary, folded_upto, folded_tokens, last_agent "
+            "FROM sessions WHERE session = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        next_seq, summary, folded_upto, folded_tokens, last_agent = row
+
+        start = max(folded_upto, next_seq - max_messages)
+        rows = connection.execute(
+            "SELECT seq, role, content FROM messages WHERE session = ? AND seq >= ? ORDER BY seq",
+            (session_id, start),
+        ).fetchall()
+        self.loads += 1
+        return {
+            "messages": [{"role": role, "content": content} for _, role, content in rows],
+            "offset": rows[0][0] if rows else next_seq,
+            "summary": summary,
+            "folded_tokens": folded_tokens,
+            "last_agent": last_agent,
+        }
+
+    def count(self, session_id):
+        """Messages ever appended to a session (including deleted ones)"""
+        self.flush()
+        row = self._connection().execute(
+            "SELECT next_seq FROM sessions WHERE session = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    # ------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------
+
+    def prune(self):
+        """
+        Apply the retention policy
+
+        Returns:
+            Number of messages deleted
+        """
+        self._last_prune = time.monotonic()
+        connection = self._connection()
+        deleted = 0
+        with self._write_lock, connection:
+            connection.execute("BEGIN IMMEDIATE")
+            if self.retention_days:
+                cutoff = time.time() - self.retention_days * 86400
+                deleted += connection.execute(
+                    "DELETE FROM messages WHERE session IN "
+                    "(SELECT session FROM sessions WHERE updated < ?)", (cutoff,)
+                ).rowcount
+                connection.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,))
+            if self.max_messages:
+                deleted += connection.execute(
+                    "DELETE FROM messages WHERE seq < "
+                    "(SELECT next_seq FROM sessions WHERE sessions.session = messages.session) - ?",
+                    (self.max_messages,),
+                ).rowcount
+        self.pruned += deleted
+        return deleted
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._buffer_lock:
+            buffered = len(self._pending_messages)
+        return {
+            "appended": self.appended,
+            "committed": self.committed,
+            "buffered": buffered,
+            "commits": self.commits,
+            "loads": self.loads,
+            "pruned": self.pruned,
+        }
@@ -2,6 +2,8 @@
 Step 9: Complete UI - Explanation Agent
 
 This is a copy of the ExplanationAgent for Step 9 to keep this folder self-contained.
+
+explain has an async twin (aexplain) for the FastAPI backend.
 """
 
 import sys
@@ -9,13 +11,12 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from openai import AzureOpenAI
-from config import (
-    AZURE_OPENAI_ENDPOINT,
-    AZURE_OPENAI_API_KEY,
-    AZURE_OPENAI_API_VERSION,
-    GPT4_DEPLOYMENT_NAME
-)
+from config import GPT4_DEPLOYMENT_NAME
+from client_provider import get_client, get_async_client
+from streaming import stream_completion
+from response_cache import make_cache_key
+from single_flight import SingleFlight
+from metrics import instrument_agent, record_usage
 
 
 class ExplanationAgent:
@@ -25,12 +26,16 @@ class ExplanationAgent:
     Purpose: Provide detailed explanations with examples
     """
     
-    def __init__(self):
-        self.client = AzureOpenAI(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=AZURE_OPENAI_API_VERSION,
-        )
+    def __init__(self, cache=None):
+        """
+        Args:
+            cache: Optional ResponseCache; identical requests are then
+                answered from the cache instead of calling GPT-4
+        """
+        # Shared, connection-pooled clients (see client_provider.py);
+        # the async one is for the FastAPI backend
+        self.client = get_client()
+        self.async_client = get_async_client()
         
         self.system_prompt = """You are an explanation specialist.
         Explain concepts clearly with:
@@ -38,13 +43,71 @@ class ExplanationAgent:
         2. Key points
         3. Real-world example
         4. Common misconceptions"""
+        
+        self.cache = cache
+        
+        # Identical requests in flight at the same time share one upstream call
+        self.in_flight = SingleFlight()
     
-    def explain(self, topic):
-        """Explain a concept"""
-        messages = [
+    def _cached(self, topic, fresh):
+        """
+        Look the request up in the cache
+        
+        Returns:
+            Tuple of (request key, cached response). The key also identifies
+            identical in-flight requests; the response is None on a miss,
+            when fresh=True or when caching is off.
+        """
+        key = make_cache_key(self.system_prompt, topic, temperature=0.7)
+        if self.cache is None:
+            return key, None
+        return key, self.cache.get(key, fresh)
+    
+    def _remember(self, key, response_text):
+        """Store a newly generated response (if caching is on)"""
+        if self.cache is not None:
+            self.cache.set(key, response_text)
+    
+    async def _acomplete(self, key, messages):
+        """One upstream call (the answer is cached for later requests)"""
+        response = await self.async_client.chat.completions.create(
+            model=GPT4_DEPLOYMENT_NAME,
+            messages=messages,
+            temperature=0.7
+        )
+        
+        record_usage("explanation", response.usage)
+        response_text = response.choices[0].message.content
+        self._remember(key, response_text)
+        return response_text
+    
+    async def _astream_upstream(self, key, messages):
+        """One upstream stream (the full answer is cached when it ends)"""
+        parts = []
+        async for event, data in stream_completion(self.async_client, messages, temperature=0.7):
+            if event == "token":
+                parts.append(data)
+            elif event == "usage":
+                record_usage("explanation", data)
+            yield event, data
+        
+        self._remember(key, "".join(parts))
+    
+    def _build_messages(self, topic):
+        """Build the message list sent to GPT-4"""
+        return [
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": f"Explain {topic}"}
         ]
+    
+    @instrument_agent("explanation")
+    def explain(self, topic, fresh=False):
+        """Explain a concept"""
+        key, cached = self._cached(topic, fresh)
+        if cached is not None:
+            return cached
+        
+        messages = self._build_messages(topic)
         
         response = self.client.chat.completions.create(
             model=GPT4_DEPLOYMENT_NAME,
@@ -52,5 +115,42 @@ class ExplanationAgent:
             temperature=0.7
         )
         
-        return response.choices[0].message.content
+        record_usage("explanation", response.usage)
+        response_text = response.choices[0].message.content
+        self._remember(key, response_text)
+        return response_text
+    
+    @instrument_agent("explanation")
+    async def aexplain(self, topic, fresh=False):
+        """Explain a concept without blocking the event loop"""
+        key, cached = self._cached(topic, fresh)
+        if cached is not None:
+            return cached
+        
+        messages = self._build_messages(topic)
+        
+        if fresh:
+            # Fresh answers are meant to differ, so they are never shared
+            return await self._acomplete(key, messages)
+        return await self.in_flight.do(key, lambda: self._acomplete(key, messages))
+    
+    @instrument_agent("explanation")
+    async def astream_explain(self, topic, fresh=False):
+        """Stream an explanation as ("token", text) / ("usage", dict) events"""
+        key, cached = self._cached(topic, fresh)
+        if cached is not None:
+            # Cache hit: send the whole response as a single token event
+            yield "token", cached
+            return
+        
+        messages = self._build_messages(topic)
+        
+        if fresh:
+            events = self._astream_upstream(key, messages)
+        else:
+            # Joins an identical stream already in flight (replayed from its start)
+            events = self.in_flight.stream(key, lambda: self._astream_upstream(key, messages))
+        
+        async for event, data in events:
+            yield event, data
 
@@ -0,0 +1,178 @@
+"""
+Step 9: Complete UI - History Window
+
+Keeps chat prompts a constant size, however long the conversation gets.
+
+Resending the whole history on every turn (Steps 2 and 6) means prompt
+tokens and latency grow with every message until the context limit is hit.
+Instead, each prompt gets:
+1. A running summary of the older part of the conversation
+2. The most recent messages, verbatim, up to a token budget
+
+Messages that fall out of the window are folded into the summary by a
+background task, so summarizing never adds latency to a student's request.
+"""
+
+import sys
+import os
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import GPT4_DEPLOYMENT_NAME
+from tokens import estimate_message_tokens
+from metrics import record_usage
+
+
+SUMMARY_PROMPT = """You maintain a running summary of a tutoring conversation.
+Update the summary with the new messages below. Keep the topics covered,
+what the student understood or struggled with, and anything they asked
+you to remember. Write at most {max_words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+
+class HistoryWindow:
+    """
+    Token-budgeted sliding window over a session's history
+
+    Works on the sessions in a SessionStore: window() builds the history
+    for the next prompt, maybe_summarize() folds old messages in the background.
+    """
+
+    def __init__(self, session_store, client, token_budget=1500,
+                 summary_max_tokens=300, min_fold_tokens=400):
+        """
+        Args:
+            session_store: The SessionStore holding the histories
+            client: AsyncAzureOpenAI client used for summaries
+            token_budget: Max tokens of verbatim history per prompt
+            summary_max_tokens: Max length of the running summary
+            min_fold_tokens: Only summarize once this many tokens are outside
+                the window (so summaries are written in batches, not every turn)
+        """
+        self.session_store = session_store
+        self.client = client
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.min_fold_tokens = min_fold_tokens
+
+        # session_id -> running summary task (at most one per session)
+        self._pending = {}
+
+    def _window_start(self, messages):
+        """
+        Find where the verbatim window starts in a session's MessageLog
+
+        Returns:
+            (index of the first message in the window, tokens in the window)
+        """
+        used = 0
+        start = len(messages)
+        while start > 0:
+            tokens = messages.tokens(start - 1)
+            if used + tokens > self.token_budget:
+                break
+            used += tokens
+            start -= 1
+
+        # Start on a user message so the window holds whole exchanges
+        while start < len(messages) and messages.role(start) != "user":
+            used -= messages.tokens(start)
+            start += 1
+
+        return start, used
+
+    def window(self, session_id):
+        """
+        Build the history to send with the next prompt
+
+        Args:
+            session_id: Which student's conversation
+
+        Returns:
+            Tuple of (history messages, stats). stats has:
+            - history_tokens: tokens of history actually sent
+            - full_tokens: tokens the full history would have cost
+            - tokens_saved: the difference
+        """
+        session = self.session_store.get(session_id)
+        if session is None:
+            return [], {"history_tokens": 0, "full_tokens": 0, "tokens_saved": 0}
+
+        start, used = self._window_start(session.messages)
+        history = session.messages[start:]
+
+        if session.summary:
+            summary_message = {
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {session.summary}",
+            }
+            history = [summary_message] + history
+            used += estimate_message_tokens(summary_message)
+
+        full = session.folded_tokens + session.messages.total_tokens()
+        return history, {
+            "history_tokens": used,
+            "full_tokens": full,
+            "tokens_saved": max(0, full - used),
+        }
+
+    def maybe_summarize(self, session_id):
+        """
+        Fold messages that left the window into the summary, in the background
+
+        Must be called from the event loop (e.g. after a chat turn was stored).
+        Does nothing if there isn't enough to fold yet, or a summary for this
+        session is already being written.
+        """
+        if session_id in self._pending:
+            return
+
+        session = self.session_store.get(session_id)
+        if session is None:
+            return
+
+        start, _ = self._window_start(session.messages)
+        outside_tokens = sum(session.messages.tokens(i) for i in range(start))
+        if outside_tokens < self.min_fold_tokens:
+            return
+        outside = session.messages[:start]
+
+        task = asyncio.create_task(self._summarize(
+            session_id, session.summary, outside,
+            session.offset + len(outside), outside_tokens,
+        ))
+        self._pending[session_id] = task
+        task.add_done_callback(lambda _: self._pending.pop(session_id, None))
+
+    async def _summarize(self, session_id, summary, messages, upto, folded_tokens):
+        """Write the new running summary and fold it into the session"""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = SUMMARY_PROMPT.format(
+            max_words=int(self.summary_max_tokens * 0.75),
+            summary=summary or "(none yet)",
+            messages=transcript,
+        )
+
+        try:
+            response = await self.client.chat.completions.create(
+                model=GPT4_DEPLOYMENT_NAME,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=self.summary_max_tokens
+            )
+        except Exception as e:
+            # Not fatal: the messages stay out of the window and we retry next turn
+            print(f"⚠️  History summary failed for session {session_id}: {e}")
+            return
+
+        record_usage("summary", response.usage)
+        new_summary = response.choices[0].message.content.strip()
+        self.session_store.fold(session_id, new_summary, upto, folded_tokens)
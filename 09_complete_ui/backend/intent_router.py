@@ -0,0 +1,163 @@
+"""
+Step 9: Complete UI - Local Intent Router
+
+Decides chat / quiz / explanation in microseconds, without calling GPT-4.
+
+Asking GPT-4 to pick one of three labels costs a full round-trip on every
+request. Most messages are easy ("Quiz me on fractions", "Explain entropy"),
+so we classify them locally in two stages:
+1. Keyword/regex rules for unambiguous phrasings
+2. A small linear model (logistic regression over hashed word n-grams),
+   trained at startup on data/routing_dataset.jsonl
+
+Rules decide on their own. The model is opt-in (ROUTER_LOCAL_MODEL): its
+scores aren't calibrated, and on hand-written messages (the "heldout"
+split) about a quarter of its confident answers are wrong. Without it, or
+when it isn't confident enough, the orchestrator falls back to the
+original GPT-4 routing prompt. The model's label is still the speculative
+guess (see orchestrator.py).
+"""
+
+import json
+import math
+import os
+import random
+import re
+import zlib
+
+
+LABELS = ("chat", "quiz", "explanation")
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "routing_dataset.jsonl")
+
+# Hashed feature space (collisions are rare at this size and don't matter much)
+NUM_BUCKETS = 1 << 18
+
+# Rules for phrasings that are unambiguous. Both are anchored to a request
+# at the start of the message: "I failed my quiz" mentions a quiz without
+# asking for one, and is left to the model. If rules for two different
+# labels match, the rules are ignored and the model decides.
+RULES = [
+    (re.compile(r"^\s*(can you |could you |please |i want |i'd like |i need )*"
+                r"((give|make|create|generate|write|send) (me |us )?(a |an |some |another )?"
+                r"((?!my |your )\S+ ){0,2}(quiz|quizzes|mcqs?|multiple[- ]choice questions|"
+                r"true/false questions|flashcards?|worksheet|practice (questions|problems))|"
+                r"quiz me|test me|test my knowledge|drill me)\b"), "quiz"),
+    (re.compile(r"^\s*(can you |could you |please )?(explain|elaborate|break down|walk me through|"
+                r"help me understand|clarify)\b"), "explanation"),
+]
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def extract_features(text):
+    """
+    Turn a message into hashed feature ids
+
+    Features: word unigrams, word bigrams and the first word (phrasing at the
+    start of a message is a strong signal, e.g. "explain ..." vs "what is ...").
+    """
+    words = TOKEN_PATTERN.findall(text.lower())
+    features = [f"w:{w}" for w in words]
+    features += [f"b:{a}_{b}" for a, b in zip(words, words[1:])]
+    if words:
+        features.append(f"first:{words[0]}")
+    # crc32 is stable across processes (unlike hash()), so weights are reproducible
+    return [zlib.crc32(f.encode()) % NUM_BUCKETS for f in features]
+
+
+def load_dataset(path=DEFAULT_DATASET, split=None):
+    """
+    Load labeled routing examples
+
+    Args:
+        path: JSONL file with {"text", "label", "split"} per line
+        split: Only return this split ("train" / "test"), or everything
+
+    Returns:
+        List of (text, label) tuples
+    """
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if split is None or row.get("split") == split:
+                examples.append((row["text"], row["label"]))
+    return examples
+
+
+class IntentRouter:
+    """
+    Rules + hashed n-gram logistic regression over the three agent labels
+    """
+
+    def __init__(self):
+        # bucket -> list of one weight per label (sparse: only seen buckets)
+        self.weights = {}
+        self.bias = [0.0] * len(LABELS)
+
+    @classmethod
+    def from_dataset(cls, path=DEFAULT_DATASET, split="train"):
+        """Create a router trained on the labeled routing dataset"""
+        router = cls()
+        router.train(load_dataset(path, split))
+        return router
+
+    def train(self, examples, epochs=30, learning_rate=0.5, l2=1e-4):
+        """
+        Fit the model with plain SGD (a few hundred examples train in milliseconds)
+
+        Args:
+            examples: List of (text, label) tuples
+            epochs: Passes over the data
+            learning_rate: SGD step size
+            l2: Weight decay, keeps rare n-grams from dominating
+        """
+        rng = random.Random(0)
+        data = [(extract_features(text), LABELS.index(label)) for text, label in examples]
+
+        for _ in range(epochs):
+            rng.shuffle(data)
+            for features, target in data:
+                probs = self._probabilities(features)
+                for k in range(len(LABELS)):
+                    gradient = probs[k] - (1.0 if k == target else 0.0)
+                    self.bias[k] -= learning_rate * gradient
+                    for bucket in features:
+                        row = self.weights.setdefault(bucket, [0.0] * len(LABELS))
+                        row[k] -= learning_rate * (gradient + l2 * row[k])
+
+    def _probabilities(self, features):
+        """Softmax over the label scores"""
+        scores = list(self.bias)
+        for bucket in features:
+            row = self.weights.get(bucket)
+            if row is not None:
+                for k in range(len(LABELS)):
+                    scores[k] += row[k]
+
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def classify(self, text):
+        """
+        Classify a message
+
+        Args:
+            text: The user's message
+
+        Returns:
+            Tuple of (label, confidence, source) where source is "rule" or "model"
+        """
+        lowered = text.lower()
+        matched = {label for pattern, label in RULES if pattern.search(lowered)}
+        if len(matched) == 1:
+            return matched.pop(), 1.0, "rule"
+
+        probs = self._probabilities(extract_features(text))
+        best = max(range(len(LABELS)), key=probs.__getitem__)
+        return LABELS[best], probs[best], "model"
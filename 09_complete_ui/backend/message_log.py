@@ -0,0 +1,183 @@
+"""
+Step 9: Complete UI - Message Log
+
+A compact list of chat messages, for histories kept in memory.
+
+A {"role": ..., "content": ...} dict costs about 180 bytes before its text,
+and every session repeats the same few role strings. Histories also hold
+many copies of the same long text: a cached quiz or explanation is
+re-rendered for every student who asks, and each rendering is a new string.
+MessageLog stores instead:
+- the roles as one byte each (ROLES codes) in a bytearray
+- the contents in a plain list, with long texts shared through a BlobPool:
+  identical texts, from any session, are kept once (reference-counted, so a
+  text is freed when the last message using it is dropped)
+
+Messages become dicts only when read (log[i], log[start:], iteration), which
+is what the SDK needs for the few messages actually sent in a prompt.
+"""
+
+import sys
+
+from tokens import TOKENS_PER_MESSAGE, estimate_tokens
+
+
+ROLES = ("system", "user", "assistant", "tool")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+# Per message in a MessageLog: 1 role byte + 1 list pointer
+MESSAGE_BYTES = 9
+
+
+class BlobPool:
+    """
+    Content-addressed store for long texts shared between messages
+
+    add() returns the one stored copy of a text (adding it if new) and
+    release() gives it back. Texts shorter than min_length aren't pooled:
+    for them the bookkeeping would cost more than it saves.
+    """
+
+    def __init__(self, min_length=256):
+        """
+        Args:
+            min_length: Shortest text worth pooling (characters)
+        """
+        self.min_length = min_length
+        self._blobs = {}  # text -> the stored copy of it
+        self._refs = {}  # text -> messages using it
+        self.bytes = 0  # size of the stored texts
+        self.saved_bytes = 0  # size of the copies not stored
+
+    def __len__(self):
+        return len(self._blobs)
+
+    def pooled(self, text):
+        # None (e.g. a content-filtered reply) is stored as is
+        return text is not None and len(text) >= self.min_length
+
+    def add(self, text):
+        """The shared copy of a text (the text itself if it was new)"""
+        blob = self._blobs.get(text)
+        if blob is None:
+            self._blobs[text] = blob = text
+            self._refs[text] = 1
+            self.bytes += sys.getsizeof(text)
+        else:
+            self._refs[blob] += 1
+            self.saved_bytes += sys.getsizeof(text)
+        return blob
+
+    def release(self, blob):
+        """One message less uses a text; frees it after the last one"""
+        refs = self._refs[blob] - 1
+        if refs:
+            self._refs[blob] = refs
+            self.saved_bytes -= sys.getsizeof(blob)
+        else:
+            del self._refs[blob]
+            del self._blobs[blob]
+            self.bytes -= sys.getsizeof(blob)
+
+    def stats(self):
+        """Counters for monitoring"""
+        return {"blobs": len(self._blobs), "bytes": self.bytes, "saved_bytes": self.saved_bytes}
+
+
+class MessageLog:
+    """
+    Chat messages as columns: role codes and (possibly shared) contents
+
+    `size` is the memory the log itself accounts for: MESSAGE_BYTES per
+    message plus the texts that aren't pooled (pooled ones are counted once,
+    in BlobPool.bytes).
+    """
+
+    __slots__ = ("_roles", "_contents", "pool", "size")
+
+    def __init__(self, pool=None, messages=()):
+        """
+        Args:
+            pool: BlobPool for long texts (None = no sharing)
+            messages: {"role", "content"} dicts to start with
+        """
+        self._roles = bytearray()
+        self._contents = []
+        self.pool = pool
+        self.size = 0
+        self.extend(messages)
+
+    def __len__(self):
+        return len(self._roles)
+
+    def __getitem__(self, index):
+        """One message (or a list of them, for a slice) as SDK-ready dicts"""
+        if isinstance(index, slice):
+            return [
+                {"role": ROLES[code], "content": content}
+                for code, content in zip(self._roles[index], self._contents[index])
+            ]
+        return {"role": ROLES[self._roles[index]], "content": self._contents[index]}
+
+    def __iter__(self):
+        for code, content in zip(self._roles, self._contents):
+            yield {"role": ROLES[code], "content": content}
+
+    def role(self, index):
+        return ROLES[self._roles[index]]
+
+    def content(self, index):
+        return self._contents[index]
+
+    def tokens(self, index):
+        """Estimated tokens of one message (see tokens.py)"""
+        return TOKENS_PER_MESSAGE + estimate_tokens(self._contents[index])
+
+    def total_tokens(self):
+        return sum(TOKENS_PER_MESSAGE + estimate_tokens(content) for content in self._contents)
+
+    def append(self, role, content):
+        """
+        Add one message
+
+        Returns:
+            Bytes added to `size`
+        """
+        if self.pool is not None and self.pool.pooled(content):
+            content = self.pool.add(content)
+            added = MESSAGE_BYTES
+        else:
+            added = MESSAGE_BYTES + sys.getsizeof(content)
+        self._roles.append(ROLE_CODES[role])
+        self._contents.append(content)
+        self.size += added
+        return added
+
+    def extend(self, messages):
+        """Add {"role", "content"} dicts; returns bytes added to `size`"""
+        return sum(self.append(message["role"], message["content"]) for message in messages)
+
+    def drop_front(self, count):
+        """
+        Remove the `count` oldest messages
+
+        Returns:
+            Bytes freed from `size`
+        """
+        freed = 0
+        for content in self._contents[:count]:
+            freed += self._release(content)
+        del self._roles[:count]
+        del self._contents[:count]
+        self.size -= freed
+        return freed
+
+    def clear(self):
+        """Remove every message (returning shared texts to the pool)"""
+        return self.drop_front(len(self._contents))
+
+    def _release(self, content):
+        if self.pool is not None and self.pool.pooled(content):
+            self.pool.release(content)
+            return MESSAGE_BYTES
+        return MESSAGE_BYTES + sys.getsizeof(content)
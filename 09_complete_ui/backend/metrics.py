@@ -0,0 +1,274 @@
+"""
+Step 9: Complete UI - Metrics
+
+Counters and latency histograms for the backend, served by GET /metrics in
+the Prometheus text format (so Prometheus, Grafana Agent or a plain curl
+can read them).
+
+Step 1 printed timing and token usage for a single call; the backend used
+to record nothing, so nobody could tell whether a slow answer was spent
+routing, waiting for GPT-4 or streaming. Now we record:
+- how long routing takes, locally or via GPT-4
+- how long each agent takes, and how often it fails
+- time to first token for streamed answers
+- tokens per upstream call
+- every HTTP request by endpoint and status
+
+There is no dependency on prometheus_client: the few metric types we need
+are small enough to keep here. Values are per process; with several
+uvicorn workers, scrape each one (or add a worker label in Prometheus).
+"""
+
+import asyncio
+import functools
+import inspect
+import math
+import threading
+import time
+
+
+# Latency buckets (seconds): local routing is sub-millisecond, GPT-4 calls take seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000)
+
+
+def _escape(value):
+    """Escape a label value (backslash, double quote and newline)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A value that only goes up, one per combination of label values"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Observations sorted into cumulative buckets, plus their count and sum"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_count{labels} {values[-2]}"
+            yield f"{self.name}_sum{labels} {_format_value(round(values[-1], 6))}"
+
+
+class Registry:
+    """All metrics of this process, rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """The Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette adds the charset
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "aita_http_requests", "HTTP requests by endpoint and status", ("method", "path", "status"))
+HTTP_DURATION = REGISTRY.histogram(
+    "aita_http_request_duration_seconds", "Time until the response headers were ready",
+    ("method", "path"))
+ROUTE_DURATION = REGISTRY.histogram(
+    "aita_route_duration_seconds", "Time spent choosing an agent", ("method",))
+ROUTE_DECISIONS = REGISTRY.counter(
+    "aita_route_decisions", "Routing decisions by method (local/llm) and agent", ("method", "agent"))
+AGENT_DURATION = REGISTRY.histogram(
+    "aita_agent_duration_seconds", "Time an agent method took (cache hits included)",
+    ("agent", "method"))
+AGENT_CALLS = REGISTRY.counter(
+    "aita_agent_calls", "Agent method calls by outcome (ok, error, cancelled)",
+    ("agent", "method", "outcome"))
+TTFT = REGISTRY.histogram(
+    "aita_time_to_first_token_seconds", "Time from starting a stream to its first token", ("agent",))
+TOKENS = REGISTRY.counter(
+    "aita_tokens", "Tokens reported by the upstream", ("agent", "kind"))
+TOKENS_PER_CALL = REGISTRY.histogram(
+    "aita_tokens_per_call", "Total tokens per upstream call", ("agent",), TOKEN_BUCKETS)
+
+
+def record_usage(agent, usage):
+    """
+    Count the tokens of one upstream call
+
+    Args:
+        agent: Who made the call (chat, quiz, explanation, router, summary)
+        usage: The response's `usage` (SDK object or dict), may be None
+    """
+    if usage is None:
+        return
+    if isinstance(usage, dict):
+        prompt, completion = usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    else:
+        prompt, completion = usage.prompt_tokens or 0, usage.completion_tokens or 0
+    TOKENS.inc(prompt, agent=agent, kind="prompt")
+    TOKENS.inc(completion, agent=agent, kind="completion")
+    TOKENS_PER_CALL.observe(prompt + completion, agent=agent)
+
+
+def _outcome(error):
+    if error is None:
+        return "ok"
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    return "error"
+
+
+def instrument_agent(agent):
+    """
+    Decorator that times an agent method and counts its outcomes
+
+    Works for plain methods, coroutines and async generators (streams).
+    For streams it also records the time to the first ("token", ...) event.
+    """
+    def decorator(function):
+        method = function.__name__
+
+        def finish(start, error):
+            AGENT_DURATION.observe(time.perf_counter() - start, agent=agent, method=method)
+            AGENT_CALLS.inc(agent=agent, method=method, outcome=_outcome(error))
+
+        if inspect.isasyncgenfunction(function):
+            @functools.wraps(function)
+            async def stream_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                first_token = True
+                error = None
+                try:
+                    async for event, data in function(*args, **kwargs):
+                        if event == "token" and first_token:
+                            first_token = False
+                            TTFT.observe(time.perf_counter() - start, agent=agent)
+                        yield event, data
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    finish(start, error)
+            return stream_wrapper
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                error = None
+                try:
+                    return await function(*args, **kwargs)
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    finish(start, error)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = None
+            try:
+                return function(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                finish(start, error)
+        return wrapper
+
+    return decorator
+
+
+def server_timing(timing):
+    """
+    Format a Server-Timing header value, e.g. "route;dur=0.4, agent;dur=812.3"
+
+    Args:
+        timing: Dict of stage name -> milliseconds (keys ending in _ms are shortened)
+    """
+    return ", ".join(
+        f"{name[:-3] if name.endswith('_ms') else name};dur={ms}"
+        for name, ms in timing.items()
+        if ms is not None
+    )
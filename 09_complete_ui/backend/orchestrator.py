@@ -2,10 +2,17 @@
 Step 9: Complete UI - Orchestrator
 
 This is a copy of the Orchestrator for Step 9 to keep this folder self-contained.
+
+The FastAPI backend uses the async methods (aroute_request, aprocess_request)
+so a slow completion never stalls other requests; the sync methods remain
+for scripts and the CLI steps.
 """
 
 import sys
 import os
+import time
+import asyncio
+import uuid
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -13,15 +20,56 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from chat_agent import ChatAgent
 from quiz_agent import QuizAgent
 from explanation_agent import ExplanationAgent
+from history_window import HistoryWindow
+from intent_router import IntentRouter
+from response_cache import ResponseCache, wants_fresh
+from question_bank import QuestionBank
+from quiz_model import QUIZ_SIZE_PATTERN, Quiz
+from tokens import estimate_tokens, estimate_messages_tokens
+from metrics import ROUTE_DURATION, ROUTE_DECISIONS, record_usage
 
-from openai import AzureOpenAI
+from client_provider import get_client, get_async_client
 from config import (
-    AZURE_OPENAI_ENDPOINT,
-    AZURE_OPENAI_API_KEY,
-    AZURE_OPENAI_API_VERSION,
-    GPT4_DEPLOYMENT_NAME
+    GPT4_DEPLOYMENT_NAME,
+    HISTORY_TOKEN_BUDGET,
+    HISTORY_SUMMARY_MAX_TOKENS,
+    ROUTER_LOCAL_MODEL,
+    ROUTER_CONFIDENCE_THRESHOLD,
+    SPECULATIVE_ROUTING,
+    RESPONSE_CACHE_AGENTS,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL_SECONDS,
+    QUESTION_BANK_PATH,
+    QUESTION_BANK_MIN_QUESTIONS,
+    QUIZ_DEFAULT_QUESTIONS,
+    QUIZ_MAX_QUESTIONS
 )
 
+def quiz_size(user_message):
+    """Number of questions the student asked for (QUIZ_DEFAULT_QUESTIONS if none)"""
+    match = QUIZ_SIZE_PATTERN.search(user_message)
+    if match is None:
+        return QUIZ_DEFAULT_QUESTIONS
+    return max(1, min(int(match.group(1)), QUIZ_MAX_QUESTIONS))
+
+
+class Speculation:
+    """An agent call started before GPT-4 finished routing"""
+    
+    __slots__ = ("agent_name", "messages", "history", "task", "started", "finished")
+    
+    def __init__(self, agent_name, messages, history, coroutine):
+        self.agent_name = agent_name
+        self.messages = messages  # prompt, for estimating wasted tokens
+        self.history = history  # history stats when the guess was chat
+        self.started = time.perf_counter()
+        self.finished = None
+        self.task = asyncio.create_task(coroutine)
+        self.task.add_done_callback(self._mark_finished)
+    
+    def _mark_finished(self, task):
+        self.finished = time.perf_counter()
+
 
 class Orchestrator:
     """
@@ -36,31 +84,128 @@ class Orchestrator:
     Think of it as a traffic controller for AI agents!
     """
     
-    def __init__(self):
-        """Initialize the orchestrator and all agents"""
-        # Create all specialized agents
+    def __init__(self, session_store=None, speculative=SPECULATIVE_ROUTING):
+        """
+        Initialize the orchestrator and all agents
+        
+        Args:
+            session_store: Optional SessionStore. When given, chat history is
+                kept per session_id instead of in the ChatAgent itself, and
+                only a token-budgeted window of it is sent with each prompt.
+            speculative: When routing needs GPT-4, start the most likely agent
+                at the same time (async path only, see _start_speculation)
+        """
+        # Create all specialized agents (quiz/explanation answers can be
+        # cached, see RESPONSE_CACHE_AGENTS in config.py; with a question
+        # bank, quizzes come from the bank instead of the cache)
         self.chat_agent = ChatAgent()
-        self.quiz_agent = QuizAgent()
-        self.explanation_agent = ExplanationAgent()
-        
-        # Client for routing decisions
-        self.client = AzureOpenAI(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=AZURE_OPENAI_API_VERSION,
+        bank = QuestionBank(QUESTION_BANK_PATH, QUESTION_BANK_MIN_QUESTIONS) if QUESTION_BANK_PATH else None
+        self.quiz_agent = QuizAgent(cache=None if bank else self._make_cache("quiz"), bank=bank)
+        self.explanation_agent = ExplanationAgent(cache=self._make_cache("explanation"))
+        
+        # Client for routing decisions (the same pooled client the agents use,
+        # so the routing call and the agent call share connections)
+        self.client = get_client()
+        self.async_client = get_async_client()
+        
+        # Local classifier that handles most routing without calling GPT-4
+        self.intent_router = IntentRouter.from_dataset()
+        self.routing_stats = {"local": 0, "llm": 0}
+        
+        self.speculative = speculative
+        self.speculation_stats = {
+            "attempts": 0,
+            "hits": 0,
+            "misses": 0,
+            "latency_saved_ms": 0.0,
+            "tokens_wasted": 0,
+        }
+        
+        self.session_store = session_store
+        self.history_window = None
+        if session_store is not None:
+            self.history_window = HistoryWindow(
+                session_store,
+                self.async_client,
+                token_budget=HISTORY_TOKEN_BUDGET,
+                summary_max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+            )
+    
+    def _make_cache(self, agent_name):
+        """Create a response cache if this agent opted in, else None"""
+        if agent_name not in RESPONSE_CACHE_AGENTS:
+            return None
+        return ResponseCache(
+            max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
         )
     
-    def route_request(self, user_message):
+    def stats(self):
+        """Routing, cache, question bank, quiz generation, coalescing, upstream, rate limit and session counters"""
+        caches = {}
+        coalescing = {}
+        for name, agent in (("quiz", self.quiz_agent), ("explanation", self.explanation_agent)):
+            if agent.cache is not None:
+                caches[name] = agent.cache.stats()
+            coalescing[name] = agent.in_flight.stats()
+        
+        return {
+            "routing": dict(self.routing_stats),
+            "caches": caches,
+            "question_bank": self.quiz_agent.bank.stats() if self.quiz_agent.bank else None,
+            "quiz_generation": dict(self.quiz_agent.generation_stats),
+            "coalescing": coalescing,
+            "speculation": dict(self.speculation_stats),
+            "upstream": self.async_client.resilience.stats(),
+            "rate_limit": self.async_client.limiter.stats() if self.async_client.limiter else None,
+            "sessions": self.session_store.stats() if self.session_store is not None else None,
+        }
+    
+    def _chat_history(self, session_id, stats=None):
         """
-        Determine which agent should handle the request
+        Get the chat history to send for a session
         
-        Args:
-            user_message: The user's request
+        Returns None (use the ChatAgent's own history) when sessions are not
+        in use, e.g. in the CLI steps. Otherwise returns the running summary
+        plus the most recent messages, and puts the token savings in stats.
+        """
+        if self.session_store is None or session_id is None:
+            return None
         
-        Returns:
-            Agent name to use
+        history, history_stats = self.history_window.window(session_id)
+        if stats is not None:
+            stats["history"] = history_stats
+        return history
+    
+    async def _aload_session(self, session_id):
+        """Read a stored session in a thread before it is used (if sessions are in use)"""
+        if self.session_store is not None and session_id is not None:
+            await self.session_store.aload(session_id)
+    
+    def _record_chat_turn(self, session_id, user_message, response, summarize=False):
         """
-        # Use AI to determine routing
+        Store a chat exchange in the session (if sessions are in use)
+        
+        With summarize=True (async callers only) older messages are folded
+        into the running summary in the background.
+        """
+        if self.session_store is not None and session_id is not None:
+            self.session_store.add_turn(session_id, user_message, response)
+            if summarize:
+                self.history_window.maybe_summarize(session_id)
+    
+    def _remember_agent(self, session_id, agent_name):
+        """Store the session's latest agent (the guess for speculative routing)"""
+        if self.session_store is not None and session_id is not None:
+            self.session_store.set_last_agent(session_id, self._normalize_agent(agent_name))
+    
+    @staticmethod
+    def _normalize_agent(agent_name):
+        """The agent that actually runs for a routing answer (anything else is chat)"""
+        return agent_name if agent_name in ("quiz", "explanation") else "chat"
+    
+    def _routing_messages(self, user_message):
+        """Build the routing prompt for a user request"""
         routing_prompt = f"""Given this user request, which agent should handle it?
 
 User request: "{user_message}"
@@ -71,23 +216,71 @@ Available agents:
 - explanation: Detailed explanations of concepts
 
 Respond with ONLY the agent name (chat, quiz, or explanation)."""
-
+        return [{"role": "user", "content": routing_prompt}]
+    
+    def _observe_route(self, method, agent_name, started, stats=None):
+        """Record how long routing took (locally or via GPT-4) and what it decided"""
+        elapsed = time.perf_counter() - started
+        ROUTE_DURATION.observe(elapsed, method=method)
+        ROUTE_DECISIONS.inc(method=method, agent=self._normalize_agent(agent_name))
+        if stats is not None:
+            stats.setdefault("timing", {})["route_ms"] = round(elapsed * 1000, 1)
+    
+    def _route_locally(self, user_message):
+        """
+        Try the local intent router first
+        
+        Rules always decide; the model only with ROUTER_LOCAL_MODEL.
+        
+        Returns:
+            Agent name, or None if GPT-4 has to decide
+        """
+        agent_name, confidence, source = self.intent_router.classify(user_message)
+        if (source == "rule" or ROUTER_LOCAL_MODEL) and confidence >= ROUTER_CONFIDENCE_THRESHOLD:
+            self.routing_stats["local"] += 1
+            return agent_name
+        
+        self.routing_stats["llm"] += 1
+        return None
+    
+    def route_request(self, user_message):
+        """
+        Determine which agent should handle the request
+        
+        Args:
+            user_message: The user's request
+        
+        Returns:
+            Agent name to use
+        """
+        started = time.perf_counter()
+        agent_name = self._route_locally(user_message)
+        if agent_name is not None:
+            self._observe_route("local", agent_name, started)
+            return agent_name
+        
+        # Not sure locally - use AI to determine routing
         response = self.client.chat.completions.create(
             model=GPT4_DEPLOYMENT_NAME,
-            messages=[{"role": "user", "content": routing_prompt}],
+            messages=self._routing_messages(user_message),
             temperature=0.3,
             max_tokens=10
         )
         
+        record_usage("router", response.usage)
         agent_name = response.choices[0].message.content.strip().lower()
+        self._observe_route("llm", agent_name, started)
         return agent_name
     
-    def process_request(self, user_message):
+    def process_request(self, user_message, session_id=None, stats=None, fresh=False):
         """
         Process a user request by routing to the appropriate agent
         
         Args:
             user_message: The user's request
+            session_id: Which student's conversation this belongs to
+            stats: Optional dict that gets filled with request details
+            fresh: Don't answer from the response cache
         
         Returns:
             Tuple of (response, agent_name)
@@ -95,14 +288,349 @@ Respond with ONLY the agent name (chat, quiz, or explanation)."""
         # Determine which agent to use
         agent_name = self.route_request(user_message)
         
+        # "Give me a different quiz" etc. should never come from the cache
+        fresh = fresh or wants_fresh(user_message)
+        
         # Route to the appropriate agent
         if agent_name == "quiz":
             # Extract topic from message (simplified)
-            response = self.quiz_agent.generate_quiz(user_message, 3)
+            response = self.quiz_agent.generate_quiz(
+                user_message, quiz_size(user_message), fresh=fresh, student=session_id
+            )
         elif agent_name == "explanation":
-            response = self.explanation_agent.explain(user_message)
+            response = self.explanation_agent.explain(user_message, fresh=fresh)
         else:  # Default to chat
-            response = self.chat_agent.chat(user_message)
+            history = self._chat_history(session_id, stats)
+            response = self.chat_agent.chat(user_message, history=history)
+            self._record_chat_turn(session_id, user_message, response)
+        
+        self._remember_agent(session_id, agent_name)
+        return response, agent_name
+    
+    async def aroute_request(self, user_message):
+        """
+        Async version of route_request
+        
+        Args:
+            user_message: The user's request
+        
+        Returns:
+            Agent name to use
+        """
+        started = time.perf_counter()
+        agent_name = self._route_locally(user_message)
+        if agent_name is not None:
+            self._observe_route("local", agent_name, started)
+            return agent_name
+        
+        agent_name = await self._allm_route(user_message)
+        self._observe_route("llm", agent_name, started)
+        return agent_name
+    
+    async def _allm_route(self, user_message):
+        """Ask GPT-4 which agent should handle the request"""
+        response = await self.async_client.chat.completions.create(
+            model=GPT4_DEPLOYMENT_NAME,
+            messages=self._routing_messages(user_message),
+            temperature=0.3,
+            max_tokens=10
+        )
+        
+        record_usage("router", response.usage)
+        agent_name = response.choices[0].message.content.strip().lower()
+        return agent_name
+    
+    def _agent_call(self, agent_name, user_message, history, fresh, session_id=None, speculative=False):
+        """
+        Start one agent call (chat turns are recorded by the caller)
+        
+        Args:
+            speculative: The call is a guess that may be discarded. A quiz
+                is then returned as a Quiz; it leaves out questions the
+                student has seen, but its own questions aren't marked as seen
+                (_finish_speculation does that if it is used).
+        
+        Returns:
+            Tuple of (prompt messages, coroutine returning the response)
+        """
+        if agent_name == "quiz":
+            num_questions = quiz_size(user_message)
+            messages = self.quiz_agent._build_messages(user_message, num_questions)
+            if speculative:
+                return messages, self.quiz_agent.acreate_quiz(
+                    user_message, num_questions, fresh=fresh, student=session_id, hand_out=False
+                )
+            return messages, self.quiz_agent.agenerate_quiz(
+                user_message, num_questions, fresh=fresh, student=session_id
+            )
+        if agent_name == "explanation":
+            messages = self.explanation_agent._build_messages(user_message)
+            return messages, self.explanation_agent.aexplain(user_message, fresh=fresh)
+        
+        messages = self.chat_agent._prepare_messages(user_message, history) if history is not None else None
+        return messages, self.chat_agent.achat(user_message, history=history)
+    
+    def _start_speculation(self, user_message, session_id, fresh):
+        """
+        Start the most likely agent before GPT-4 has decided
+        
+        The guess is the agent that answered the session's previous request,
+        or else the local router's best (low-confidence) label.
+        
+        Returns:
+            A running Speculation, or None when there is nothing safe to start
+        """
+        guess = None
+        if self.session_store is not None and session_id is not None:
+            session = self.session_store.get(session_id)
+            if session is not None:
+                guess = session.last_agent
+        if guess is None:
+            guess, _, _ = self.intent_router.classify(user_message)
+        
+        history_stats = {}
+        history = self._chat_history(session_id, history_stats) if guess == "chat" else None
+        if guess == "chat" and history is None:
+            # Without sessions the ChatAgent keeps its own history, which a
+            # discarded guess would corrupt
+            return None
+        
+        messages, coroutine = self._agent_call(guess, user_message, history, fresh, session_id, speculative=True)
+        return Speculation(guess, messages, history_stats.get("history"), coroutine)
+    
+    async def _finish_speculation(self, speculation, agent_name, session_id=None, stats=None):
+        """
+        Use or discard a speculative call once routing has decided
+        
+        A right guess saves the overlap between routing and the agent call;
+        a quiz's questions are only then marked as seen by the student.
+        A wrong guess is cancelled, upstream call included (unless an
+        identical request shares it, see single_flight.py), or its answer
+        dropped; its prompt, plus the answer if it had already finished,
+        counts as wasted tokens.
+        
+        Returns:
+            The response, or None if the guess was wrong
+        """
+        route_done = time.perf_counter()
+        totals = self.speculation_stats
+        totals["attempts"] += 1
+        task = speculation.task
+        
+        if speculation.agent_name == self._normalize_agent(agent_name):
+            finished = speculation.finished or route_done
+            response = await task
+            if isinstance(response, Quiz):
+                await self.quiz_agent._ahand_out(response, session_id)
+                response = response.render()
+            saved_ms = (min(finished, route_done) - speculation.started) * 1000
+            totals["hits"] += 1
+            totals["latency_saved_ms"] = round(totals["latency_saved_ms"] + saved_ms, 1)
+            if stats is not None:
+                if speculation.history is not None:
+                    stats["history"] = speculation.history
+                stats["speculation"] = {"guess": speculation.agent_name, "hit": True,
+                                        "latency_saved_ms": round(saved_ms, 1), "tokens_wasted": 0}
+            return response
+        
+        wasted = estimate_messages_tokens(speculation.messages)
+        if task.done() and not task.cancelled():
+            if task.exception() is None:
+                result = task.result()
+                wasted += estimate_tokens(result.render() if isinstance(result, Quiz) else result)
+        else:
+            task.cancel()
+        totals["misses"] += 1
+        totals["tokens_wasted"] += wasted
+        if stats is not None:
+            stats["speculation"] = {"guess": speculation.agent_name, "hit": False,
+                                    "latency_saved_ms": 0.0, "tokens_wasted": wasted}
+        return None
+    
+    async def aprocess_request(self, user_message, session_id=None, stats=None, fresh=False):
+        """
+        Async version of process_request
+        
+        In speculative mode, requests that need GPT-4 routing start the most
+        likely agent at the same time (see _start_speculation).
+        
+        Args:
+            user_message: The user's request
+            session_id: Which student's conversation this belongs to
+            stats: Optional dict that gets filled with request details
+                (including "timing": route_ms and agent_ms)
+            fresh: Don't answer from the response cache
+        
+        Returns:
+            Tuple of (response, agent_name)
+        """
+        fresh = fresh or wants_fresh(user_message)
+        await self._aload_session(session_id)
+        
+        started = time.perf_counter()
+        agent_name = self._route_locally(user_message)
+        speculation = None
+        if agent_name is None:
+            if self.speculative:
+                speculation = self._start_speculation(user_message, session_id, fresh)
+            try:
+                agent_name = await self._allm_route(user_message)
+            except BaseException:
+                if speculation is not None:
+                    speculation.task.cancel()
+                raise
+            self._observe_route("llm", agent_name, started, stats)
+        else:
+            self._observe_route("local", agent_name, started, stats)
+        
+        agent_started = time.perf_counter()
+        response = None
+        if speculation is not None:
+            response = await self._finish_speculation(speculation, agent_name, session_id, stats)
+        
+        if response is None:
+            history = None
+            if self._normalize_agent(agent_name) == "chat":
+                history = self._chat_history(session_id, stats)
+            _, coroutine = self._agent_call(agent_name, user_message, history, fresh, session_id)
+            response = await coroutine
+        
+        if stats is not None:
+            # After a speculative hit this is only the wait left once routing was done
+            stats.setdefault("timing", {})["agent_ms"] = round((time.perf_counter() - agent_started) * 1000, 1)
+        
+        if self._normalize_agent(agent_name) == "chat":
+            self._record_chat_turn(session_id, user_message, response, summarize=True)
+        self._remember_agent(session_id, agent_name)
         
         return response, agent_name
+    
+    async def aprocess_batch(self, items, concurrency=8, timeout=None):
+        """
+        Process many requests, a limited number at a time
+        
+        Every item goes through aprocess_request, exactly like /api/chat.
+        Items without a session_id get a throwaway session, so chat items
+        don't share (or keep) any history.
+        
+        Args:
+            items: List of dicts with "message" and optional "id",
+                "session_id" and "fresh"
+            concurrency: Requests in flight at once
+            timeout: Seconds allowed per item (None for no limit)
+        
+        Yields:
+            One result dict per item, in completion order: index, id,
+            status ("ok" or "error"), agent + response or error, elapsed_ms
+        """
+        results = asyncio.Queue()
+        pending = iter(enumerate(items))
+        
+        async def worker():
+            # Workers share one iterator, so each item is taken exactly once
+            for index, item in pending:
+                results.put_nowait(await self._abatch_item(index, item, timeout))
+        
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(items))))]
+        try:
+            for _ in range(len(items)):
+                yield await results.get()
+        finally:
+            # Also runs when the client goes away mid-batch
+            for task in workers:
+                task.cancel()
+    
+    async def _abatch_item(self, index, item, timeout):
+        """Run one batch item; failures become an error result, not an exception"""
+        start_time = time.perf_counter()
+        result = {"index": index, "id": item.get("id")}
+        
+        session_id = item.get("session_id")
+        throwaway = session_id is None and self.session_store is not None
+        if throwaway:
+            session_id = f"batch-{uuid.uuid4().hex}"
+        
+        try:
+            message = item.get("message") or ""
+            if not message.strip():
+                raise ValueError("Message cannot be empty")
+            response, agent_name = await asyncio.wait_for(
+                self.aprocess_request(message, session_id, fresh=item.get("fresh", False)),
+                timeout,
+            )
+            result.update(status="ok", agent=agent_name, response=response)
+        except asyncio.TimeoutError:
+            result.update(status="error", error=f"Timed out after {timeout}s")
+        except Exception as e:
+            result.update(status="error", error=str(e))
+        finally:
+            if throwaway:
+                self.session_store.clear(session_id)
+        
+        result["elapsed_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+        return result
+    
+    async def astream_request(self, user_message, session_id=None, fresh=False):
+        """
+        Process a user request, streaming the agent's answer
+        
+        Routing itself is not streamed (it is only one word), but as soon as
+        the agent is chosen the caller learns which one it is.
+        
+        Args:
+            user_message: The user's request
+            session_id: Which student's conversation this belongs to
+            fresh: Don't answer from the response cache
+        
+        Yields:
+            ("agent", {...}) once routing is done, then
+            ("token", {...}) for every text delta, then
+            ("done", {...}) with token usage, history savings and timing
+        """
+        start_time = time.perf_counter()
+        
+        await self._aload_session(session_id)
+        agent_name = await self.aroute_request(user_message)
+        route_time = time.perf_counter()
+        yield "agent", {"agent": agent_name}
+        
+        fresh = fresh or wants_fresh(user_message)
+        stats = {}
+        if agent_name == "quiz":
+            events = self.quiz_agent.astream_quiz(
+                user_message, quiz_size(user_message), fresh=fresh, student=session_id
+            )
+        elif agent_name == "explanation":
+            events = self.explanation_agent.astream_explain(user_message, fresh=fresh)
+        else:  # Default to chat
+            history = self._chat_history(session_id, stats)
+            events = self.chat_agent.astream_chat(user_message, history=history)
+        
+        first_token_time = None
+        usage = None
+        parts = []
+        async for event, data in events:
+            if event == "token":
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                parts.append(data)
+                yield "token", {"content": data}
+            elif event == "usage":
+                usage = data
+        
+        if agent_name not in ("quiz", "explanation"):
+            self._record_chat_turn(session_id, user_message, "".join(parts), summarize=True)
+        self._remember_agent(session_id, agent_name)
+        
+        end_time = time.perf_counter()
+        yield "done", {
+            "agent": agent_name,
+            "usage": usage,
+            "history": stats.get("history"),
+            "timing": {
+                "route_ms": round((route_time - start_time) * 1000, 1),
+                "ttft_ms": round(((first_token_time or end_time) - start_time) * 1000, 1),
+                "total_ms": round((end_time - start_time) * 1000, 1),
+            },
+        }
 
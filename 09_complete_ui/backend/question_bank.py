@@ -0,0 +1,228 @@
+"""
+Step 9: Complete UI - Question Bank
+
+Every quiz question GPT-4 writes is kept in a SQLite file, so later quizzes
+on the same topic can be put together without calling GPT-4 at all.
+
+Without it, a generated quiz was shown once (or cached for an hour as one
+fixed quiz) and thrown away; the next student asking for "a quiz on Python
+basics" waited for a whole new generation. The bank:
+- stores questions under their topic (bank_topic(): "Quiz me on Python
+  basics!", "a 5-question quiz on python basics" and "python basics with
+  10 questions" are all "python basics")
+- skips duplicates: a question is identified by a hash of its text and
+  options, so the same question written twice is stored once
+- remembers which questions each student (session) has been given
+- answers a quiz request by sampling questions the student hasn't seen,
+  once the topic holds at least `min_questions` of them
+
+When a topic is thin, or a student has seen most of it, the quiz agent
+calls GPT-4 and the new questions top the bank up.
+
+The file uses WAL mode, so several uvicorn workers can share one bank.
+Every call reads or writes the file: async code runs them in a thread
+(asyncio.to_thread), as a busy file can take up to `timeout` seconds.
+bulk_quiz.py --bank fills it ahead of time for a whole syllabus.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from quiz_model import QUIZ_SIZE_PATTERN, Question, Quiz
+from response_cache import normalize_topic
+
+
+def bank_topic(text):
+    """
+    The topic a request's questions are stored under
+
+    The quiz size is dropped before normalizing: a 5- and a 10-question quiz
+    on the same subject draw from the same questions.
+    """
+    return normalize_topic(QUIZ_SIZE_PATTERN.sub(" ", text))
+
+
+def question_hash(question):
+    """Content hash of a question: its text and options, case and spacing ignored"""
+    def clean(text):
+        return " ".join(text.lower().split())
+
+    content = "|".join([clean(question.text)] + sorted(clean(option) for option in question.options))
+    return hashlib.sha1(content.encode()).hexdigest()[:16]
+
+
+class QuestionBank:
+    """Quiz questions by topic, plus which ones each student has seen"""
+
+    def __init__(self, path, min_questions=10, timeout=5.0):
+        """
+        Args:
+            path: SQLite file (created if missing)
+            min_questions: Questions a topic needs before quizzes are drawn from it
+            timeout: Seconds to wait for another process's write lock
+        """
+        self.path = path
+        self.min_questions = min_questions
+        self.timeout = timeout
+        self._local = threading.local()  # sqlite3 connections are per thread
+
+        self.served = 0  # quizzes drawn from the bank
+        self.thin = 0  # requests the bank couldn't answer
+        self.added = 0  # new questions stored
+        self.duplicates = 0  # questions that were already there
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS questions ("
+                "id INTEGER PRIMARY KEY, topic TEXT NOT NULL, hash TEXT NOT NULL, "
+                "data TEXT NOT NULL, created REAL NOT NULL, UNIQUE (topic, hash))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS seen ("
+                "student TEXT NOT NULL, hash TEXT NOT NULL, seen REAL NOT NULL, "
+                "PRIMARY KEY (student, hash)) WITHOUT ROWID"
+            )
+            self._local.connection = connection
+        return connection
+
+    def add(self, topic, questions):
+        """
+        Store questions under a topic, skipping ones already in it
+
+        Args:
+            topic: The request text or topic (see bank_topic())
+            questions: Question objects (e.g. a Quiz)
+
+        Returns:
+            Number of questions that were new
+        """
+        now = time.time()
+        rows = [
+            (bank_topic(topic), question_hash(question),
+             json.dumps(question.to_dict(), separators=(",", ":"), ensure_ascii=False), now)
+            for question in questions
+        ]
+        connection = self._connection()
+        before = connection.total_changes
+        with connection:
+            # Autocommit connection: without BEGIN every row would be its own commit
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT OR IGNORE INTO questions (topic, hash, data, created) VALUES (?, ?, ?, ?)", rows
+            )
+        added = connection.total_changes - before
+        self.added += added
+        self.duplicates += len(rows) - added
+        return added
+
+    def mark_seen(self, student, questions):
+        """Remember that a student has been given these questions"""
+        if student is None:
+            return
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT OR REPLACE INTO seen (student, hash, seen) VALUES (?, ?, ?)",
+                [(student, question_hash(question), now) for question in questions],
+            )
+
+    def size(self, topic):
+        """Number of questions stored for a topic"""
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM questions WHERE topic = ?", (bank_topic(topic),)
+        ).fetchone()
+        return row[0]
+
+    def draw(self, topic, count, student=None, mark=True):
+        """
+        Put a quiz together from stored questions
+
+        Args:
+            topic: The request text or topic (see bank_topic())
+            count: Questions wanted
+            student: Session id; questions it has seen are left out, and the
+                drawn ones are marked as seen
+            mark: False leaves marking to the caller (mark_seen()), e.g. for
+                a quiz that may never be shown
+
+        Returns:
+            Quiz in random order, or None when the topic holds fewer than
+            min_questions or fewer than `count` the student hasn't seen
+        """
+        key = bank_topic(topic)
+        connection = self._connection()
+        size = connection.execute("SELECT COUNT(*) FROM questions WHERE topic = ?", (key,)).fetchone()[0]
+        if size < max(self.min_questions, count):
+            self.thin += 1
+            return None
+
+        rows = connection.execute(
+            "SELECT data FROM questions WHERE topic = ? AND hash NOT IN "
+            "(SELECT hash FROM seen WHERE student = ?) ORDER BY random() LIMIT ?",
+            (key, student, count),
+        ).fetchall()
+        if len(rows) < count:
+            self.thin += 1
+            return None
+
+        quiz = Quiz(key, [Question.from_dict(json.loads(data)) for data, in rows])
+        if mark:
+            self.mark_seen(student, quiz)
+        self.served += 1
+        return quiz
+
+    def stats(self):
+        """Bank size plus this process's counters (for monitoring)"""
+        topics, questions = self._connection().execute(
+            "SELECT COUNT(DISTINCT topic), COUNT(*) FROM questions"
+        ).fetchone()
+        requests = self.served + self.thin
+        return {
+            "topics": topics,
+            "questions": questions,
+            "served": self.served,
+            "thin": self.thin,
+            "added": self.added,
+            "duplicates": self.duplicates,
+            "hit_rate": round(self.served / requests, 3) if requests else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    # Quick check: differently worded and sized requests share one topic
+    import os
+    import shutil
+    import tempfile
+
+    requests = [
+        "Give me a 5-question quiz on Python basics",
+        "quiz on python basics with 10 questions",
+        "Quiz me on Python basics!",
+        "3 MCQs about python basics",
+    ]
+    topics = {request: bank_topic(request) for request in requests}
+    for request, topic in topics.items():
+        print(f"  {request!r} -> {topic!r}")
+    assert len(set(topics.values())) == 1, topics
+
+    folder = tempfile.mkdtemp(prefix="question-bank-")
+    try:
+        bank = QuestionBank(os.path.join(folder, "bank.sqlite"), min_questions=5)
+        bank.add(requests[1], [
+            Question(f"Question {i} about Python?", ["A", "B", "C", "D"], i % 4) for i in range(10)
+        ])
+        quiz = bank.draw(requests[0], 5, student="student-1")
+        assert quiz is not None and len(quiz) == 5
+        assert bank.draw(requests[2], 5, student="student-1") is not None  # the other 5
+        assert bank.draw(requests[3], 3, student="student-1") is None  # all 10 seen
+        print(f"✅ One topic for all {len(requests)} requests: {bank.stats()}")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
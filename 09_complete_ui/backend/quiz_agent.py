@@ -2,20 +2,66 @@
 Step 9: Complete UI - Quiz Agent
 
 This is a copy of the QuizAgent for Step 9 to keep this folder self-contained.
+
+generate_quiz has an async twin (agenerate_quiz) for the FastAPI backend.
+
+GPT-4 answers in JSON matching the quiz schema (see quiz_model.py), which
+is parsed once into a Quiz: create_quiz()/acreate_quiz() return it (with
+the correct answers, ready for grading), generate_quiz()/agenerate_quiz()
+render it as text for /api/chat, and astream_quiz() streams it question by
+question. The response cache keeps Quiz objects, not text.
+
+With a QuestionBank (question_bank.py), every generated question is stored
+and quizzes are drawn from the bank - skipping questions the student has
+seen - whenever the topic holds enough; GPT-4 only tops up thin topics.
+
+Long quizzes are slow because the answer is long: a 15-question quiz is
+one completion of thousands of tokens. The async methods split a quiz of
+more than `chunk_size` questions into chunks, each with its own focus
+(definitions, concepts, examples, ...), generate them concurrently and
+merge them, dropping near-duplicate questions. If some chunks fail, the
+questions from the others are still returned.
 """
 
 import sys
 import os
+import asyncio
+import math
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from openai import AzureOpenAI
-from config import (
-    AZURE_OPENAI_ENDPOINT,
-    AZURE_OPENAI_API_KEY,
-    AZURE_OPENAI_API_VERSION,
-    GPT4_DEPLOYMENT_NAME
-)
+from config import GPT4_DEPLOYMENT_NAME, QUIZ_CHUNK_SIZE
+from client_provider import get_client, get_async_client
+from streaming import stream_completion
+from response_cache import make_cache_key
+from single_flight import SingleFlight
+from metrics import instrument_agent, record_usage
+from quiz_model import RESPONSE_FORMAT, Quiz, QuestionStream, QuizFormatError, UniqueQuestions
+
+
+# What each chunk of a split quiz concentrates on, so the chunks don't
+# all write the same easy questions
+CHUNK_FOCUS = [
+    "basic definitions and facts",
+    "understanding of the key concepts",
+    "applying the ideas to concrete examples",
+    "common mistakes and misconceptions",
+    "harder questions that combine several ideas",
+]
+
+
+def split_quiz(num_questions, chunk_size):
+    """
+    Sizes of the sub-requests for a quiz, as even as possible
+
+    split_quiz(12, 5) -> [4, 4, 4]; a quiz of at most chunk_size questions
+    (or chunk_size 0) is one request.
+    """
+    if chunk_size <= 0 or num_questions <= chunk_size:
+        return [num_questions]
+    chunks = math.ceil(num_questions / chunk_size)
+    base, extra = divmod(num_questions, chunks)
+    return [base + 1 if i < extra else base for i in range(chunks)]
 
 
 class QuizAgent:
@@ -25,29 +71,325 @@ class QuizAgent:
     Purpose: Create quizzes on any topic
     """
     
-    def __init__(self):
-        self.client = AzureOpenAI(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-            api_version=AZURE_OPENAI_API_VERSION,
-        )
+    def __init__(self, cache=None, bank=None, chunk_size=QUIZ_CHUNK_SIZE):
+        """
+        Args:
+            cache: Optional ResponseCache; identical requests are then
+                answered from the cache instead of calling GPT-4
+            bank: Optional QuestionBank; generated questions are stored in
+                it and quizzes are drawn from it when it holds enough
+            chunk_size: Questions per upstream call; bigger quizzes are
+                generated in concurrent chunks (0 = always one call)
+        """
+        # Shared, connection-pooled clients (see client_provider.py);
+        # the async one is for the FastAPI backend
+        self.client = get_client()
+        self.async_client = get_async_client()
         
         self.system_prompt = """You are a quiz generation specialist. 
         Create clear, educational quizzes with multiple choice questions.
-        Format: Question, 4 options (A-D), and indicate the correct answer."""
+        Every question has exactly 4 options (A-D), the letter of the correct
+        answer and a one-sentence explanation of why it is correct."""
+        
+        self.cache = cache
+        self.bank = bank
+        self.chunk_size = chunk_size
+        self.generation_stats = {
+            "quizzes": 0,
+            "split": 0,  # quizzes generated in more than one chunk
+            "chunks": 0,
+            "failed_chunks": 0,
+            "partial": 0,  # quizzes returned with some chunks missing
+            "duplicates": 0,  # near-duplicate questions dropped when merging
+        }
+        
+        # Identical requests in flight at the same time share one upstream call
+        self.in_flight = SingleFlight()
+    
+    def _cached(self, topic, num_questions, fresh):
+        """
+        Look the request up in the cache
+        
+        Returns:
+            Tuple of (request key, cached Quiz). The key also identifies
+            identical in-flight requests; the response is None on a miss,
+            when fresh=True or when caching is off.
+        """
+        key = make_cache_key(self.system_prompt, topic, num_questions=num_questions, temperature=0.7)
+        if self.cache is None:
+            return key, None
+        return key, self.cache.get(key, fresh)
+    
+    def _drawn(self, topic, num_questions, student):
+        """A quiz from the question bank (None without a bank or when the topic is thin)"""
+        if self.bank is None:
+            return None
+        return self.bank.draw(topic, num_questions, student)
+    
+    async def _adrawn(self, topic, num_questions, student, mark=True):
+        """_drawn() in a thread: the bank is a file that may be busy"""
+        if self.bank is None:
+            return None
+        return await asyncio.to_thread(self.bank.draw, topic, num_questions, student, mark)
+    
+    def _hand_out(self, quiz, student):
+        """Note the questions as seen by the student (when there is a bank)"""
+        if self.bank is not None:
+            self.bank.mark_seen(student, quiz)
+        return quiz
+    
+    async def _ahand_out(self, quiz, student):
+        """_hand_out() in a thread"""
+        if self.bank is not None:
+            await asyncio.to_thread(self.bank.mark_seen, student, quiz)
+        return quiz
+    
+    def _remember(self, key, quiz, complete=True):
+        """
+        Cache a newly generated quiz (if caching is on)
+        
+        A partial quiz (some chunks failed) isn't cached: its questions are
+        fine (they still go into the bank), but it is shorter than what was
+        asked for.
+        """
+        if self.cache is not None and complete:
+            self.cache.set(key, quiz)
+    
+    def _bank(self, topic, quiz):
+        """Add a newly generated quiz's questions to the bank (if in use)"""
+        if self.bank is not None:
+            self.bank.add(topic, quiz)
+        return quiz
+    
+    async def _abank(self, topic, quiz):
+        """_bank() in a thread"""
+        if self.bank is not None:
+            await asyncio.to_thread(self.bank.add, topic, quiz)
+        return quiz
+    
+    def _parse(self, key, topic, response):
+        """Turn a completion into a Quiz and store it (QuizFormatError if invalid)"""
+        record_usage("quiz", response.usage)
+        quiz = Quiz.from_json(response.choices[0].message.content, topic)
+        self._remember(key, quiz)
+        return self._bank(topic, quiz)
+    
+    def _chunks(self, topic, num_questions):
+        """Message lists for the upstream calls of one quiz (one, unless it is split)"""
+        sizes = split_quiz(num_questions, self.chunk_size)
+        if len(sizes) == 1:
+            return [self._build_messages(topic, num_questions)]
+        return [
+            self._build_messages(topic, size, CHUNK_FOCUS[i % len(CHUNK_FOCUS)])
+            for i, size in enumerate(sizes)
+        ]
+    
+    def _merged(self, key, topic, unique, chunks, errors):
+        """
+        Build the quiz from the merged chunks, cache it and count it
+        
+        Raises:
+            The first chunk's error when no chunk produced a question
+        """
+        stats = self.generation_stats
+        stats["quizzes"] += 1
+        stats["split"] += chunks > 1
+        stats["chunks"] += chunks
+        stats["failed_chunks"] += len(errors)
+        stats["duplicates"] += unique.duplicates
+        if not unique.questions:
+            raise errors[0] if errors else QuizFormatError("The quiz has no questions")
+        stats["partial"] += bool(errors)
+        
+        quiz = Quiz(topic, unique.questions)
+        self._remember(key, quiz, complete=not errors)
+        return quiz
+    
+    async def _achunk(self, topic, messages):
+        """One upstream call for (part of) a quiz"""
+        response = await self.async_client.chat.completions.create(
+            model=GPT4_DEPLOYMENT_NAME,
+            messages=messages,
+            temperature=0.7,
+            response_format=RESPONSE_FORMAT
+        )
+        record_usage("quiz", response.usage)
+        return Quiz.from_json(response.choices[0].message.content, topic)
+    
+    async def _acomplete(self, key, topic, num_questions):
+        """Generate a quiz, in concurrent chunks if it is big (it is stored for later requests)"""
+        chunks = self._chunks(topic, num_questions)
+        results = await asyncio.gather(
+            *(self._achunk(topic, messages) for messages in chunks), return_exceptions=True
+        )
+        
+        unique = UniqueQuestions(limit=num_questions)
+        errors = []
+        for result in results:
+            if isinstance(result, BaseException):
+                errors.append(result)
+            else:
+                for question in result:
+                    unique.add(question)
+        return await self._abank(topic, self._merged(key, topic, unique, len(chunks), errors))
+    
+    async def _astream_upstream(self, key, topic, num_questions):
+        """
+        Stream a quiz, rendered question by question
+        
+        The JSON itself is never shown: every question is sent as one token
+        event once it is complete. A split quiz streams all its chunks at
+        once, so questions arrive in whichever order the chunks finish
+        them. One usage event covers all chunks. When it ends, the whole
+        quiz is stored and sent as a final ("quiz", Quiz) event.
+        """
+        queue = asyncio.Queue()
+        
+        async def run(messages):
+            questions = QuestionStream()
+            try:
+                async for event, data in stream_completion(
+                    self.async_client, messages, temperature=0.7, response_format=RESPONSE_FORMAT
+                ):
+                    if event == "token":
+                        for question in questions.feed(data):
+                            queue.put_nowait(("question", question))
+                    elif event == "usage":
+                        queue.put_nowait(("usage", data))
+            except Exception as e:
+                # A failed chunk only costs its own (remaining) questions
+                queue.put_nowait(("error", e))
+            finally:
+                queue.put_nowait(("end", None))
+        
+        chunks = self._chunks(topic, num_questions)
+        tasks = [asyncio.create_task(run(messages)) for messages in chunks]
+        unique = UniqueQuestions(limit=num_questions)
+        usage = None
+        errors = []
+        try:
+            running = len(tasks)
+            while running:
+                kind, data = await queue.get()
+                if kind == "end":
+                    running -= 1
+                elif kind == "question":
+                    if unique.add(data):
+                        number = len(unique.questions)
+                        yield "token", ("\n\n" if number > 1 else "") + data.render(number)
+                elif kind == "usage":
+                    record_usage("quiz", data)
+                    usage = {name: (usage or {}).get(name, 0) + value for name, value in data.items()}
+                else:
+                    errors.append(data)
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        if usage is not None:
+            yield "usage", usage
+        yield "quiz", await self._abank(topic, self._merged(key, topic, unique, len(chunks), errors))
     
-    def generate_quiz(self, topic, num_questions=5):
-        """Generate a quiz on a topic"""
-        messages = [
+    def _build_messages(self, topic, num_questions, focus=None):
+        """Build the message list sent to GPT-4 (focus: what a chunk of a split quiz covers)"""
+        request = f"Create a {num_questions}-question quiz on {topic}"
+        if focus:
+            request += f". Focus on {focus}."
+        return [
             {"role": "system", "content": self.system_prompt},
-            {"role": "user", "content": f"Create a {num_questions}-question quiz on {topic}"}
+            {"role": "user", "content": request}
         ]
+    
+    @instrument_agent("quiz")
+    def create_quiz(self, topic, num_questions=5, fresh=False, student=None):
+        """
+        Generate a quiz on a topic
+        
+        Args:
+            topic: The request text
+            num_questions: Questions in the quiz
+            fresh: Don't answer from the response cache (a quiz from the
+                bank is always new to the student)
+            student: Session id, so the bank never repeats a question
+        
+        Returns:
+            Quiz (see quiz_model.py)
+        
+        Raises:
+            QuizFormatError: GPT-4's answer wasn't a valid quiz
+        """
+        drawn = self._drawn(topic, num_questions, student)
+        if drawn is not None:
+            return drawn
+        
+        key, cached = self._cached(topic, num_questions, fresh)
+        if cached is not None:
+            return self._hand_out(cached, student)
+        
+        messages = self._build_messages(topic, num_questions)
         
         response = self.client.chat.completions.create(
             model=GPT4_DEPLOYMENT_NAME,
             messages=messages,
-            temperature=0.7
+            temperature=0.7,
+            response_format=RESPONSE_FORMAT
         )
+        return self._hand_out(self._parse(key, topic, response), student)
+    
+    @instrument_agent("quiz")
+    async def acreate_quiz(self, topic, num_questions=5, fresh=False, student=None, hand_out=True):
+        """
+        Generate a quiz on a topic without blocking the event loop
+        
+        With hand_out=False the bank still leaves out questions the student
+        has seen, but the new ones aren't marked as seen: the caller does
+        that (_ahand_out) once the quiz is actually shown.
+        """
+        drawn = await self._adrawn(topic, num_questions, student, mark=hand_out)
+        if drawn is not None:
+            return drawn
+        
+        key, cached = self._cached(topic, num_questions, fresh)
+        if cached is not None:
+            return await self._ahand_out(cached, student) if hand_out else cached
+        
+        if fresh:
+            # Fresh answers are meant to differ, so they are never shared
+            quiz = await self._acomplete(key, topic, num_questions)
+        else:
+            quiz = await self.in_flight.do(key, lambda: self._acomplete(key, topic, num_questions))
+        return await self._ahand_out(quiz, student) if hand_out else quiz
+    
+    def generate_quiz(self, topic, num_questions=5, fresh=False, student=None):
+        """Generate a quiz on a topic, as text"""
+        return self.create_quiz(topic, num_questions, fresh, student).render()
+    
+    async def agenerate_quiz(self, topic, num_questions=5, fresh=False, student=None):
+        """Async version of generate_quiz"""
+        quiz = await self.acreate_quiz(topic, num_questions, fresh, student)
+        return quiz.render()
+    
+    @instrument_agent("quiz")
+    async def astream_quiz(self, topic, num_questions=5, fresh=False, student=None):
+        """Stream a quiz as ("token", text) / ("usage", dict) events, one question per token"""
+        ready = await self._adrawn(topic, num_questions, student)
+        key, cached = self._cached(topic, num_questions, fresh) if ready is None else (None, None)
+        if cached is not None:
+            ready = await self._ahand_out(cached, student)
+        if ready is not None:
+            # Bank or cache hit: send the whole quiz as a single token event
+            yield "token", ready.render()
+            return
+        
+        if fresh:
+            events = self._astream_upstream(key, topic, num_questions)
+        else:
+            # Joins an identical stream already in flight (replayed from its start)
+            events = self.in_flight.stream(key, lambda: self._astream_upstream(key, topic, num_questions))
         
-        return response.choices[0].message.content
+        async for event, data in events:
+            if event == "quiz":
+                await self._ahand_out(data, student)
+            else:
+                yield event, data
 
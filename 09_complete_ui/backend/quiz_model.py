@@ -0,0 +1,293 @@
+"""
+Step 9: Complete UI - Quiz Model
+
+Quizzes as data instead of text.
+
+The quiz agent used to ask GPT-4 for "Question, 4 options (A-D), and
+indicate the correct answer" and passed the free-form text along; anything
+that wanted to grade an answer or reuse a question had to parse it again.
+Now GPT-4 answers in JSON that must match QUIZ_SCHEMA (structured outputs,
+see RESPONSE_FORMAT), which is parsed and checked once into:
+- Question: the question text, its options (a tuple), the index of the
+  correct option and a short explanation
+- Quiz: the topic and a tuple of questions
+
+Both use __slots__, so the thousands of quizzes kept in the response cache
+cost a few small objects each instead of a dict per question. render()
+turns a quiz back into Markdown for the chat UI, and to_json()/from_json()
+store it compactly (question bank, batch results).
+
+QuestionStream finds complete questions in a JSON answer while it is still
+streaming, so /api/chat/stream can show question 1 before question 3 exists.
+UniqueQuestions merges questions from several answers (a quiz generated in
+parallel chunks), dropping near-duplicates.
+"""
+
+import hashlib
+import json
+import re
+import string
+
+
+LETTERS = "ABCDEFGH"
+
+PUNCTUATION_TABLE = str.maketrans({c: " " for c in string.punctuation})
+
+# Strict structured outputs: every property required, nothing else allowed
+QUIZ_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "options": {"type": "array", "items": {"type": "string"}},
+                    "answer": {"type": "string", "enum": list(LETTERS[:4])},
+                    "explanation": {"type": "string"},
+                },
+                "required": ["question", "options", "answer", "explanation"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["questions"],
+    "additionalProperties": False,
+}
+
+# The response_format argument for chat.completions.create
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "quiz", "strict": True, "schema": QUIZ_SCHEMA},
+}
+
+# How many questions a request asks for: "15 questions", "a 10-question quiz", "5 MCQs"
+QUIZ_SIZE_PATTERN = re.compile(r"\b(\d{1,3})[\s-]*(?:questions?|qs|mcqs?)\b", re.IGNORECASE)
+
+
+class QuizFormatError(ValueError):
+    """GPT-4's answer is not a valid quiz"""
+
+
+class Question:
+    """One multiple-choice question"""
+
+    __slots__ = ("text", "options", "answer", "explanation")
+
+    def __init__(self, text, options, answer, explanation=""):
+        """
+        Args:
+            text: The question
+            options: The answer options, in order (A, B, ...)
+            answer: Index of the correct option
+            explanation: Why that option is correct
+        """
+        self.text = text
+        self.options = tuple(options)
+        self.answer = answer
+        self.explanation = explanation
+
+    @property
+    def letter(self):
+        """The correct option's letter"""
+        return LETTERS[self.answer]
+
+    def is_correct(self, choice):
+        """
+        Check a student's answer
+
+        Args:
+            choice: Option letter ("b", "B) ...") or index
+        """
+        if isinstance(choice, int):
+            return choice == self.answer
+        return choice.strip()[:1].upper() == self.letter
+
+    def to_dict(self):
+        return {"question": self.text, "options": list(self.options),
+                "answer": self.letter, "explanation": self.explanation}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a question from its JSON form, checking it on the way
+
+        Raises:
+            QuizFormatError: Missing fields, too few options or an answer
+                that isn't one of the options
+        """
+        try:
+            text = data["question"].strip()
+            options = tuple(option.strip() for option in data["options"])
+            letter = data["answer"].strip()[:1].upper()
+        except (KeyError, TypeError, AttributeError) as e:
+            raise QuizFormatError(f"Malformed question: {data!r}") from e
+
+        if not text or not 2 <= len(options) <= len(LETTERS):
+            raise QuizFormatError(f"Question needs text and 2-{len(LETTERS)} options: {data!r}")
+        answer = LETTERS.find(letter) if letter else -1
+        if not 0 <= answer < len(options):
+            raise QuizFormatError(f"Answer {data['answer']!r} is not one of the options")
+        return cls(text, options, answer, str(data.get("explanation") or "").strip())
+
+    def render(self, number):
+        """The question as Markdown, numbered for display"""
+        lines = [f"**{number}. {self.text}**", ""]
+        lines.extend(f"- {LETTERS[i]}) {option}" for i, option in enumerate(self.options))
+        lines.append("")
+        answer = f"*Answer: {self.letter}) {self.options[self.answer]}*"
+        lines.append(f"{answer} - {self.explanation}" if self.explanation else answer)
+        return "\n".join(lines)
+
+
+class Quiz:
+    """A topic and its questions"""
+
+    __slots__ = ("topic", "questions")
+
+    def __init__(self, topic, questions):
+        self.topic = topic
+        self.questions = tuple(questions)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __iter__(self):
+        return iter(self.questions)
+
+    def grade(self, answers):
+        """
+        Score a student's answers
+
+        Args:
+            answers: One choice per question (letters or indexes, None = skipped)
+
+        Returns:
+            Number of correct answers
+        """
+        return sum(
+            1 for question, choice in zip(self.questions, answers)
+            if choice is not None and question.is_correct(choice)
+        )
+
+    def to_dict(self):
+        return {"topic": self.topic, "questions": [q.to_dict() for q in self.questions]}
+
+    def to_json(self):
+        """Compact JSON (no spaces), for storage"""
+        return json.dumps(self.to_dict(), separators=(",", ":"), ensure_ascii=False)
+
+    @classmethod
+    def from_dict(cls, data, topic=None):
+        """
+        Build a quiz from its JSON form
+
+        Args:
+            data: {"questions": [...]} (as GPT-4 sends it) or a to_dict() result
+            topic: The topic, if data doesn't name one
+
+        Raises:
+            QuizFormatError: Not a quiz, no questions, or an invalid question
+        """
+        if not isinstance(data, dict) or not isinstance(data.get("questions"), list):
+            raise QuizFormatError("Expected an object with a list of questions")
+        if not data["questions"]:
+            raise QuizFormatError("The quiz has no questions")
+        questions = [Question.from_dict(question) for question in data["questions"]]
+        return cls(data.get("topic") or topic or "", questions)
+
+    @classmethod
+    def from_json(cls, text, topic=None):
+        """Parse GPT-4's JSON answer (or to_json() output) into a quiz"""
+        try:
+            data = json.loads(text)
+        except (TypeError, json.JSONDecodeError) as e:
+            raise QuizFormatError(f"The quiz is not valid JSON: {e}") from e
+        return cls.from_dict(data, topic)
+
+    def render(self):
+        """The whole quiz as Markdown (what /api/chat returns)"""
+        return "\n\n".join(q.render(i) for i, q in enumerate(self.questions, start=1))
+
+
+def text_key(question):
+    """
+    Hash of a question's normalized text, for spotting near-duplicates
+
+    Case, punctuation and spacing are ignored, so "What is a fraction?" and
+    "what is a  fraction" are the same question.
+    """
+    words = question.text.lower().translate(PUNCTUATION_TABLE).split()
+    return hashlib.sha1(" ".join(words).encode()).digest()[:8]
+
+
+class UniqueQuestions:
+    """Collects questions, skipping any whose normalized text was seen before"""
+
+    def __init__(self, limit=None):
+        """
+        Args:
+            limit: Most questions to keep (None = no limit)
+        """
+        self.limit = limit
+        self.questions = []
+        self.duplicates = 0
+        self._keys = set()
+
+    def add(self, question):
+        """Keep a question; returns False for a near-duplicate or when full"""
+        key = text_key(question)
+        if key in self._keys:
+            self.duplicates += 1
+            return False
+        if self.limit is not None and len(self.questions) >= self.limit:
+            return False
+        self._keys.add(key)
+        self.questions.append(question)
+        return True
+
+
+class QuestionStream:
+    """
+    Pick complete questions out of a streamed quiz answer
+
+    Feed it the JSON text as it arrives; every question object is returned
+    as soon as its closing brace is in. Only the question being written is
+    re-parsed, and only when a chunk may have closed it.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = None  # where the next question starts (None: "[" not seen yet)
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, chunk):
+        """
+        Add streamed text
+
+        Returns:
+            List of questions completed by this chunk
+        """
+        self.text += chunk
+        if self._pos is None:
+            start = self.text.find("[")
+            if start < 0:
+                return []
+            self._pos = start + 1
+        if "}" not in chunk:
+            return []
+
+        questions = []
+        while True:
+            # Skip whitespace and commas between question objects
+            while self._pos < len(self.text) and self.text[self._pos] in " \t\r\n,":
+                self._pos += 1
+            if self._pos >= len(self.text) or self.text[self._pos] != "{":
+                return questions
+            try:
+                data, end = self._decoder.raw_decode(self.text, self._pos)
+            except json.JSONDecodeError:
+                return questions  # not complete yet
+            questions.append(Question.from_dict(data))
+            self._pos = end
@@ -0,0 +1,369 @@
+"""
+Step 9: Complete UI - Client-Side Rate Limiting
+
+Token buckets for the Azure deployment's requests-per-minute (RPM) and
+tokens-per-minute (TPM) quotas, checked before every upstream call.
+
+Azure rejects everything above the quota with a 429. The retry layer
+(resilience.py) recovers from a few of those, but a burst from many
+students at once turns into a wave of 429s, retries and more 429s. The
+limiter keeps us under the quota instead:
+- every call costs 1 request and an estimate of its tokens: the prompt
+  (estimated from the message list) plus max_tokens for the completion,
+  which is also how Azure counts it against the TPM quota
+- policy "queue" waits for its turn (up to max_wait, or whatever is left
+  of the call's deadline); policy "reject" fails at once
+- calls that can't go out in time raise RateLimitExceeded (a 429 for the
+  student, with Retry-After) without ever reaching Azure
+- after a call, the estimate is corrected with the real `usage` (for a
+  stream, from its final usage chunk, once it has been read); a call that
+  fails gives its tokens back, and a queued call that is cancelled before
+  it goes out gives back its request too
+
+The buckets live in a store. MemoryBucketStore is enough for one process;
+SQLiteBucketStore keeps them in a local SQLite file, so several uvicorn
+workers (uvicorn api:app --workers 4) share one quota.
+
+client_provider.py gives both shared clients the same limiter.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+
+from tokens import estimate_messages_tokens
+
+
+class RateLimitExceeded(Exception):
+    """The call would have gone over the quota; it was not attempted"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limit reached, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class MemoryBucketStore:
+    """Bucket levels for a single process"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()  # the sync client may be used from threads
+
+    def update(self, names, apply):
+        """
+        Read, change and write some buckets in one step
+
+        Args:
+            names: Bucket names involved
+            apply: Function (state) -> result; state maps name -> (level,
+                updated) for the buckets that exist and may be changed in place
+
+        Returns:
+            Whatever apply returned
+        """
+        with self._lock:
+            state = {name: self._buckets[name] for name in names if name in self._buckets}
+            result = apply(state)
+            self._buckets.update(state)
+            return result
+
+    async def aupdate(self, names, apply):
+        """update() from async code (it only holds a lock for a moment)"""
+        return self.update(names, apply)
+
+
+class SQLiteBucketStore:
+    """
+    Bucket levels in a SQLite file, shared by every process that opens it
+
+    Each update runs in a BEGIN IMMEDIATE transaction, so reservations from
+    different workers are serialized by SQLite's file lock.
+    """
+
+    def __init__(self, path, timeout=5.0):
+        """
+        Args:
+            path: SQLite file (created if missing)
+            timeout: Seconds to wait for another process's lock
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()  # sqlite3 connections are per thread
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def update(self, names, apply):
+        """Same as MemoryBucketStore.update, but atomic across processes"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            placeholders = ",".join("?" * len(names))
+            rows = connection.execute(
+                f"SELECT name, level, updated FROM buckets WHERE name IN ({placeholders})", list(names)
+            ).fetchall()
+            state = {name: (level, updated) for name, level, updated in rows}
+            result = apply(state)
+            connection.executemany(
+                "INSERT INTO buckets (name, level, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET level = excluded.level, updated = excluded.updated",
+                [(name, level, updated) for name, (level, updated) in state.items()],
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return result
+
+    async def aupdate(self, names, apply):
+        """update() in a thread: waiting for another process's lock must not block the event loop"""
+        return await asyncio.to_thread(self.update, names, apply)
+
+
+class RateLimiter:
+    """
+    RPM and TPM token buckets in front of one deployment
+
+    Each bucket holds up to `burst_seconds` worth of quota and refills
+    continuously. A reservation takes its cost from both buckets at once;
+    when they don't hold enough, the level goes negative and the caller
+    sleeps until it has refilled - so queued callers are served in order,
+    without polling.
+    """
+
+    def __init__(self, rpm=0, tpm=0, policy="queue", max_wait=30.0, burst_seconds=10.0,
+                 completion_tokens=500, store=None, name="default"):
+        """
+        Args:
+            rpm: Requests per minute (0 = no limit)
+            tpm: Tokens per minute (0 = no limit)
+            policy: "queue" (wait for quota) or "reject" (fail at once)
+            max_wait: Longest a queued call may wait (s)
+            burst_seconds: Quota that may be used at once, in seconds of refill
+            completion_tokens: Completion estimate for calls without max_tokens
+            store: MemoryBucketStore (default) or SQLiteBucketStore
+            name: Prefix for the bucket names (one per deployment)
+        """
+        if policy not in ("queue", "reject"):
+            raise ValueError(f"Unknown rate limit policy: {policy}")
+        self.rpm = rpm
+        self.tpm = tpm
+        self.policy = policy
+        self.max_wait = max_wait
+        self.burst_seconds = burst_seconds
+        self.completion_tokens = completion_tokens
+        self.store = store or MemoryBucketStore()
+        self.name = name
+
+        self.requests = 0
+        self.tokens = 0
+        self.queued = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+
+    def _buckets(self, tokens):
+        """(name, capacity, refill per second, cost) for every enabled bucket"""
+        buckets = []
+        for suffix, per_minute, cost in (("requests", self.rpm, 1), ("tokens", self.tpm, tokens)):
+            if per_minute > 0:
+                rate = per_minute / 60
+                capacity = max(rate * self.burst_seconds, 1)
+                # A call bigger than the whole bucket would never fit; let it drain the bucket
+                buckets.append((f"{self.name}:{suffix}", capacity, rate, min(cost, capacity)))
+        return buckets
+
+    def estimate(self, request):
+        """
+        Estimate the tokens a chat.completions.create call will count
+
+        Args:
+            request: The call's keyword arguments (messages, max_tokens, ...)
+        """
+        completion = request.get("max_tokens") or self.completion_tokens
+        return estimate_messages_tokens(request.get("messages") or []) + completion
+
+    def _reservation(self, tokens, max_wait):
+        """Bucket names and the store update that reserves a call (None without limits)"""
+        buckets = self._buckets(tokens)
+        if not buckets:
+            return None
+
+        limit = 0.0 if self.policy == "reject" else self.max_wait
+        if max_wait is not None:
+            limit = min(limit, max_wait)
+
+        def take(state):
+            now = time.time()  # wall clock: shared between processes
+            levels = {}
+            wait = 0.0
+            for name, capacity, rate, cost in buckets:
+                level, updated = state.get(name, (capacity, now))
+                levels[name] = min(capacity, level + (now - updated) * rate)
+                wait = max(wait, (cost - levels[name]) / rate)
+            if wait > limit:
+                return wait, False
+            for name, capacity, rate, cost in buckets:
+                state[name] = (levels[name] - cost, now)
+            return wait, True
+
+        return [name for name, *_ in buckets], take
+
+    def _granted(self, tokens, wait, granted):
+        """Count a reservation; returns the wait or raises RateLimitExceeded"""
+        if not granted:
+            self.rejected += 1
+            raise RateLimitExceeded(wait)
+
+        self.requests += 1
+        self.tokens += tokens
+        if wait > 0:
+            self.queued += 1
+            self.wait_seconds += wait
+        return max(wait, 0.0)
+
+    def reserve(self, tokens, max_wait=None):
+        """
+        Take one request and `tokens` tokens from the buckets
+
+        Args:
+            tokens: Estimated tokens for the call
+            max_wait: Longest the caller can wait (s), e.g. its deadline
+
+        Returns:
+            Seconds the caller must wait before sending the call
+
+        Raises:
+            RateLimitExceeded: The quota won't be there in time
+        """
+        reservation = self._reservation(tokens, max_wait)
+        if reservation is None:
+            return 0.0
+        return self._granted(tokens, *self.store.update(*reservation))
+
+    async def areserve(self, tokens, max_wait=None):
+        """Async version of reserve (a shared store is updated in a thread)"""
+        reservation = self._reservation(tokens, max_wait)
+        if reservation is None:
+            return 0.0
+        return self._granted(tokens, *await self.store.aupdate(*reservation))
+
+    def _refund(self, tokens):
+        """Bucket names and the store update that gives a reservation back"""
+        buckets = self._buckets(tokens)
+
+        def give_back(state):
+            now = time.time()
+            for name, capacity, rate, cost in buckets:
+                level, updated = state.get(name, (capacity, now))
+                level = min(capacity, level + (now - updated) * rate)
+                state[name] = (min(capacity, level + cost), now)
+
+        self.requests -= 1
+        self.tokens -= tokens
+        return [name for name, *_ in buckets], give_back
+
+    def acquire(self, tokens, max_wait=None):
+        """Reserve quota and sleep until it is ours; returns the seconds waited"""
+        wait = self.reserve(tokens, max_wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens, max_wait=None):
+        """Async version of acquire (the event loop keeps running while we wait)"""
+        wait = await self.areserve(tokens, max_wait)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # The call will never be sent: its quota goes to the callers after it
+                await self.store.aupdate(*self._refund(tokens))
+                raise
+        return wait
+
+    def _settlement(self, estimated, actual):
+        """Bucket names and the store update that corrects a reservation (None if nothing to do)"""
+        buckets = [bucket for bucket in self._buckets(0) if bucket[0].endswith(":tokens")]
+        if not buckets or actual is None or actual == estimated:
+            return None
+        name, capacity, rate, _ = buckets[0]
+
+        def give_back(state):
+            now = time.time()
+            level, updated = state.get(name, (capacity, now))
+            level = min(capacity, level + (now - updated) * rate)
+            state[name] = (min(capacity, level + estimated - actual), now)
+
+        self.tokens += actual - estimated
+        return [name], give_back
+
+    def settle(self, estimated, actual):
+        """
+        Correct a reservation once the real token count is known
+
+        Unused tokens go back into the bucket; extra ones are taken out.
+        """
+        settlement = self._settlement(estimated, actual)
+        if settlement is not None:
+            self.store.update(*settlement)
+
+    async def asettle(self, estimated, actual):
+        """Async version of settle"""
+        settlement = self._settlement(estimated, actual)
+        if settlement is not None:
+            await self.store.aupdate(*settlement)
+
+    def stats(self):
+        """Counters for monitoring (this process only)"""
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "policy": self.policy,
+            "requests": self.requests,
+            "tokens": self.tokens,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+def _demo_worker(path, calls, results):
+    """One process of the __main__ demo (module level, so "spawn" can pickle it)"""
+    limiter = RateLimiter(rpm=600, burst_seconds=1, store=SQLiteBucketStore(path))
+    for _ in range(calls):
+        limiter.acquire(0)
+    results.put(limiter.stats())
+
+
+if __name__ == "__main__":
+    # Quick demo: four processes share a 600 RPM quota through one SQLite file
+    # (benchmarks/rate_limit_benchmark.py runs real calls against a quota-enforcing mock)
+    import multiprocessing
+    import os
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), "rate_limit.sqlite")
+    results = multiprocessing.Queue()
+    start = time.perf_counter()
+    processes = [multiprocessing.Process(target=_demo_worker, args=(path, 25, results)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    stats = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    total = sum(s["requests"] for s in stats)
+    print(f"✅ {total} calls from 4 processes in {elapsed:.2f}s = {total / elapsed * 60:.0f}/min (quota 600/min)")
+    print(f"📊 queued {sum(s['queued'] for s in stats)}, "
+          f"waited {sum(s['wait_seconds'] for s in stats):.1f}s in total")
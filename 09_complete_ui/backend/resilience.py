@@ -0,0 +1,418 @@
+"""
+Step 9: Complete UI - Upstream Resilience
+
+Retries, deadlines and a circuit breaker around every chat completion.
+
+Azure OpenAI sometimes answers 429 (quota), 5xx or not at all. Without
+this layer every such hiccup became a 500 for the student, who then
+retried by hand - doubling the load on an upstream that was already
+struggling. Now every call made through the shared clients:
+- is retried on 408/409/429/5xx, timeouts and connection errors, with
+  exponential backoff and full jitter (so retries don't arrive in waves)
+- waits at least as long as the upstream's Retry-After header asks
+- never runs past its deadline (all attempts and waits included)
+- fails fast with CircuitOpenError while the upstream is unhealthy,
+  instead of piling more requests onto it
+
+client_provider.py wraps both shared clients in a ResilientClient, so the
+orchestrator and all agents get this without changing their calls. A call
+can pass its own deadline: client.chat.completions.create(..., deadline=5).
+With a RateLimiter, each attempt first waits for RPM/TPM quota (within
+the same deadline).
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+import openai
+
+
+# Statuses worth retrying (everything else, e.g. 400/401/404, fails at once)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """The upstream is considered down; the call was not attempted"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Upstream unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call (including retries) ran out of time"""
+
+
+def retry_after_seconds(error):
+    """
+    Read the Retry-After (or retry-after-ms) header of a failed response
+
+    Returns:
+        Seconds to wait, or None if the upstream didn't say
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    for header, divisor in (("retry-after-ms", 1000), ("retry-after", 1)):
+        value = response.headers.get(header)
+        if value is not None:
+            try:
+                return max(0.0, float(value) / divisor)
+            except ValueError:
+                continue  # HTTP-date form; fall back to our own backoff
+    return None
+
+
+def classify_error(error):
+    """
+    Decide what a failed call means
+
+    Returns:
+        Tuple of (retryable, upstream_unhealthy). 429 is retryable but says
+        nothing about the upstream's health, so it doesn't trip the breaker.
+    """
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True, True
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        return status in RETRYABLE_STATUS, status >= 500
+    return False, False
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive upstream failures;
+    open -> half-open after `reset_timeout` seconds, when one probe call is
+    let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()  # the sync client may be used from threads
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError unless a call may go upstream now
+        """
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError(max(remaining, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def record_neutral(self):
+        """A call ended without telling us anything about upstream health"""
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class Resilience:
+    """
+    Retry policy plus circuit breaker, shared by the sync and async clients
+    """
+
+    def __init__(self, breaker, max_attempts=4, base_delay=0.5, max_delay=8.0, deadline=60.0):
+        """
+        Args:
+            breaker: CircuitBreaker for this upstream
+            max_attempts: Tries per call (1 = no retries)
+            base_delay: First backoff step (s); doubles on every retry
+            max_delay: Largest backoff step (s)
+            deadline: Default time budget per call (s), all attempts included
+        """
+        self.breaker = breaker
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _backoff(self, attempt, error, time_left):
+        """
+        Seconds to wait before the next attempt, or None to give up
+
+        Full jitter: a random wait between 0 and the exponential step, but
+        never shorter than the upstream's Retry-After.
+        """
+        step = min(self.max_delay, self.base_delay * 2 ** attempt)
+        wait = random.uniform(0, step)
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            wait = max(wait, retry_after)
+        return wait if wait < time_left else None
+
+    def _after_failure(self, error, attempt, deadline_at):
+        """
+        Update the breaker for a failed attempt
+
+        Returns:
+            Seconds to wait before retrying, or None if the error is final
+        """
+        retryable, unhealthy = classify_error(error)
+        if unhealthy:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_neutral()
+
+        if not retryable or attempt + 1 >= self.max_attempts:
+            return None
+        return self._backoff(attempt, error, deadline_at - time.monotonic())
+
+    def call(self, create, deadline=None):
+        """
+        Run a sync call with retries
+
+        Args:
+            create: Function (timeout) -> result; timeout is the time left
+            deadline: Time budget in seconds (default: self.deadline)
+        """
+        self.calls += 1
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        for attempt in range(self.max_attempts):
+            self.breaker.before_call()
+            time_left = deadline_at - time.monotonic()
+            if time_left <= 0:
+                self.breaker.record_neutral()
+                break
+            try:
+                result = create(time_left)
+            except Exception as e:
+                wait = self._after_failure(e, attempt, deadline_at)
+                if wait is None:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                time.sleep(wait)
+            else:
+                self.breaker.record_success()
+                return result
+
+        self.failures += 1
+        raise DeadlineExceeded(f"Upstream call exceeded its {deadline or self.deadline}s deadline")
+
+    async def acall(self, create, deadline=None):
+        """
+        Run an async call with retries
+
+        Args:
+            create: Function (timeout) -> awaitable; timeout is the time left
+            deadline: Time budget in seconds (default: self.deadline)
+        """
+        self.calls += 1
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        for attempt in range(self.max_attempts):
+            self.breaker.before_call()
+            time_left = deadline_at - time.monotonic()
+            if time_left <= 0:
+                self.breaker.record_neutral()
+                break
+            try:
+                # The SDK timeout applies per read; wait_for enforces the total
+                result = await asyncio.wait_for(create(time_left), time_left)
+            except asyncio.TimeoutError:
+                self.breaker.record_failure()
+                break
+            except Exception as e:
+                wait = self._after_failure(e, attempt, deadline_at)
+                if wait is None:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                await asyncio.sleep(wait)
+            except BaseException:
+                # Cancelled (e.g. a discarded speculative call): free a probe slot
+                self.breaker.record_neutral()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+
+        self.failures += 1
+        raise DeadlineExceeded(f"Upstream call exceeded its {deadline or self.deadline}s deadline")
+
+    def stats(self):
+        """Counters for monitoring"""
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "circuit": self.breaker.stats(),
+        }
+
+
+def _usage_tokens(result):
+    """Total tokens reported by a finished call or a stream's usage chunk"""
+    usage = getattr(result, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+class _SettledStream:
+    """
+    A stream that settles its reservation once the final usage chunk is read
+
+    The chunk only comes with stream_options={"include_usage": True} (which
+    stream_completion() always asks for); without it, or if the caller stops
+    reading early, the reservation keeps the estimate.
+    """
+
+    def __init__(self, stream, limiter, estimate):
+        self._stream = stream
+        self._limiter = limiter
+        self._estimate = estimate
+
+    def __iter__(self):
+        actual = None
+        for chunk in self._stream:
+            actual = _usage_tokens(chunk) or actual
+            yield chunk
+        self._limiter.settle(self._estimate, actual)
+
+    async def __aiter__(self):
+        actual = None
+        async for chunk in self._stream:
+            actual = _usage_tokens(chunk) or actual
+            yield chunk
+        await self._limiter.asettle(self._estimate, actual)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _ResilientCompletions:
+    def __init__(self, completions, resilience, is_async, limiter=None):
+        self._completions = completions
+        self._resilience = resilience
+        self._is_async = is_async
+        self._limiter = limiter
+
+    def create(self, deadline=None, **kwargs):
+        """chat.completions.create with retries; `deadline` is in seconds"""
+        limiter = self._limiter
+        if limiter is None:
+            def attempt(timeout):
+                return self._completions.create(timeout=timeout, **kwargs)
+        elif self._is_async:
+            # Every attempt (retries too) counts against the quota; one that
+            # fails keeps its request but gives its tokens back
+            async def attempt(timeout):
+                estimate = limiter.estimate(kwargs)
+                waited = await limiter.aacquire(estimate, max_wait=timeout)
+                try:
+                    result = await self._completions.create(timeout=timeout - waited, **kwargs)
+                except Exception:
+                    await limiter.asettle(estimate, 0)
+                    raise
+                if kwargs.get("stream"):
+                    return _SettledStream(result, limiter, estimate)
+                await limiter.asettle(estimate, _usage_tokens(result))
+                return result
+        else:
+            def attempt(timeout):
+                estimate = limiter.estimate(kwargs)
+                waited = limiter.acquire(estimate, max_wait=timeout)
+                try:
+                    result = self._completions.create(timeout=timeout - waited, **kwargs)
+                except Exception:
+                    limiter.settle(estimate, 0)
+                    raise
+                if kwargs.get("stream"):
+                    return _SettledStream(result, limiter, estimate)
+                limiter.settle(estimate, _usage_tokens(result))
+                return result
+
+        if self._is_async:
+            return self._resilience.acall(attempt, deadline)
+        return self._resilience.call(attempt, deadline)
+
+
+class _ResilientChat:
+    def __init__(self, chat, resilience, is_async, limiter=None):
+        self.completions = _ResilientCompletions(chat.completions, resilience, is_async, limiter)
+
+
+class ResilientClient:
+    """
+    An (Async)AzureOpenAI client whose chat.completions.create goes through
+    a Resilience policy (and an optional RateLimiter, see rate_limiter.py);
+    everything else is passed through unchanged
+    """
+
+    def __init__(self, client, resilience, is_async=False, limiter=None):
+        self._client = client
+        self.resilience = resilience
+        self.limiter = limiter
+        self.chat = _ResilientChat(client.chat, resilience, is_async, limiter)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+if __name__ == "__main__":
+    # Quick demo against a fault-injecting mock upstream
+    # (benchmarks/resilience_benchmark.py has the full comparison)
+    import os
+    import sys
+
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+    from mock_upstream import start_mock_upstream
+    from openai import AzureOpenAI
+
+    server = start_mock_upstream(delay=0.01, error_rate=0.5, error_status=429, retry_after=0.05)
+    host, port = server.server_address
+    raw = AzureOpenAI(azure_endpoint=f"http://{host}:{port}", api_key="mock",
+                      api_version="2024-12-01-preview", max_retries=0)
+    client = ResilientClient(raw, Resilience(CircuitBreaker(), base_delay=0.05))
+
+    ok = 0
+    for _ in range(20):
+        try:
+            client.chat.completions.create(model="mock", messages=[{"role": "user", "content": "hi"}])
+            ok += 1
+        except Exception as e:
+            print(f"❌ {e}")
+    print(f"✅ {ok}/20 calls succeeded with 50% of responses failing (429)")
+    print(f"📊 {client.resilience.stats()}")
+    server.shutdown()
@@ -0,0 +1,148 @@
+"""
+Step 9: Complete UI - Response Cache
+
+Caches explanations and quizzes so popular requests aren't regenerated.
+
+ExplanationAgent.explain() and QuizAgent.generate_quiz() depend only on
+(system prompt, topic, num_questions, temperature). In a class of 300, the
+same "Explain photosynthesis" would otherwise be sent to GPT-4 hundreds of
+times.
+
+Keys are normalized so different phrasings of the same request share an
+entry: "Explain photosynthesis", "explain   Photosynthesis!" and
+"Can you explain photosynthesis please?" all become "photosynthesis".
+
+Students can always get a fresh answer: requests like "give me a
+different quiz on fractions" bypass the lookup (see wants_fresh()).
+"""
+
+import hashlib
+import re
+import string
+import time
+from collections import OrderedDict
+
+
+# Words that don't change what is being asked for
+FILLER_WORDS = {
+    # Request phrasing
+    "explain", "explanation", "quiz", "quizzes", "describe", "tell", "teach", "help", "understand",
+    "create", "make", "generate", "give", "write", "show", "want", "need",
+    "can", "could", "would", "you", "me", "please", "thanks",
+    "what", "is", "are", "how", "does", "do", "work", "works",
+    # Quiz wording
+    "question", "questions", "practice", "problems", "mcq", "mcqs",
+    # Freshness words (a "different quiz on X" is still a quiz on X). Not
+    # "new", "more" or "other": they are often part of the topic ("the New Deal")
+    "different", "another", "fresh", "again",
+    # Articles and glue
+    "a", "an", "the", "on", "about", "of", "for", "to", "in", "with", "some", "detail",
+}
+
+# Explicit re-requests only: "a different quiz", "another one", "explain it again".
+# A bare "new" or "more" is usually part of the question ("tell me more about X").
+FRESH_PATTERN = re.compile(
+    r"\b(?:(?:different|another|new|fresh|one more)\s+"
+    r"(?:quiz|quizzes|explanation|one|set|questions?|version|way|example)|again)\b",
+    re.IGNORECASE,
+)
+
+PUNCTUATION_TABLE = str.maketrans({c: " " for c in string.punctuation if c != "-"})
+
+
+def normalize_topic(text):
+    """
+    Reduce a request to its topic for use in a cache key
+
+    Lowercases, drops re-request phrases ("a new quiz on X" asks for a quiz
+    on X), strips punctuation, collapses whitespace and drops filler words.
+    Falls back to the cleaned text if nothing but filler is left.
+    """
+    words = FRESH_PATTERN.sub(" ", text).lower().translate(PUNCTUATION_TABLE).split()
+    topic = [w for w in words if w not in FILLER_WORDS]
+    return " ".join(topic or words)
+
+
+def wants_fresh(text):
+    """True if the student is asking for a different/new answer"""
+    return bool(FRESH_PATTERN.search(text))
+
+
+def make_cache_key(system_prompt, topic, **params):
+    """
+    Build a cache key from everything the response depends on
+
+    Args:
+        system_prompt: The agent's system prompt (hashed, it is long)
+        topic: The raw request text (normalized here)
+        **params: Other inputs, e.g. num_questions, temperature
+    """
+    prompt_hash = hashlib.sha1(system_prompt.encode()).hexdigest()[:12]
+    return (prompt_hash, normalize_topic(topic), tuple(sorted(params.items())))
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache with a TTL and hit/miss counters
+    """
+
+    def __init__(self, max_entries=500, ttl_seconds=3600):
+        """
+        Args:
+            max_entries: Entries kept before the least recently used is evicted
+            ttl_seconds: How long a cached response stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, fresh=False):
+        """
+        Look up a response
+
+        Args:
+            key: Key from make_cache_key()
+            fresh: Skip the cache (the caller wants a newly generated answer)
+
+        Returns:
+            The cached response, or None
+        """
+        if fresh:
+            self.bypasses += 1
+            return None
+
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        """Store a response, evicting the least recently used entry if full"""
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        """Counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,297 @@
+"""
+Step 9: Complete UI - Session Store
+
+Keeps a separate conversation history for every student.
+
+Without this, the backend has a single ChatAgent with a single history list,
+so every student's messages get mixed together (and sent upstream on every
+request), and the list grows for as long as the server runs.
+
+The store is bounded in four ways:
+- max_sessions: least-recently-used sessions are evicted first
+- ttl_seconds: sessions idle for longer than this are dropped
+- max_bytes: total memory ceiling for all stored messages
+- max_messages: per-session cap (oldest messages are dropped first)
+
+Histories are MessageLogs (message_log.py): roles as bytes, and long texts
+that several messages share - the same cached answer given to many
+students - stored once for the whole store.
+
+Everything here is lost on restart. Given a ConversationStore (`persistent`),
+every change is also written to SQLite, and a session that isn't in memory
+(after a restart, or once evicted) is reloaded from there on first use:
+its summary and newest messages only. Evicting a session then just frees
+memory; clear() forgets it for good. Async callers await aload() first, so
+that read happens in a thread instead of on the event loop, and ids found
+to have no stored history are remembered, so a new student costs no read.
+"""
+
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+
+from message_log import BlobPool, MessageLog
+
+
+class Session:
+    """
+    One student's conversation history
+
+    Older messages can be folded into a running summary (see
+    history_window.py). `offset` counts every message ever removed from the
+    front of `messages`, so positions stay stable while a summary is being
+    written in the background. `last_agent` is the agent that answered the
+    latest request (the orchestrator's guess for speculative routing).
+    """
+
+    __slots__ = ("messages", "size", "last_access", "summary", "offset", "folded_tokens",
+                 "last_agent")
+
+    def __init__(self, pool=None):
+        self.messages = MessageLog(pool)
+        self.size = 0
+        self.last_access = time.monotonic()
+        self.summary = None
+        self.offset = 0
+        self.folded_tokens = 0
+        self.last_agent = None
+
+
+class SessionStore:
+    """
+    Session-keyed conversation store with LRU/TTL eviction
+
+    Sessions are kept in an OrderedDict in last-access order, so both the
+    least-recently-used and the longest-idle sessions are always at the front.
+    """
+
+    def __init__(self, max_sessions=1000, ttl_seconds=1800, max_bytes=64 * 1024 * 1024,
+                 max_messages=50, persistent=None, blob_min_length=256):
+        """
+        Args:
+            max_sessions: Maximum number of sessions kept at once
+            ttl_seconds: Idle time after which a session expires
+            max_bytes: Memory ceiling for all sessions together
+            max_messages: Maximum messages kept per session
+            persistent: Optional ConversationStore that keeps sessions on disk
+            blob_min_length: Texts at least this long are shared between
+                messages with the same content (see message_log.py)
+        """
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self.persistent = persistent
+
+        self._sessions = OrderedDict()
+        self._missing = OrderedDict()  # ids with nothing stored (at most max_sessions)
+        self.blobs = BlobPool(blob_min_length)
+        self.total_bytes = 0  # sessions' own memory; shared texts are in blobs.bytes
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def get(self, session_id):
+        """
+        Get the Session object itself (or None), marking it as used
+
+        For code that needs more than the plain history (e.g. the summary).
+        """
+        self._evict_expired()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._touch(session_id, session)
+        elif self.persistent is not None:
+            session = self._restore(session_id)
+        return session
+
+    async def aload(self, session_id):
+        """
+        Bring a stored session into memory without blocking the event loop
+
+        Async callers await this before using a session: get() and the writes
+        that follow then find it in memory (or know it has no history)
+        instead of reading the file on the event loop.
+        """
+        if self.persistent is None or session_id in self._sessions or session_id in self._missing:
+            return
+        data = await asyncio.to_thread(self.persistent.load, session_id, self.max_messages)
+        if session_id not in self._sessions:  # not created by another request meanwhile
+            self._install(session_id, data)
+
+    def get_history(self, session_id):
+        """
+        Get a copy of a session's history (user/assistant messages only)
+
+        Unknown or expired sessions return an empty history.
+        """
+        session = self.get(session_id)
+        if session is None:
+            return []
+        return session.messages[:]
+
+    def add_turn(self, session_id, user_message, assistant_message):
+        """Record one user/assistant exchange"""
+        self.add_messages(session_id, [
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": assistant_message},
+        ])
+
+    def add_messages(self, session_id, messages):
+        """Append messages to a session, creating it if needed"""
+        session = self._session(session_id)
+        if self.persistent is not None:
+            self.persistent.append(session_id, session.offset + len(session.messages), messages)
+
+        size = session.messages.extend(messages)
+        session.size += size
+        self.total_bytes += size
+
+        # Per-session cap: drop the oldest messages
+        overflow = len(session.messages) - self.max_messages
+        if overflow > 0:
+            self._drop_front(session, overflow)
+
+        self._evict_expired()
+        self._evict_over_limits(keep=session_id)
+
+    def set_last_agent(self, session_id, agent_name):
+        """Remember which agent answered a session's latest request"""
+        session = self._session(session_id)
+        session.last_agent = agent_name
+        if self.persistent is not None:
+            self.persistent.update(session_id, last_agent=agent_name)
+        self._evict_over_limits(keep=session_id)
+
+    def fold(self, session_id, summary, upto, folded_tokens):
+        """
+        Replace the oldest messages with a summary
+
+        Args:
+            session_id: Session to update
+            summary: New running summary text (covers everything before `upto`)
+            upto: Absolute message position the summary covers up to
+            folded_tokens: Estimated tokens of the messages just folded
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            return  # Evicted while the summary was being written
+
+        self._drop_front(session, max(0, upto - session.offset))
+
+        old_size = sys.getsizeof(session.summary) if session.summary else 0
+        new_size = sys.getsizeof(summary)
+        session.summary = summary
+        session.size += new_size - old_size
+        self.total_bytes += new_size - old_size
+        session.folded_tokens += folded_tokens
+        if self.persistent is not None:
+            self.persistent.update(session_id, summary=summary, folded_upto=upto,
+                                   folded_tokens=session.folded_tokens)
+
+    def clear(self, session_id):
+        """Forget a session (on disk too)"""
+        self._unload(session_id)
+        self._missing.pop(session_id, None)
+        if self.persistent is not None:
+            self.persistent.delete(session_id)
+
+    def stats(self):
+        """Current store size, for logging and benchmarks"""
+        return {
+            "sessions": len(self._sessions),
+            "total_bytes": self.total_bytes + self.blobs.bytes,
+            "shared_texts": self.blobs.stats(),
+            "evictions": self.evictions,
+            "persistent": self.persistent.stats() if self.persistent is not None else None,
+        }
+
+    def _session(self, session_id):
+        """The session to write to: in memory, reloaded from disk, or new"""
+        session = self._sessions.get(session_id)
+        if session is None and self.persistent is not None:
+            session = self._restore(session_id)
+        if session is None:
+            session = Session(self.blobs)
+            self._sessions[session_id] = session
+            self._missing.pop(session_id, None)  # it is about to be stored
+        self._touch(session_id, session)
+        return session
+
+    def _restore(self, session_id):
+        """Rebuild a session from the ConversationStore (None if it has none)"""
+        if session_id in self._missing:
+            return None
+        return self._install(session_id, self.persistent.load(session_id, self.max_messages))
+
+    def _install(self, session_id, data):
+        """Put a session loaded from the ConversationStore in memory"""
+        if data is None:
+            self._missing[session_id] = None
+            if len(self._missing) > self.max_sessions:
+                self._missing.popitem(last=False)
+            return None
+
+        session = Session(self.blobs)
+        session.size = session.messages.extend(data["messages"])
+        session.offset = data["offset"]
+        session.summary = data["summary"]
+        session.folded_tokens = data["folded_tokens"]
+        session.last_agent = data["last_agent"]
+        if session.summary:
+            session.size += sys.getsizeof(session.summary)
+        self.total_bytes += session.size
+
+        self._sessions[session_id] = session
+        self._evict_over_limits(keep=session_id)
+        return session
+
+    def _unload(self, session_id):
+        """Drop a session from memory"""
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.messages.clear()  # hands its shared texts back to the pool
+            self.total_bytes -= session.size
+
+    def _drop_front(self, session, count):
+        """Remove the `count` oldest messages from a session"""
+        count = min(count, len(session.messages))
+        freed = session.messages.drop_front(count)
+        session.offset += count
+        session.size -= freed
+        self.total_bytes -= freed
+
+    def _touch(self, session_id, session):
+        session.last_access = time.monotonic()
+        self._sessions.move_to_end(session_id)
+
+    def _evict(self, session_id):
+        # Only memory is freed: a persistent session is reloaded when it comes back
+        self._unload(session_id)
+        self.evictions += 1
+
+    def _evict_expired(self):
+        """Drop idle sessions (they are all at the front of the OrderedDict)"""
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_access > cutoff:
+                break
+            self._evict(session_id)
+
+    def _evict_over_limits(self, keep=None):
+        """Drop least-recently-used sessions until both limits are met"""
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions
+            or self.total_bytes + self.blobs.bytes > self.max_bytes
+        ):
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                # Never evict the session we are writing to
+                break
+            self._evict(session_id)
@@ -0,0 +1,185 @@
+"""
+Step 9: Complete UI - Request Coalescing
+
+Shares one upstream call between identical requests that are in flight at
+the same time ("single-flight").
+
+When a teacher tells a lab of 60 students to "ask the assistant to explain
+recursion", 60 identical explanation requests arrive within a second. The
+response cache can't help yet (nothing has finished), so without this all
+60 would go to GPT-4. Now the first request makes the call and the other
+59 wait for its result - or its error.
+
+A caller that gives up (client disconnected, losing speculative guess)
+only stops waiting; when the last caller of a call (or the last subscriber
+of a stream) gives up, the call itself is cancelled, so nobody pays for
+tokens no one will read.
+
+Streaming requests are coalesced too: the upstream stream is recorded as
+it arrives and replayed to every subscriber, so each one receives the
+full token stream, however late it joined.
+"""
+
+import asyncio
+
+
+class Broadcast:
+    """
+    One upstream event stream, replayed to any number of subscribers
+    """
+
+    def __init__(self, source):
+        """
+        Args:
+            source: Async iterator of events (consumed exactly once)
+        """
+        self.events = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0  # counted by SingleFlight.stream()
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source):
+        """Read the upstream stream to the end, whoever is listening"""
+        try:
+            async for event in source:
+                self.events.append(event)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        # Wake everyone waiting on the current event, then start a new one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self):
+        """
+        Yield every event from the start of the stream
+
+        Raises:
+            The upstream error, if the stream failed
+        """
+        index = 0
+        while True:
+            if index < len(self.events):
+                yield self.events[index]
+                index += 1
+            elif self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent identical calls by key, with counters
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> asyncio.Task
+        self._waiters = {}  # asyncio.Task -> callers still waiting for it
+        self._streams = {}  # key -> Broadcast
+
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.cancelled = 0  # calls abandoned by all their callers
+
+    async def do(self, key, factory):
+        """
+        Run factory() once for all concurrent callers with the same key
+
+        Args:
+            key: Hashable request key (e.g. from make_cache_key())
+            factory: Function returning a coroutine that makes the call
+
+        Returns:
+            The shared result (every waiter gets the same error on failure)
+
+        Raises:
+            CancelledError: This caller was cancelled. The call goes on for
+                the others, or is cancelled if this was its last caller.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish(self._calls, key, t))
+            self.upstream_calls += 1
+        else:
+            self.coalesced += 1
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # A waiter that gives up must not cancel the call for everyone else
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                # ...but when nobody is left, the upstream call is wasted
+                task.cancel()
+                if self._calls.get(key) is task:
+                    del self._calls[key]  # later callers start a new call
+                self.cancelled += 1
+            raise
+        finally:
+            remaining = self._waiters.pop(task) - 1
+            if remaining:
+                self._waiters[task] = remaining
+
+    async def stream(self, key, factory):
+        """
+        Stream events from one shared upstream stream per key
+
+        Args:
+            key: Hashable request key
+            factory: Function returning an async iterator of events
+
+        Yields:
+            Every event of the shared stream, from the first one
+
+        When the last subscriber stops reading before the end, the upstream
+        stream is cancelled too.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = Broadcast(factory())
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda t: self._finish(self._streams, key, broadcast))
+            self.upstream_calls += 1
+        else:
+            self.coalesced += 1
+
+        broadcast.subscribers += 1
+        try:
+            async for event in broadcast.subscribe():
+                yield event
+        finally:
+            broadcast.subscribers -= 1
+            if not broadcast.subscribers and not broadcast.done:
+                broadcast.task.cancel()
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]  # later callers start a new stream
+                self.cancelled += 1
+
+    def _finish(self, table, key, entry):
+        """Forget a finished call so later requests start a new one"""
+        if table.get(key) is entry:
+            del table[key]
+        task = entry if isinstance(entry, asyncio.Future) else entry.task
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every waiter left
+
+    def stats(self):
+        """Counters for monitoring"""
+        return {
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
@@ -0,0 +1,70 @@
+"""
+Step 9: Complete UI - Streaming Helpers
+
+Shared pieces for streaming responses (see Step 3 for the basics):
+- stream_completion() turns an SDK stream into simple (event, data) tuples
+- sse_event() formats one Server-Sent Event for the /api/chat/stream endpoint
+- ndjson_line() formats one result line for the /api/chat/batch endpoint
+"""
+
+import sys
+import os
+import json
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import GPT4_DEPLOYMENT_NAME
+
+
+async def stream_completion(client, messages, **kwargs):
+    """
+    Stream a chat completion as (event, data) tuples
+
+    Args:
+        client: AsyncAzureOpenAI client
+        messages: Message list to send
+        **kwargs: Extra completion options (temperature, max_tokens, ...)
+
+    Yields:
+        ("token", text) for every content delta, then
+        ("usage", dict) once the final usage chunk arrives
+    """
+    stream = await client.chat.completions.create(
+        model=GPT4_DEPLOYMENT_NAME,
+        messages=messages,
+        stream=True,
+        # Ask for a final chunk with token usage
+        stream_options={"include_usage": True},
+        **kwargs
+    )
+
+    async for chunk in stream:
+        # Azure sends some chunks with no choices (e.g. content filter results)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield "token", chunk.choices[0].delta.content
+
+        if getattr(chunk, "usage", None):
+            yield "usage", {
+                "prompt_tokens": chunk.usage.prompt_tokens,
+                "completion_tokens": chunk.usage.completion_tokens,
+                "total_tokens": chunk.usage.total_tokens,
+            }
+
+
+def sse_event(event, data):
+    """
+    Format one Server-Sent Event
+
+    Args:
+        event: Event name (agent, token, done, error)
+        data: JSON-serializable payload
+
+    Returns:
+        The event as text, ready to write to the response
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def ndjson_line(data):
+    """Format one newline-delimited JSON record"""
+    return json.dumps(data) + "\n"
@@ -0,0 +1,31 @@
+"""
+Step 9: Complete UI - Token Estimates
+
+Cheap token counting for budgeting prompts.
+
+We don't need exact counts (GPT-4 reports the real numbers in `usage`),
+just a fast estimate to decide what fits. English text averages about
+4 characters per token, and every chat message has a few tokens of
+framing overhead (role, separators).
+"""
+
+CHARS_PER_TOKEN = 4
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REQUEST = 3  # Every reply is primed with a few tokens
+
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a piece of text"""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_message_tokens(message):
+    """Estimate the tokens used by one {"role", "content"} message"""
+    return TOKENS_PER_MESSAGE + estimate_tokens(message.get("content") or "")
+
+
+def estimate_messages_tokens(messages):
+    """Estimate the prompt tokens for a whole message list"""
+    return TOKENS_PER_REQUEST + sum(estimate_message_tokens(m) for m in messages)
@@ -3,14 +3,30 @@
  */
 
 import axios from 'axios';
-import { ChatResponse, AgentsResponse } from './types';
+import { ChatResponse, AgentsResponse, StreamHandlers } from './types';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
+/**
+ * One session per browser tab, so the backend keeps this student's
+ * conversation history separate from everyone else's
+ */
+const getSessionId = (): string => {
+  let sessionId = sessionStorage.getItem('sessionId');
+  if (!sessionId) {
+    sessionId = crypto.randomUUID();
+    sessionStorage.setItem('sessionId', sessionId);
+  }
+  return sessionId;
+};
+
+const SESSION_ID = getSessionId();
+
 const api = axios.create({
   baseURL: API_BASE_URL,
   headers: {
     'Content-Type': 'application/json',
+    'X-Session-ID': SESSION_ID,
   },
 });
 
@@ -25,6 +41,58 @@ export const sendMessage = async (message: string): Promise<ChatResponse> => {
   return response.data;
 };
 
+/**
+ * Send a chat message and stream the answer (Server-Sent Events)
+ *
+ * Uses fetch instead of axios because axios can't read a response body
+ * incrementally in the browser.
+ */
+export const streamMessage = async (
+  message: string,
+  handlers: StreamHandlers
+): Promise<void> => {
+  const response = await fetch(`${API_BASE_URL}/api/chat/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'X-Session-ID': SESSION_ID },
+    body: JSON.stringify({ message, conversation_history: [] }),
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`Stream request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    const events = buffer.split('\n\n');
+    buffer = events.pop() ?? '';
+
+    for (const rawEvent of events) {
+      let eventName = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event: ')) eventName = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (!data) continue;
+
+      const payload = JSON.parse(data);
+      if (eventName === 'agent') handlers.onAgent(payload.agent);
+      else if (eventName === 'token') handlers.onToken(payload.content);
+      else if (eventName === 'done') handlers.onDone?.(payload);
+      else if (eventName === 'error') throw new Error(payload.detail);
+    }
+  }
+};
+
 /**
  * Get information about available agents
  */
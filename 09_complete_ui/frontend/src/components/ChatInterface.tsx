@@ -2,7 +2,7 @@ import { useState, useRef, useEffect } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { Send, Loader2 } from 'lucide-react';
 import { Message } from '../types';
-import { sendMessage } from '../api';
+import { streamMessage } from '../api';
 import ChatMessage from './ChatMessage';
 import EmptyState from './EmptyState';
 
@@ -52,18 +52,30 @@ const ChatInterface = ({
     setInput('');
     setIsLoading(true);
 
-    try {
-      // Get AI response
-      const response = await sendMessage(userMessage.content);
-      
-      const assistantMessage: Message = {
-        role: 'assistant',
-        content: response.response,
-        agent: response.agent,
-        timestamp: response.timestamp,
-      };
+    // Update the assistant message that is currently streaming (always the last one)
+    const updateLast = (update: (message: Message) => Message) =>
+      setMessages((prev) => [...prev.slice(0, -1), update(prev[prev.length - 1])]);
 
-      setMessages((prev) => [...prev, assistantMessage]);
+    try {
+      // Stream the AI response: the bubble appears as soon as routing is done
+      await streamMessage(userMessage.content, {
+        onAgent: (agent) => {
+          setIsLoading(false);
+          setMessages((prev) => [
+            ...prev,
+            {
+              role: 'assistant',
+              content: '',
+              agent,
+              timestamp: new Date().toISOString(),
+            },
+          ]);
+        },
+        onToken: (content) =>
+          updateLast((message) => ({ ...message, content: message.content + content })),
+        onDone: (done) =>
+          updateLast((message) => ({ ...message, timestamp: done.timestamp })),
+      });
     } catch (error) {
       console.error('Error sending message:', error);
       
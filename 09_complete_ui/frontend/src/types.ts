@@ -13,6 +13,31 @@ export interface ChatResponse {
   response: string;
   agent: string;
   timestamp: string;
+  session_id: string;
+}
+
+export interface StreamUsage {
+  prompt_tokens: number;
+  completion_tokens: number;
+  total_tokens: number;
+}
+
+export interface StreamDone {
+  agent: string;
+  usage: StreamUsage | null;
+  timing: {
+    route_ms: number;
+    ttft_ms: number;
+    total_ms: number;
+  };
+  timestamp: string;
+  session_id: string;
+}
+
+export interface StreamHandlers {
+  onAgent: (agent: string) => void;
+  onToken: (content: string) => void;
+  onDone?: (done: StreamDone) => void;
 }
 
 export interface Agent {
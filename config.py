@@ -43,6 +43,112 @@ GPT4_DEPLOYMENT_NAME = os.getenv(
     ""
 )
 
+# ============================================================================
+# UPSTREAM CONNECTION POOL (Step 9)
+# ============================================================================
+
+# The backend shares one pooled HTTP client across the orchestrator and all
+# agents, so connections (and TLS handshakes) are reused between calls.
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))   # pool size
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))        # idle connections kept open
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))  # seconds an idle connection lives
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "false").lower() in ("1", "true", "yes")  # needs: pip install h2
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "60"))
+
+# Failed calls (429, 5xx, timeouts) are retried with exponential backoff and
+# jitter, honoring Retry-After, within a per-call deadline. After too many
+# consecutive upstream failures the circuit opens and calls fail fast.
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))            # tries per call
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))            # first backoff step (s)
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))                # largest backoff step (s)
+UPSTREAM_DEADLINE_SECONDS = float(os.getenv("UPSTREAM_DEADLINE_SECONDS", "60"))  # per call, retries included
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))   # open -> try again after
+
+# Client-side quota: calls wait (or are rejected) before going over the
+# deployment's requests/tokens per minute, instead of collecting 429s.
+# Set RATE_LIMIT_STORE to a SQLite file so all uvicorn workers share one quota.
+RATE_LIMIT_RPM = int(os.getenv("RATE_LIMIT_RPM", "0"))                    # requests per minute (0 = off)
+RATE_LIMIT_TPM = int(os.getenv("RATE_LIMIT_TPM", "0"))                    # tokens per minute (0 = off)
+RATE_LIMIT_POLICY = os.getenv("RATE_LIMIT_POLICY", "queue")               # "queue" or "reject"
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))       # longest a queued call waits (s)
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "10"))  # quota usable at once
+RATE_LIMIT_COMPLETION_TOKENS = int(os.getenv("RATE_LIMIT_COMPLETION_TOKENS", "500"))  # estimate without max_tokens
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "")                      # SQLite path ("" = this process only)
+
+# ============================================================================
+# BACKEND SESSIONS (Step 9)
+# ============================================================================
+
+# The FastAPI backend keeps one conversation history per student session.
+# These limits keep its memory bounded no matter how long it runs.
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "1000"))          # sessions kept at once (LRU)
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "1800"))      # idle time before a session expires
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))  # memory ceiling
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "50"))      # messages kept per session
+
+# Conversation storage: with CONVERSATION_DB_PATH set (empty = off), every
+# message is also appended to this SQLite file, committed in batches every
+# CONVERSATION_FLUSH_MS, so sessions survive a restart. A session that isn't
+# in memory is reloaded on first use - its summary and newest messages only.
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "")
+CONVERSATION_FLUSH_MS = int(os.getenv("CONVERSATION_FLUSH_MS", "50"))
+CONVERSATION_RETENTION_DAYS = float(os.getenv("CONVERSATION_RETENTION_DAYS", "30"))  # idle sessions deleted after (0 = never)
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "1000"))    # stored per session (0 = no limit)
+
+# Chat prompts only carry the most recent messages (up to this many tokens)
+# plus a running summary of everything older, written in the background.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "300"))
+
+# Routing is done locally for unambiguous requests ("quiz me on...",
+# "explain..."); everything else is decided by GPT-4. With ROUTER_LOCAL_MODEL
+# the local classifier's model also decides when it is at least
+# ROUTER_CONFIDENCE_THRESHOLD confident (0-1). It is off by default: on
+# hand-written messages its confident answers are wrong about 1 time in 4.
+ROUTER_LOCAL_MODEL = os.getenv("ROUTER_LOCAL_MODEL", "false").lower() in ("1", "true", "yes")
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.8"))
+
+# Speculative routing: when routing has to ask GPT-4, start the most likely
+# agent (the session's previous one) at the same time. A right guess saves
+# the routing round-trip; a wrong one is cancelled and its tokens are wasted.
+SPECULATIVE_ROUTING = os.getenv("SPECULATIVE_ROUTING", "false").lower() in ("1", "true", "yes")
+
+# Agents whose answers are cached (comma-separated; leave empty to disable).
+# Cached answers are reused for identical requests until they expire.
+RESPONSE_CACHE_AGENTS = [
+    name.strip() for name in os.getenv("RESPONSE_CACHE_AGENTS", "quiz,explanation").split(",")
+    if name.strip()
+]
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "500"))  # per agent
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+
+# Question bank: every generated quiz question is kept in this SQLite file
+# (empty = off), by topic. Once a topic holds QUESTION_BANK_MIN_QUESTIONS,
+# quizzes are drawn from it - never repeating a question for a student - and
+# GPT-4 only tops up thin topics. It replaces the quiz response cache.
+QUESTION_BANK_PATH = os.getenv("QUESTION_BANK_PATH", "")
+QUESTION_BANK_MIN_QUESTIONS = int(os.getenv("QUESTION_BANK_MIN_QUESTIONS", "10"))
+
+# Quiz size: "a quiz with 15 questions" gets 15 (up to QUIZ_MAX_QUESTIONS),
+# otherwise QUIZ_DEFAULT_QUESTIONS. Quizzes of more than QUIZ_CHUNK_SIZE
+# questions are generated in concurrent chunks (0 = always one call).
+QUIZ_DEFAULT_QUESTIONS = int(os.getenv("QUIZ_DEFAULT_QUESTIONS", "3"))
+QUIZ_MAX_QUESTIONS = int(os.getenv("QUIZ_MAX_QUESTIONS", "30"))
+QUIZ_CHUNK_SIZE = int(os.getenv("QUIZ_CHUNK_SIZE", "5"))
+
+# ============================================================================
+# BATCH CHAT (Step 9)
+# ============================================================================
+
+# /api/chat/batch runs many prepared prompts through the same routing and
+# agents as /api/chat, a limited number at a time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))             # default requests in flight
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))    # upper limit a caller may ask for
+BATCH_ITEM_TIMEOUT_SECONDS = float(os.getenv("BATCH_ITEM_TIMEOUT_SECONDS", "60"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))              # items per request
+
 # ============================================================================
 # VALIDATION
 # ============================================================================